@@ -1,634 +1,3328 @@
-import dash
-from dash import dcc, html, dash_table
-from dash.dependencies import Input, Output
-import plotly.graph_objects as go
-import pandas as pd
-import numpy as np
-import os
-
-# ============================================================
-# 1. LOAD DATA & CONFIG
-# ============================================================
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-
-DASHBOARD_CSV = os.path.join(BASE_DIR, 'df_dashboard.csv')
-CLEAN_CSV = os.path.join(BASE_DIR, 'df_clean.csv')
-
-if os.path.exists(DASHBOARD_CSV):
-    df = pd.read_csv(DASHBOARD_CSV, encoding='utf-8-sig')
-elif os.path.exists(CLEAN_CSV):
-    df = pd.read_csv(CLEAN_CSV, encoding='utf-8-sig')
-else:
-    raise FileNotFoundError("File df_dashboard.csv atau df_clean.csv tidak ditemukan.")
-
-df['Date'] = pd.to_datetime(df['Date'])
-df['TransactionNo'] = df['TransactionNo'].astype(str)
-df['CustomerNo'] = df['CustomerNo'].astype(str)
-df['Revenue'] = pd.to_numeric(df['Revenue'], errors='coerce').fillna(0)
-df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce').fillna(0)
-
-if 'YearMonth' not in df.columns:
-    df['YearMonth'] = df['Date'].dt.to_period('M').astype(str)
-
-PRODUCT_GROUPS = [
-    'Very Frequently Purchased', 'Frequently Purchased',
-    'Moderately Purchased', 'Rarely Purchased', 'Very Rarely Purchased'
-]
-CUSTOMER_SEGMENTS = ['Loyal', 'Active', 'Occasional', 'Inactive']
-COUNTRY_GROUPS = ['Transaksi Tinggi', 'Transaksi Sedang', 'Transaksi Rendah']
-
-COLOR_PRODUCT = {
-    'Very Frequently Purchased': '#10b981', 'Frequently Purchased': '#0ea5e9',
-    'Moderately Purchased': '#f59e0b', 'Rarely Purchased': '#fb923c',
-    'Very Rarely Purchased': '#f43f5e',
-}
-COLOR_SEGMENT = {
-    'Loyal': '#10b981', 'Active': '#0ea5e9',
-    'Occasional': '#f59e0b', 'Inactive': '#f43f5e',
-}
-COLOR_COUNTRY = {
-    'Transaksi Tinggi': '#10b981', 'Transaksi Sedang': '#f59e0b',
-    'Transaksi Rendah': '#f43f5e',
-}
-
-BASE_LAYOUT = dict(
-    paper_bgcolor='rgba(0,0,0,0)',
-    plot_bgcolor='rgba(0,0,0,0)',
-    font=dict(family='Inter, sans-serif', color='#94a3b8', size=12),
-    title_font=dict(family='Inter, sans-serif', color='#f1f5f9', size=15),
-    xaxis=dict(gridcolor='rgba(255,255,255,0.06)', zerolinecolor='rgba(255,255,255,0.06)'),
-    yaxis=dict(gridcolor='rgba(255,255,255,0.06)', zerolinecolor='rgba(255,255,255,0.06)'),
-    margin=dict(l=40, r=20, t=50, b=40),
-    legend=dict(font=dict(size=11, color='#94a3b8')),
-    hoverlabel=dict(
-        bgcolor='#1e2235',
-        bordercolor='#6366f1',
-        font=dict(family='Inter, sans-serif', size=13, color='#f1f5f9')
-    ),
-)
-
-GRAPH_STYLE = {'height': '380px'}
-GRAPH_STYLE_TALL = {'height': '440px'}
-CHART_CFG = {'displayModeBar': True, 'displaylogo': False,
-             'modeBarButtonsToRemove': ['lasso2d', 'select2d']}
-
-
-def apply_layout(fig, **kw):
-    fig.update_layout(**{**BASE_LAYOUT, **kw})
-    return fig
-
-
-# ============================================================
-# 2. HELPERS
-# ============================================================
-def fmt(n, prefix='', decimals=0):
-    if n >= 1_000_000:
-        return f"{prefix}{n/1_000_000:,.{decimals}f}M"
-    if n >= 1_000:
-        return f"{prefix}{n/1_000:,.{decimals}f}K"
-    return f"{prefix}{n:,.{decimals}f}"
-
-
-def fdf(df_src, pg, cs, cg):
-    dff = df_src.copy()
-    if pg and pg != 'All':
-        dff = dff[dff['Product_Group'] == pg]
-    if cs and cs != 'All':
-        dff = dff[dff['Customer_Segment'] == cs]
-    if cg and cg != 'All':
-        dff = dff[dff['Country_Group'] == cg]
-    return dff
-
-
-def G(fig, style=None):
-    return dcc.Graph(figure=fig, config=CHART_CFG,
-                     style=style or GRAPH_STYLE, responsive=True)
-
-
-def chart_card(title, subtitle, graph, badge=None):
-    header_children = [
-        html.Div([
-            html.Div(title, className='chart-title'),
-            html.Div(subtitle, className='chart-subtitle'),
-        ])
-    ]
-    if badge:
-        header_children.append(html.Span(badge, className='chart-badge'))
-    return html.Div(className='chart-card', children=[
-        html.Div(className='chart-card-header', children=header_children),
-        graph,
-    ])
-
-
-# ============================================================
-# 3. INIT APP
-# ============================================================
-app = dash.Dash(
-    __name__,
-    suppress_callback_exceptions=True,
-    title='ShopInsight - E-Commerce Analytics',
-    update_title='Loading...',
-    meta_tags=[{'name': 'viewport', 'content': 'width=device-width, initial-scale=1.0'}],
-)
-server = app.server
-
-
-# ============================================================
-# 4. SIDEBAR — NAVIGASI
-# ============================================================
-NAV_ITEMS = [
-    {'value': 'overview',  'icon': '📊', 'label': 'Overview'},
-    {'value': 'product',   'icon': '📦', 'label': 'Analisis Produk'},
-    {'value': 'customer',  'icon': '👥', 'label': 'Analisis Pelanggan'},
-    {'value': 'geo',       'icon': '🌍', 'label': 'Analisis Geografis'},
-]
-
-
-def create_sidebar():
-    return html.Div(className='sidebar', children=[
-        # Logo
-        html.Div(className='sidebar-logo', children=[
-            html.Div(className='sidebar-logo-icon', children='📈'),
-            html.Div([
-                html.Div('ShopInsight', className='sidebar-logo-text'),
-                html.Div('E-Commerce Analytics', className='sidebar-logo-sub'),
-            ]),
-        ]),
-
-        html.Div(className='filter-divider'),
-
-        # Navigasi
-        html.Div(className='nav-section', children=[
-            html.Div('MENU', className='nav-section-title'),
-            dcc.RadioItems(
-                id='nav-menu',
-                options=[
-                    {'label': html.Span([
-                        html.Span(item['icon'], className='nav-icon'),
-                        html.Span(item['label'], className='nav-label'),
-                    ], className='nav-item-inner'),
-                     'value': item['value']}
-                    for item in NAV_ITEMS
-                ],
-                value='overview',
-                className='nav-radio-group',
-                inputClassName='nav-radio-input',
-                labelClassName='nav-radio-label',
-            ),
-        ]),
-
-        html.Div(className='filter-divider'),
-
-        # Ringkasan
-        html.Div(className='sidebar-stats', children=[
-            html.Div('DATASET', className='nav-section-title'),
-            html.Div(className='stat-row', children=[
-                html.Span('Periode', className='stat-label'),
-                html.Span(f"{df['Date'].min().strftime('%b %Y')} — {df['Date'].max().strftime('%b %Y')}",
-                           className='stat-value'),
-            ]),
-            html.Div(className='stat-row', children=[
-                html.Span('Transaksi', className='stat-label'),
-                html.Span(f"{df['TransactionNo'].nunique():,}", className='stat-value'),
-            ]),
-            html.Div(className='stat-row', children=[
-                html.Span('Produk', className='stat-label'),
-                html.Span(f"{df['ProductName'].nunique():,}", className='stat-value'),
-            ]),
-            html.Div(className='stat-row', children=[
-                html.Span('Pelanggan', className='stat-label'),
-                html.Span(f"{df['CustomerNo'].nunique():,}", className='stat-value'),
-            ]),
-            html.Div(className='stat-row', children=[
-                html.Span('Negara', className='stat-label'),
-                html.Span(f"{df['Country'].nunique()}", className='stat-value'),
-            ]),
-        ]),
-
-        html.Div(style={'flex': '1'}),
-
-        html.Div(className='dashboard-footer', children=[
-            html.Div('Remedial UAS Business Intelligence'),
-            html.Div('Universitas Islam Indonesia'),
-        ]),
-    ])
-
-
-# ============================================================
-# 5. FILTER BAR
-# ============================================================
-def create_filter_bar():
-    def dd(id_, label, options):
-        return html.Div(className='filter-bar-item', children=[
-            html.Label(label, className='filter-bar-label'),
-            dcc.Dropdown(id=id_, options=options, value='All', multi=False,
-                         placeholder=f'Pilih {label.lower()}...', className='dash-dropdown'),
-        ])
-
-    pg = [{'label': 'Semua Kelompok', 'value': 'All'}] + \
-         [{'label': g, 'value': g} for g in PRODUCT_GROUPS if g in df['Product_Group'].unique()]
-    cs = [{'label': 'Semua Segmen', 'value': 'All'}] + \
-         [{'label': s, 'value': s} for s in CUSTOMER_SEGMENTS if s in df['Customer_Segment'].unique()]
-    cg = [{'label': 'Semua Negara', 'value': 'All'}] + \
-         [{'label': g, 'value': g} for g in COUNTRY_GROUPS if g in df['Country_Group'].unique()]
-
-    return html.Div(className='filter-bar', children=[
-        dd('filter-product-group', 'Kelompok Produk', pg),
-        dd('filter-customer-segment', 'Segmen Pelanggan', cs),
-        dd('filter-country-group', 'Kelompok Negara', cg),
-    ])
-
-
-# ============================================================
-# 6. MAIN CONTENT
-# ============================================================
-def create_main_content():
-    return html.Div(className='main-content', children=[
-        html.Div(className='page-header', children=[
-            html.H1('E-Commerce Business Intelligence Dashboard', className='page-title'),
-            html.P('Analisis strategis transaksi penjualan, segmentasi produk & pelanggan, dan distribusi geografis.',
-                    className='page-description'),
-        ]),
-        create_filter_bar(),
-        html.Div(className='kpi-container', children=[
-            html.Div(className='kpi-card kpi-revenue', children=[
-                html.Div(className='kpi-icon icon-revenue', children='£'),
-                html.Div('TOTAL REVENUE', className='kpi-label'),
-                html.Div('—', className='kpi-value', id='kpi-revenue'),
-            ]),
-            html.Div(className='kpi-card kpi-transactions', children=[
-                html.Div(className='kpi-icon icon-transactions', children='🛒'),
-                html.Div('TOTAL TRANSAKSI', className='kpi-label'),
-                html.Div('—', className='kpi-value', id='kpi-transactions'),
-            ]),
-            html.Div(className='kpi-card kpi-customers', children=[
-                html.Div(className='kpi-icon icon-customers', children='👥'),
-                html.Div('TOTAL PELANGGAN', className='kpi-label'),
-                html.Div('—', className='kpi-value', id='kpi-customers'),
-            ]),
-            html.Div(className='kpi-card kpi-aov', children=[
-                html.Div(className='kpi-icon icon-aov', children='📈'),
-                html.Div('AVG ORDER VALUE', className='kpi-label'),
-                html.Div('—', className='kpi-value', id='kpi-aov'),
-            ]),
-        ]),
-        dcc.Loading(
-            id='page-loading',
-            type='default',
-            children=[html.Div(id='page-content')]
-        ),
-    ])
-
-
-# ============================================================
-# 7. PAGE BUILDERS
-# ============================================================
-def build_overview(dff):
-    monthly = (dff.groupby('YearMonth')
-               .agg(Revenue=('Revenue', 'sum'), Transaksi=('TransactionNo', 'nunique'))
-               .reset_index().sort_values('YearMonth'))
-
-    fig1 = go.Figure()
-    fig1.add_trace(go.Scatter(
-        x=monthly['YearMonth'], y=monthly['Revenue'],
-        mode='lines+markers', line=dict(color='#6366f1', width=4, shape='spline'),
-        marker=dict(size=3), fill='tozeroy', fillcolor='rgba(99,102,241,0.1)',
-        hovertemplate='<b>%{x}</b><br>Revenue: £%{y:,.0f}<extra></extra>'))
-    apply_layout(fig1, title='Tren Revenue Bulanan', xaxis_title='Bulan',
-                 yaxis_title='Revenue (£)', hovermode='x unified')
-
-    fig2 = go.Figure()
-    fig2.add_trace(go.Bar(
-        x=monthly['YearMonth'], y=monthly['Transaksi'],
-        marker=dict(color='#0ea5e9', line=dict(width=2, color='rgba(255,255,255,0)'), cornerradius=8),
-        opacity=0.9,
-        hovertemplate='<b style="font-size: 14px; color: #ffffff;">%{x}</b><br><b>Volume Transaksi:</b> %{y:,} transaksi<extra></extra>'))
-    apply_layout(fig2, title='Jumlah Transaksi per Bulan', xaxis_title='Bulan',
-                 yaxis_title='Jumlah Transaksi')
-    fig2.update_traces(
-        hovertemplate='<b style="font-size: 14px; color: #ffffff;">%{x}</b><br><b>Volume Transaksi:</b> %{y:,} transaksi<extra></extra>',
-        selector=dict(type='bar')
-    )
-
-    day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    daily = dff.groupby('DayName')['TransactionNo'].nunique().reindex(day_order).reset_index()
-    daily.columns = ['Day', 'Count']
-    peak = daily.loc[daily['Count'].idxmax(), 'Day']
-
-    fig3 = go.Figure()
-    colors = ['#6366f1' if d == peak else '#334155' for d in daily['Day']]
-    fig3.add_trace(go.Bar(
-        x=daily['Day'], y=daily['Count'],
-        marker=dict(color=colors, line=dict(width=2, color='rgba(255,255,255,0)'), cornerradius=8),
-        opacity=0.9,
-        hovertemplate='<b style="font-size: 14px; color: #ffffff;">%{x}</b><br><b>Jumlah Transaksi:</b> %{y:,}<extra></extra>'))
-    apply_layout(fig3, title='Distribusi Transaksi per Hari', xaxis_title='Hari',
-                 yaxis_title='Jumlah Transaksi')
-
-    s_order = ['Spring', 'Summer', 'Autumn', 'Winter']
-    s_col = {'Spring': '#10b981', 'Summer': '#f59e0b', 'Autumn': '#fb923c', 'Winter': '#0ea5e9'}
-    seasonal = dff.groupby('Season')['Revenue'].sum().reindex(s_order).reset_index()
-
-    fig4 = go.Figure()
-    fig4.add_trace(go.Bar(
-        x=seasonal['Season'], y=seasonal['Revenue'],
-        marker=dict(
-            color=[s_col.get(s, '#6366f1') for s in seasonal['Season']],
-            line=dict(width=2, color='rgba(255,255,255,0)'),
-            cornerradius=8
-        ),
-        opacity=0.9,
-        hovertemplate='<b style="font-size: 14px; color: #ffffff;">%{x}</b><br><b>Total Revenue:</b> £%{y:,.0f}<extra></extra>'))
-    apply_layout(fig4, title='Revenue per Musim', xaxis_title='Musim', yaxis_title='Revenue (£)')
-
-    return html.Div([
-        html.Div(className='section-title', children='Tren Penjualan'),
-        html.Div(className='grid-2', children=[
-            chart_card('Tren Revenue Bulanan', 'Pendapatan total per bulan', G(fig1), 'Time Series'),
-            chart_card('Jumlah Transaksi per Bulan', 'Volume transaksi bulanan', G(fig2), 'Bar Chart'),
-        ]),
-        html.Div(className='section-title', children='Pola Waktu'),
-        html.Div(className='grid-2', children=[
-            chart_card('Distribusi Transaksi per Hari', f'Hari dengan transaksi tertinggi: {peak}', G(fig3)),
-            chart_card('Revenue per Musim', 'Perbandingan revenue antar musim', G(fig4)),
-        ]),
-    ])
-
-
-def build_product(dff):
-    top10 = dff.groupby('ProductName')['Quantity'].sum().nlargest(10).reset_index().sort_values('Quantity')
-    fig1 = go.Figure()
-    fig1.add_trace(go.Bar(
-        y=top10['ProductName'].str[:35], x=top10['Quantity'],
-        orientation='h',
-        marker=dict(color='#6366f1', line=dict(width=2, color='rgba(255,255,255,0)'), cornerradius=8),
-        opacity=0.9,
-        hovertemplate='<b style="font-size: 14px; color: #ffffff;">%{y}</b><br><b>Total Quantity:</b> %{x:,} unit<extra></extra>'))
-    apply_layout(fig1, title='Produk dengan Penjualan Tertinggi', xaxis_title='Total Quantity', yaxis_title='')
-
-    fig2 = go.Figure()
-    if 'Product_Group' in dff.columns:
-        pg = dff.groupby('Product_Group')['Revenue'].sum().reindex(PRODUCT_GROUPS).dropna().reset_index()
-        fig2.add_trace(go.Pie(
-            labels=pg['Product_Group'], values=pg['Revenue'],
-            marker=dict(
-                colors=[COLOR_PRODUCT.get(g, '#6366f1') for g in pg['Product_Group']],
-                line=dict(color='#1e2235', width=2)
-            ),
-            hole=0.55, textinfo='percent+label', textposition='outside', textfont_size=11,
-            hovertemplate='<b style="font-size: 14px;">%{label}</b><br><b>Revenue:</b> £%{value:,.0f}<br>%{percent}<extra></extra>'))
-    apply_layout(fig2, title='Proporsi Revenue per Kelompok Produk', showlegend=False)
-
-    fig3 = go.Figure()
-    fig3.add_trace(go.Histogram(
-        x=dff['Price'], nbinsx=50,
-        marker=dict(color='#6366f1', line=dict(width=1, color='rgba(255,255,255,0.2)'), cornerradius=4),
-        opacity=0.85,
-        hovertemplate='<b>Harga Range:</b> £%{x:.2f}<br><b>Frekuensi:</b> %{y:,} produk<extra></extra>'))
-    apply_layout(fig3, title='Distribusi Harga Produk', xaxis_title='Harga (£)', yaxis_title='Frekuensi')
-
-    qt = dff.groupby('TransactionNo')['Quantity'].sum().reset_index()
-    p99 = qt['Quantity'].quantile(0.99)
-    fig4 = go.Figure()
-    fig4.add_trace(go.Histogram(
-        x=qt[qt['Quantity'] <= p99]['Quantity'], nbinsx=50,
-        marker=dict(color='#0ea5e9', line=dict(width=1, color='rgba(255,255,255,0.2)'), cornerradius=4),
-        opacity=0.85,
-        hovertemplate='<b>Quantity Range:</b> %{x:,.0f} unit<br><b>Frekuensi:</b> %{y:,} transaksi<extra></extra>'))
-    apply_layout(fig4, title=f'Distribusi Quantity per Transaksi',
-                 xaxis_title='Total Quantity', yaxis_title='Frekuensi')
-
-    return html.Div([
-        html.Div(className='section-title', children='Produk Terlaris'),
-        html.Div(className='grid-2', children=[
-            chart_card('Produk dengan Penjualan Tertinggi', 'Berdasarkan total jumlah unit terjual', G(fig1), 'Ranking'),
-            chart_card('Proporsi Revenue per Kelompok', 'Kategori: Very Freq → Very Rare', G(fig2), 'Donut'),
-        ]),
-        html.Div(className='section-title', children='Distribusi'),
-        html.Div(className='grid-2', children=[
-            chart_card('Distribusi Harga Produk', 'Histogram harga per unit (£)', G(fig3)),
-            chart_card('Distribusi Quantity per Transaksi', 'Histogram jumlah item per transaksi', G(fig4)),
-        ]),
-    ])
-
-
-def build_customer(dff):
-    fig1 = go.Figure()
-    if 'Customer_Segment' in dff.columns:
-        seg = dff.groupby('Customer_Segment')['CustomerNo'].nunique().reindex(CUSTOMER_SEGMENTS).dropna().reset_index()
-        seg.columns = ['Segment', 'Count']
-        fig1.add_trace(go.Bar(
-            x=seg['Segment'], y=seg['Count'],
-            marker=dict(
-                color=[COLOR_SEGMENT.get(s, '#6366f1') for s in seg['Segment']],
-                line=dict(width=2, color='rgba(255,255,255,0)'),
-                cornerradius=8
-            ),
-            opacity=0.9,
-            hovertemplate='<b style="font-size: 14px; color: #ffffff;">%{x}</b><br><b>Total Pelanggan:</b> %{y:,} orang<extra></extra>'))
-    apply_layout(fig1, title='Jumlah Pelanggan per Segmen', xaxis_title='Segmen', yaxis_title='Jumlah Pelanggan')
-
-    fig2 = go.Figure()
-    if 'Customer_Segment' in dff.columns:
-        sr = dff.groupby('Customer_Segment')['Revenue'].sum().reindex(CUSTOMER_SEGMENTS).dropna().reset_index()
-        fig2.add_trace(go.Pie(
-            labels=sr['Customer_Segment'], values=sr['Revenue'],
-            marker=dict(
-                colors=[COLOR_SEGMENT.get(s, '#6366f1') for s in sr['Customer_Segment']],
-                line=dict(color='#1e2235', width=2)
-            ),
-            hole=0.55, textinfo='percent+label', textposition='outside', textfont_size=11,
-            hovertemplate='<b style="font-size: 14px;">%{label}</b><br><b>Revenue:</b> £%{value:,.0f}<br>%{percent}<extra></extra>'))
-    apply_layout(fig2, title='Proporsi Revenue per Segmen', showlegend=False)
-
-    fig3 = go.Figure()
-    if 'Customer_Segment' in dff.columns:
-        ca = dff.groupby(['CustomerNo', 'Customer_Segment']).agg(
-            Frequency=('TransactionNo', 'nunique'), Monetary=('Revenue', 'sum')).reset_index()
-        # Optimize performance: sample data if > 2000 points to maintain smooth scrolling
-        if len(ca) > 2000:
-            ca = ca.sample(n=2000, random_state=42)
-        for s in CUSTOMER_SEGMENTS:
-            sub = ca[ca['Customer_Segment'] == s]
-            if len(sub) == 0:
-                continue
-            fig3.add_trace(go.Scattergl(
-                x=sub['Frequency'], y=sub['Monetary'], mode='markers', name=s,
-                marker=dict(
-                    color=COLOR_SEGMENT.get(s),
-                    size=8,
-                    opacity=0.7,
-                    line=dict(width=1, color='white')
-                ),
-                hovertemplate=f'<b style="font-size: 14px; color: #ffffff;">{s}</b><br><b>Transaksi Frequency:</b> %{{x}} kali<br><b>Total Revenue:</b> £%{{y:,.0f}}<extra></extra>'))
-    apply_layout(fig3, title='Segmentasi: Frequency vs Revenue',
-                 xaxis_title='Frequency (Jumlah Transaksi)', yaxis_title='Total Revenue (£)')
-
-    tc = dff.groupby('CustomerNo').agg(Revenue=('Revenue', 'sum')).nlargest(10, 'Revenue').reset_index()
-    tc = tc.sort_values('Revenue')
-    fig4 = go.Figure()
-    fig4.add_trace(go.Bar(
-        y=tc['CustomerNo'], x=tc['Revenue'], orientation='h',
-        marker=dict(color='#8b5cf6', line=dict(width=2, color='rgba(255,255,255,0)'), cornerradius=8),
-        text=[f'£{r:,.0f}' for r in tc['Revenue']], textposition='outside', textfont_size=10,
-        opacity=0.9,
-        hovertemplate='<b style="font-size: 14px; color: #ffffff;">Customer ID: %{y}</b><br><b>Total Revenue:</b> £%{x:,.0f}<extra></extra>'))
-    apply_layout(fig4, title='Pelanggan dengan Revenue Tertinggi', xaxis_title='Revenue (£)', yaxis_title='')
-
-    return html.Div([
-        html.Div(className='section-title', children='Segmentasi Pelanggan'),
-        html.Div(className='grid-2', children=[
-            chart_card('Jumlah Pelanggan per Segmen', 'Kategori: Loyal → Inactive', G(fig1), 'Segmentasi'),
-            chart_card('Proporsi Revenue per Segmen', 'Kontribusi revenue tiap segmen', G(fig2), 'Donut'),
-        ]),
-        html.Div(className='section-title', children='Detail Pelanggan'),
-        chart_card('Segmentasi: Frequency vs Revenue',
-                   'Pemetaan kontribusi pelanggan berdasarkan intensitas transaksi', G(fig3, GRAPH_STYLE_TALL)),
-        chart_card('Pelanggan dengan Revenue Tertinggi', 'Berdasarkan total revenue yang dihasilkan', G(fig4), 'Ranking'),
-    ])
-
-
-def build_geo(dff):
-    country_iso = {
-        'United Kingdom': 'GBR', 'Germany': 'DEU', 'France': 'FRA', 'Spain': 'ESP',
-        'Belgium': 'BEL', 'Switzerland': 'CHE', 'Portugal': 'PRT', 'Italy': 'ITA',
-        'Finland': 'FIN', 'Austria': 'AUT', 'Norway': 'NOR', 'Denmark': 'DNK',
-        'Netherlands': 'NLD', 'Australia': 'AUS', 'Sweden': 'SWE', 'Japan': 'JPN',
-        'Channel Islands': 'GBR', 'Poland': 'POL', 'Ireland': 'IRL', 'Iceland': 'ISL',
-        'Singapore': 'SGP', 'Czech Republic': 'CZE', 'Greece': 'GRC', 'Israel': 'ISR',
-        'Lithuania': 'LTU', 'United Arab Emirates': 'ARE', 'Cyprus': 'CYP',
-        'Canada': 'CAN', 'USA': 'USA', 'Brazil': 'BRA', 'Malta': 'MLT',
-        'Bahrain': 'BHR', 'RSA': 'ZAF', 'Saudi Arabia': 'SAU', 'Lebanon': 'LBN',
-        'EIRE': 'IRL', 'European Community': 'FRA', 'Unspecified': None,
-    }
-    md = dff.groupby('Country').agg(Transaksi=('TransactionNo', 'nunique'),
-                                     Revenue=('Revenue', 'sum')).reset_index()
-    md['ISO'] = md['Country'].map(country_iso)
-    md = md.dropna(subset=['ISO'])
-
-    fig_map = go.Figure()
-    fig_map.add_trace(go.Choropleth(
-        locations=md['ISO'], z=md['Transaksi'], text=md['Country'],
-        colorscale='YlOrRd', colorbar_title='Transaksi',
-        hovertemplate='<b>%{text}</b><br>Transaksi: %{z:,}<extra></extra>'))
-    apply_layout(fig_map, title='Peta Distribusi Transaksi per Negara',
-                 geo=dict(showframe=False, showcoastlines=True, projection_type='natural earth',
-                          bgcolor='rgba(0,0,0,0)', landcolor='#1a1d2e',
-                          coastlinecolor='rgba(255,255,255,0.15)'))
-
-    ct = (dff.groupby(['Country', 'Country_Group'])['TransactionNo'].nunique()
-          .reset_index().rename(columns={'TransactionNo': 'Transaksi'})
-          .sort_values('Transaksi', ascending=False).head(15).sort_values('Transaksi'))
-    fig_bar = go.Figure()
-    fig_bar.add_trace(go.Bar(
-        y=ct['Country'], x=ct['Transaksi'], orientation='h',
-        marker=dict(
-            color=[COLOR_COUNTRY.get(g, '#6366f1') for g in ct['Country_Group']],
-            line=dict(width=2, color='rgba(255,255,255,0)'),
-            cornerradius=8
-        ),
-        opacity=0.9,
-        hovertemplate='<b style="font-size: 14px; color: #ffffff;">%{y}</b><br><b>Total Transaksi:</b> %{x:,} transaksi<extra></extra>'))
-    apply_layout(fig_bar, title='Negara dengan Transaksi Tertinggi',
-                 xaxis_title='Jumlah Transaksi', yaxis_title='')
-
-    fig_pie = go.Figure()
-    if 'Country_Group' in dff.columns:
-        cg = dff.groupby('Country_Group')['Revenue'].sum().reindex(COUNTRY_GROUPS).dropna().reset_index()
-        fig_pie.add_trace(go.Pie(
-            labels=cg['Country_Group'], values=cg['Revenue'],
-            marker=dict(
-                colors=[COLOR_COUNTRY.get(g, '#6366f1') for g in cg['Country_Group']],
-                line=dict(color='#1e2235', width=2)
-            ),
-            hole=0.55, textinfo='percent+label', textposition='outside', textfont_size=11,
-            hovertemplate='<b style="font-size: 14px;">%{label}</b><br><b>Revenue:</b> £%{value:,.0f}<br>%{percent}<extra></extra>'))
-    apply_layout(fig_pie, title='Proporsi Revenue per Kelompok Negara', showlegend=False)
-
-    table_comp = html.Div()
-    if 'Country_Group' in dff.columns:
-        gt = (dff.groupby('Country_Group').agg(
-            Negara=('Country', 'nunique'), Transaksi=('TransactionNo', 'nunique'),
-            Revenue=('Revenue', 'sum'), Pelanggan=('CustomerNo', 'nunique'))
-              .reindex(COUNTRY_GROUPS).reset_index())
-        gt['AOV'] = (gt['Revenue'] / gt['Transaksi']).round(2)
-        gt['Revenue'] = gt['Revenue'].apply(lambda x: f'£{x:,.0f}')
-        gt['AOV'] = gt['AOV'].apply(lambda x: f'£{x:,.2f}')
-        gt.columns = ['Kelompok', 'Negara', 'Transaksi', 'Revenue', 'Pelanggan', 'AOV']
-        table_comp = dash_table.DataTable(
-            data=gt.to_dict('records'),
-            columns=[{'name': c, 'id': c} for c in gt.columns],
-            style_header={
-                'backgroundColor': '#1a1d2e', 'color': '#94a3b8', 'fontWeight': '600',
-                'fontSize': '11px', 'textTransform': 'uppercase', 'letterSpacing': '0.5px',
-                'border': 'none', 'borderBottom': '1px solid rgba(255,255,255,0.1)'},
-            style_cell={
-                'backgroundColor': '#1e2235', 'color': '#f1f5f9', 'fontSize': '13px',
-                'border': 'none', 'borderBottom': '1px solid rgba(255,255,255,0.05)',
-                'padding': '12px 16px', 'fontFamily': 'Inter, sans-serif'},
-            style_data_conditional=[
-                {'if': {'row_index': 'odd'}, 'backgroundColor': '#222640'}])
-
-    return html.Div([
-        html.Div(className='section-title', children='Peta Global'),
-        chart_card('Peta Distribusi Transaksi Global', 'Sebaran transaksi berdasarkan lokasi pelanggan',
-                   G(fig_map, GRAPH_STYLE_TALL), 'Map'),
-        html.Div(className='section-title', children='Perbandingan Negara'),
-        html.Div(className='grid-2', children=[
-            chart_card('Negara dengan Transaksi Tertinggi', 'Negara dikelompokkan berdasarkan tingkat aktivitas transaksi', G(fig_bar, GRAPH_STYLE_TALL)),
-            chart_card('Proporsi Revenue per Kelompok', 'Kategori: Tinggi → Rendah', G(fig_pie)),
-        ]),
-        html.Div(className='section-title', children='Ringkasan Data'),
-        html.Div(className='chart-card', children=[
-            html.Div(className='chart-card-header', children=[
-                html.Div([html.Div('Ringkasan per Kelompok Negara', className='chart-title'),
-                           html.Div('Perbandingan indikator utama', className='chart-subtitle')]),
-                html.Span('Table', className='chart-badge'),
-            ]),
-            table_comp,
-        ]),
-    ])
-
-
-# ============================================================
-# 8. APP LAYOUT
-# ============================================================
-app.layout = html.Div(className='grid-sidebar', children=[
-    create_sidebar(),
-    create_main_content(),
-])
-
-
-# ============================================================
-# 9. CALLBACKS
-# ============================================================
-@app.callback(
-    [Output('kpi-revenue', 'children'),
-     Output('kpi-transactions', 'children'),
-     Output('kpi-customers', 'children'),
-     Output('kpi-aov', 'children'),
-     Output('page-content', 'children')],
-    [Input('nav-menu', 'value'),
-     Input('filter-product-group', 'value'),
-     Input('filter-customer-segment', 'value'),
-     Input('filter-country-group', 'value')],
-)
-def update_dashboard(page, pg, cs, cg):
-    dff = fdf(df, pg, cs, cg)
-    total_rev = dff['Revenue'].sum()
-    total_trx = dff['TransactionNo'].nunique()
-    total_cust = dff['CustomerNo'].nunique()
-    aov = total_rev / total_trx if total_trx > 0 else 0
-
-    builders = {'overview': build_overview, 'product': build_product,
-                'customer': build_customer, 'geo': build_geo}
-    content = builders.get(page, build_overview)(dff)
-    return fmt(total_rev, '£', 1), fmt(total_trx), fmt(total_cust), f'£{aov:,.2f}', content
-
-
-# ============================================================
-# 10. RUN
-# ============================================================
-if __name__ == '__main__':
-    print(f"Dataset: {len(df):,} rows | Running at http://127.0.0.1:8050")
+import time
+
+STARTUP_T0 = time.perf_counter()  # cold-start timer, started before the imports below
+
+import dash
+from dash import dcc, html, dash_table
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
+import plotly.graph_objects as go
+from plotly.io.json import to_json_plotly
+from flask import Response, has_request_context, jsonify, request
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+import pandas as pd
+import numpy as np
+import base64
+import cProfile
+import fcntl
+import gzip
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import pstats
+import queue
+import resource
+import shutil
+import sqlite3
+import threading
+import tracemalloc
+
+import pipeline
+
+# ============================================================
+# 1. LOAD DATA & CONFIG
+# ============================================================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DASHBOARD_CSV = os.path.join(BASE_DIR, 'df_dashboard.csv')
+CLEAN_CSV = os.path.join(BASE_DIR, 'df_clean.csv')
+DATA_CSV = os.environ.get('DATA_CSV')  # overrides the two files above (e.g. benchmark data)
+# 'lazy' serves the layout shell at once and loads the data in a background
+# warm-up thread (section 17). 'eager' loads it at import, which gunicorn's
+# preload_app needs to share one copy of the data between workers.
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'eager')
+
+CACHE_VERSION = 2
+USE_DATA_CACHE = os.environ.get('DATA_CACHE', '1') != '0'
+# Seconds between polls for new rows (0 = data is loaded once at startup).
+WATCH_INTERVAL = float(os.environ.get('WATCH_INTERVAL', '0'))
+DELTA_DIR = os.environ.get('DELTA_DIR', os.path.join(BASE_DIR, 'delta'))
+# 'stream' builds the aggregates chunk by chunk for CSVs that do not fit in memory.
+LOAD_MODE = os.environ.get('LOAD_MODE', 'memory')
+STREAM_MEMORY_MB = float(os.environ.get('STREAM_MEMORY_MB', '512'))
+STREAM_SAMPLE_ROWS = int(os.environ.get('STREAM_SAMPLE_ROWS', '100000'))
+# 'sql' keeps the data in an on-disk SQLite file and answers every selection
+# with queries instead of holding the rows and the cube in each worker.
+QUERY_ENGINE = os.environ.get('QUERY_ENGINE', 'pandas')
+
+# Label and ID columns are kept as categoricals, so filters and groupbys work
+# on integer codes instead of comparing Python strings. For the IDs the codes
+# are the integer keys and the categories their lookup table for display.
+CATEGORY_COLS = ['Product_Group', 'Customer_Segment', 'Country_Group', 'Country', 'ProductName',
+                 'CustomerNo', 'TransactionNo']
+# Calendar columns are functions of Date, so rows do not store them;
+# with_date_parts() adds them where they are grouped by or exported.
+DATE_PART_COLS = ['YearMonth', 'DayName', 'Season']
+SEASON_BY_MONTH = np.array([None, 'Winter', 'Winter', 'Spring', 'Spring', 'Spring', 'Summer',
+                            'Summer', 'Summer', 'Autumn', 'Autumn', 'Autumn', 'Winter'], dtype=object)
+
+
+def source_csv():
+    if DATA_CSV:
+        return DATA_CSV
+    for path in (DASHBOARD_CSV, CLEAN_CSV):
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError("File df_dashboard.csv atau df_clean.csv tidak ditemukan.")
+
+
+def normalize(frame):
+    frame.drop(columns=DATE_PART_COLS, errors='ignore', inplace=True)
+    frame['Date'] = pd.to_datetime(frame['Date'])
+    frame['TransactionNo'] = frame['TransactionNo'].astype(str)
+    frame['CustomerNo'] = frame['CustomerNo'].astype(str)
+    frame['Revenue'] = pd.to_numeric(frame['Revenue'], errors='coerce').fillna(0)
+    frame['Quantity'] = pd.to_numeric(frame['Quantity'], errors='coerce').fillna(0)
+
+    for col in CATEGORY_COLS:
+        frame[col] = frame[col].astype('category')
+    for col in frame.columns[frame.dtypes == object]:
+        frame[col] = frame[col].astype('category')
+    for col in frame.columns:
+        frame[col] = downcast(frame[col])
+    return frame
+
+
+def downcast(s):
+    # int32/float32 only when every value survives the round trip, so sums and
+    # the prices histogram see the same numbers. Cent amounts rarely do in float32.
+    if s.dtype == np.int64 and (s.empty or (np.iinfo(np.int32).min <= s.min() and s.max() <= np.iinfo(np.int32).max)):
+        return s.astype(np.int32)
+    if s.dtype == np.float64:
+        small = s.astype(np.float32)
+        if np.array_equal(small.to_numpy(np.float64), s.to_numpy(), equal_nan=True):
+            return small
+    return s
+
+
+def date_parts(dates):
+    # Computed once per distinct day and broadcast through the day codes.
+    codes, days = pd.factorize(dates, sort=True)
+    days = pd.DatetimeIndex(days)
+    values = {'YearMonth': days.strftime('%Y-%m'), 'DayName': days.day_name(), 'Season': SEASON_BY_MONTH[days.month]}
+    parts = {}
+    for col, per_day in values.items():
+        part_codes, categories = pd.factorize(np.asarray(per_day, dtype=object), sort=True)
+        parts[col] = pd.Categorical.from_codes(np.where(codes < 0, -1, part_codes[codes]) if len(part_codes) else codes,
+                                               categories=categories)
+    return parts
+
+
+def with_date_parts(frame):
+    return pd.concat([frame, pd.DataFrame(date_parts(frame['Date']), index=frame.index)], axis=1, copy=False)
+
+
+def column_mb(frame):
+    return frame.memory_usage(index=False, deep=True) / 2 ** 20
+
+
+def memory_report(before, after):
+    # Per-column MB as parsed from the CSV and as kept after normalize().
+    report = pd.DataFrame({'before_mb': before, 'after_mb': after}).fillna(0)
+    report.loc['Total'] = report.sum()
+    return report.round(2)
+
+
+# ------------------------------------------------------------
+# Columnar cache: the normalized frame is stored next to the CSV as one .npy
+# file per column (category codes + a JSON category list for labels). A valid
+# cache is memory-mapped read-only, so startup neither parses nor copies rows.
+# ------------------------------------------------------------
+def cache_dir_for(src):
+    return src + '.cache'
+
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def read_cache(src):
+    cache_dir = cache_dir_for(src)
+    manifest_path = os.path.join(cache_dir, 'manifest.json')
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    st = os.stat(src)
+    if manifest.get('version') != CACHE_VERSION or manifest.get('size') != st.st_size:
+        return None
+    if manifest.get('mtime_ns') != st.st_mtime_ns:
+        # Touched but possibly unchanged (e.g. re-copied on deploy): compare content hashes.
+        if manifest.get('sha1') != file_digest(src):
+            return None
+        manifest['mtime_ns'] = st.st_mtime_ns
+        try:
+            with open(manifest_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+        except OSError:
+            pass
+
+    columns = {}
+    for i, col in enumerate(manifest['columns']):
+        base = os.path.join(cache_dir, f'col{i}')
+        values = np.load(base + '.npy', mmap_mode='r')
+        if col['kind'] == 'category':
+            with open(base + '.categories.json', encoding='utf-8') as f:
+                categories = json.load(f)
+            columns[col['name']] = pd.Categorical.from_codes(values, categories=categories)
+        elif col['kind'] == 'datetime':
+            columns[col['name']] = pd.Series(values.view('datetime64[ns]'), copy=False)
+        else:
+            columns[col['name']] = pd.Series(values, copy=False)
+    return pd.DataFrame(columns, copy=False)
+
+
+def write_cache(frame, src):
+    cache_dir = cache_dir_for(src)
+    tmp_dir = f'{cache_dir}.tmp{os.getpid()}'
+    columns = []
+    try:
+        os.makedirs(tmp_dir, exist_ok=True)
+        for i, (name, s) in enumerate(frame.items()):
+            base = os.path.join(tmp_dir, f'col{i}')
+            if isinstance(s.dtype, pd.CategoricalDtype):
+                np.save(base + '.npy', s.cat.codes.to_numpy())
+                with open(base + '.categories.json', 'w', encoding='utf-8') as f:
+                    json.dump(s.cat.categories.tolist(), f)
+                columns.append({'name': name, 'kind': 'category'})
+            elif s.dtype.kind == 'M':
+                np.save(base + '.npy', s.to_numpy('datetime64[ns]').view('int64'))
+                columns.append({'name': name, 'kind': 'datetime'})
+            else:
+                np.save(base + '.npy', s.to_numpy())
+                columns.append({'name': name, 'kind': 'numeric'})
+
+        st = os.stat(src)
+        manifest = {'version': CACHE_VERSION, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                    'sha1': file_digest(src), 'rows': len(frame), 'columns': columns}
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.replace(tmp_dir, cache_dir)
+        return True
+    except OSError as e:
+        # A read-only deploy directory only costs us the cache, not the app.
+        print(f"Cache tidak dapat ditulis: {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False
+
+
+def load_dataset():
+    src = source_csv()
+    if USE_DATA_CACHE:
+        cached = read_cache(src)
+        if cached is not None:
+            return cached
+    raw = pd.read_csv(src, encoding='utf-8-sig')
+    before = column_mb(raw)
+    frame = normalize(raw)
+    print(f"Memori per kolom (MB):\n{memory_report(before, column_mb(frame)).to_string()}")
+    if USE_DATA_CACHE and write_cache(frame, src):
+        # Re-open through the cache so the columns are file-backed pages that
+        # every worker process maps read-only, instead of a private heap copy.
+        return read_cache(src)
+    return frame
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Cold-start timings in seconds, reported by /ready and printed once ready.
+STARTUP = {'mode': STARTUP_MODE, 'imports_s': round(time.perf_counter() - STARTUP_T0, 3)}
+
+
+@contextmanager
+def startup_timer(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP[f'{name}_s'] = round(time.perf_counter() - t0, 3)
+
+
+SOURCE_CSV = source_csv()
+SOURCE_STAT = os.stat(SOURCE_CSV)
+LOAD_REPORT = {}
+# Set by load_state() (section 4). In 'stream' mode df is only a sample; see stream_dataset().
+# Ingested rows are not appended to it but kept as further FILTER_INDEX segments (section 14).
+df = None
+# Part of every render-cache key: a reload with different data never serves stale pages.
+BASE_VERSION = f'{SOURCE_STAT.st_size}-{SOURCE_STAT.st_mtime_ns}'
+DATA_VERSION = None  # BASE_VERSION once load_state() has run
+# What has been ingested past the source as it was at startup (section 14).
+INGEST_LOCK = threading.Lock()
+INGEST_STATE = {'offset': SOURCE_STAT.st_size, 'deltas': set(), 'pid': None}
+
+
+def ingested_version():
+    # Derived from what was ingested, not how it was chunked, so workers agree.
+    if INGEST_STATE['offset'] == SOURCE_STAT.st_size and not INGEST_STATE['deltas']:
+        return BASE_VERSION
+    deltas = hashlib.sha1('\n'.join(sorted(INGEST_STATE['deltas'])).encode()).hexdigest()[:8]
+    return f"{BASE_VERSION}+{INGEST_STATE['offset']}+{deltas}"
+
+
+# Assigned by the batch pipeline (pipeline.py), which owns the vocabularies.
+PRODUCT_GROUPS = pipeline.PRODUCT_GROUPS
+CUSTOMER_SEGMENTS = pipeline.CUSTOMER_SEGMENTS
+COUNTRY_GROUPS = pipeline.COUNTRY_GROUPS
+
+COLOR_PRODUCT = {
+    'Very Frequently Purchased': '#10b981', 'Frequently Purchased': '#0ea5e9',
+    'Moderately Purchased': '#f59e0b', 'Rarely Purchased': '#fb923c',
+    'Very Rarely Purchased': '#f43f5e',
+}
+COLOR_SEGMENT = {
+    'Loyal': '#10b981', 'Active': '#0ea5e9',
+    'Occasional': '#f59e0b', 'Inactive': '#f43f5e',
+}
+COLOR_COUNTRY = {
+    'Transaksi Tinggi': '#10b981', 'Transaksi Sedang': '#f59e0b',
+    'Transaksi Rendah': '#f43f5e',
+}
+
+COUNTRY_ISO = {
+    'United Kingdom': 'GBR', 'Germany': 'DEU', 'France': 'FRA', 'Spain': 'ESP',
+    'Belgium': 'BEL', 'Switzerland': 'CHE', 'Portugal': 'PRT', 'Italy': 'ITA',
+    'Finland': 'FIN', 'Austria': 'AUT', 'Norway': 'NOR', 'Denmark': 'DNK',
+    'Netherlands': 'NLD', 'Australia': 'AUS', 'Sweden': 'SWE', 'Japan': 'JPN',
+    'Channel Islands': 'GBR', 'Poland': 'POL', 'Ireland': 'IRL', 'Iceland': 'ISL',
+    'Singapore': 'SGP', 'Czech Republic': 'CZE', 'Greece': 'GRC', 'Israel': 'ISR',
+    'Lithuania': 'LTU', 'United Arab Emirates': 'ARE', 'Cyprus': 'CYP',
+    'Canada': 'CAN', 'USA': 'USA', 'Brazil': 'BRA', 'Malta': 'MLT',
+    'Bahrain': 'BHR', 'RSA': 'ZAF', 'Saudi Arabia': 'SAU', 'Lebanon': 'LBN',
+    'EIRE': 'IRL', 'European Community': 'FRA', 'Unspecified': None,
+}
+
+BASE_LAYOUT = dict(
+    paper_bgcolor='rgba(0,0,0,0)',
+    plot_bgcolor='rgba(0,0,0,0)',
+    font=dict(family='Inter, sans-serif', color='#94a3b8', size=12),
+    title_font=dict(family='Inter, sans-serif', color='#f1f5f9', size=15),
+    xaxis=dict(gridcolor='rgba(255,255,255,0.06)', zerolinecolor='rgba(255,255,255,0.06)'),
+    yaxis=dict(gridcolor='rgba(255,255,255,0.06)', zerolinecolor='rgba(255,255,255,0.06)'),
+    margin=dict(l=40, r=20, t=50, b=40),
+    legend=dict(font=dict(size=11, color='#94a3b8')),
+    hoverlabel=dict(
+        bgcolor='#1e2235',
+        bordercolor='#6366f1',
+        font=dict(family='Inter, sans-serif', size=13, color='#f1f5f9')
+    ),
+)
+
+GRAPH_STYLE = {'height': '380px'}
+GRAPH_STYLE_TALL = {'height': '440px'}
+CHART_CFG = {'displayModeBar': True, 'displaylogo': False,
+             'modeBarButtonsToRemove': ['lasso2d', 'select2d']}
+
+
+def apply_layout(fig, **kw):
+    with stage('apply_layout'):
+        fig.update_layout(**{**BASE_LAYOUT, **kw})
+    return fig
+
+
+# Placeholder for graph slots until their callback fills them. A plain dict, since
+# go.Figure would embed the full default template in every page layout.
+EMPTY_FIGURE = {'data': [], 'layout': {**BASE_LAYOUT, 'xaxis': {'visible': False}, 'yaxis': {'visible': False}}}
+
+
+# ============================================================
+# 2. HELPERS
+# ============================================================
+def fmt(n, prefix='', decimals=0):
+    if n >= 1_000_000:
+        return f"{prefix}{n/1_000_000:,.{decimals}f}M"
+    if n >= 1_000:
+        return f"{prefix}{n/1_000:,.{decimals}f}K"
+    return f"{prefix}{n:,.{decimals}f}"
+
+
+def weighted_quantile(counts, q):
+    # Same result as Series.quantile(q) (linear) on the values expanded by their counts.
+    counts = counts[counts > 0]
+    if counts.empty:
+        return np.nan
+    cum = counts.cumsum().to_numpy()
+    pos = (cum[-1] - 1) * q
+    lo, hi = int(np.floor(pos)), int(np.ceil(pos))
+    vals = counts.index.to_numpy()
+    v_lo = vals[np.searchsorted(cum, lo, side='right')]
+    v_hi = vals[np.searchsorted(cum, hi, side='right')]
+    return v_lo + (v_hi - v_lo) * (pos - lo)
+
+
+# Stage timings of the current callback (see PROFILING); a no-op outside one.
+PROFILE_LOCAL = threading.local()
+
+
+@contextmanager
+def stage(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages = getattr(PROFILE_LOCAL, 'stages', None)
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + (time.perf_counter() - t0) * 1e3
+
+
+HIST_BINS = 50
+
+
+def nice_bin_edges(lo, hi, nbins=HIST_BINS):
+    # At most nbins bins of a 1/2/2.5/5 x 10^k width aligned to that width, like plotly's autobin.
+    if not np.isfinite(lo) or not np.isfinite(hi):
+        return np.array([0.0, 1.0])
+    raw = (hi - lo) / nbins if hi > lo else 1.0
+    base = 10 ** np.floor(np.log10(raw))
+    size = next(m * base for m in (1, 2, 2.5, 5, 10) if m * base >= raw)
+    start = np.floor(lo / size) * size
+    n = max(int(np.floor((hi - start) / size)) + 1, 1)
+    return start + size * np.arange(n + 1)
+
+
+def histogram_bins(counts, nbins=HIST_BINS):
+    # counts: value -> count Series (a value-count histogram); returns one row per bin.
+    counts = counts[counts > 0]
+    values = counts.index.to_numpy(dtype=float)
+    edges = nice_bin_edges(values.min() if len(values) else np.nan, values.max() if len(values) else np.nan, nbins)
+    idx = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+    totals = np.bincount(idx, weights=counts.to_numpy(dtype=float), minlength=len(edges) - 1)
+    return pd.DataFrame({'start': edges[:-1], 'end': edges[1:], 'Count': totals.astype(np.int64)})
+
+
+def stat_values(stats):
+    if stats is None:
+        return ('—',) * 5  # not loaded yet (STARTUP_MODE=lazy)
+    return (f"{stats['start'].strftime('%b %Y')} — {stats['end'].strftime('%b %Y')}",
+            f"{stats['transactions']:,}", f"{stats['products']:,}",
+            f"{stats['customers']:,}", f"{stats['countries']}")
+
+
+def G(graph_id, style=None):
+    # Figures are filled in by the page's callback; the layout only carries the slot.
+    return dcc.Graph(id=graph_id, figure=EMPTY_FIGURE, config=CHART_CFG,
+                     style=style or GRAPH_STYLE, responsive=True)
+
+
+def chart_card(title, subtitle, graph, badge=None, subtitle_id=None, control=None):
+    subtitle = html.Div(subtitle, className='chart-subtitle', **({'id': subtitle_id} if subtitle_id else {}))
+    header_children = [
+        html.Div([
+            html.Div(title, className='chart-title'),
+            subtitle,
+        ])
+    ]
+    if badge:
+        header_children.append(html.Span(badge, className='chart-badge'))
+    if control is not None:
+        header_children.append(control)
+    return html.Div(className='chart-card', children=[
+        html.Div(className='chart-card-header', children=header_children),
+        graph,
+    ])
+
+
+def top_k_control(component_id):
+    return dcc.Dropdown(id=component_id, options=[{'label': f'Top {k}', 'value': k} for k in TOP_K_OPTIONS],
+                        value=TOP_K_OPTIONS[0], clearable=False, searchable=False,
+                        className='dash-dropdown', style={'width': '110px'})
+
+
+# ============================================================
+# 3. FILTER ENGINE
+# ============================================================
+# CUBE_COLS are the dimensions whose combinations are precomputed; Country
+# is finer than Country_Group, so it only splits leaves further.
+CUBE_COLS = ['Product_Group', 'Customer_Segment', 'Country_Group']
+FILTER_COLS = CUBE_COLS + ['Country']
+
+
+def selection(value):
+    # A dropdown value as 'All', one value, or a sorted tuple of values (multi-select).
+    if value is None or isinstance(value, str):
+        return value or 'All'
+    values = tuple(sorted(set(value)))
+    if not values or 'All' in values:
+        return 'All'
+    return values[0] if len(values) == 1 else values
+
+
+def filter_key(*values):
+    # Filters left out by a caller (e.g. Country) select everything.
+    values = values + (None,) * (len(FILTER_COLS) - len(values))
+    return tuple(selection(v) for v in values)
+
+
+def selected_values(val):
+    return (val,) if isinstance(val, str) else val
+
+
+def build_filter_masks(df_src):
+    # One boolean row mask per filter value, computed once from the category codes.
+    masks = {}
+    for col in FILTER_COLS:
+        codes = df_src[col].cat.codes.to_numpy()
+        for i, val in enumerate(df_src[col].cat.categories):
+            m = codes == i
+            # Shared with forked workers (preload_app): never written after startup.
+            m.flags.writeable = False
+            masks[(col, val)] = m
+    return masks
+
+
+def row_selection(masks, n_rows, *values):
+    sel = None
+    for col, val in zip(FILTER_COLS, filter_key(*values)):
+        if val == 'All':
+            continue
+        # A multi-select is the union of its values' masks; unknown values add nothing.
+        hits = [masks[(col, v)] for v in selected_values(val) if (col, v) in masks]
+        m = np.logical_or.reduce(hits) if len(hits) > 1 else hits[0] if hits else np.zeros(n_rows, dtype=bool)
+        sel = m if sel is None else sel & m
+    return sel
+
+
+def fdf(df_src, pg, cs, cg, co=None):
+    # No full-frame copy: 'All' returns df_src itself, so callers must treat the result as read-only.
+    frame, masks = FILTER_INDEX[0]
+    if df_src is not frame:
+        masks = build_filter_masks(df_src)
+    sel = row_selection(masks, len(df_src), pg, cs, cg, co)
+    return df_src if sel is None else df_src[sel]
+
+
+# ============================================================
+# 4. AGGREGATE CUBE
+# ============================================================
+# Every (Product_Group, Customer_Segment, Country_Group) combination,
+# including 'All', is aggregated once at startup. Other selections (a
+# Country, several values of one filter) are rolled up from the same leaf
+# tables on first use. Callbacks only read these small tables, so their cost
+# no longer depends on the number of rows.
+KEY_COLS = ['TransactionNo', 'CustomerNo', 'Date', 'YearMonth', 'DayName', 'Season']
+DAY_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+SEASON_ORDER = ['Spring', 'Summer', 'Autumn', 'Winter']
+# Top product/customer lists keep max(TOP_K_OPTIONS) rows per entry, so any
+# selectable K is a slice of them.
+TOP_K_OPTIONS = [10, 25, 100]
+
+
+def cube_tables(df_src):
+    # Leaf-level partial aggregates. 'keys' keeps every distinct ID/attribute
+    # combination per leaf, so distinct counts over any roll-up stay exact.
+    df_src = with_date_parts(df_src)
+
+    def leaf(cols):
+        return df_src.groupby(FILTER_COLS + cols, dropna=False, observed=True)
+
+    return {
+        'keys': df_src[FILTER_COLS + KEY_COLS].drop_duplicates(),
+        'revenue': leaf(['YearMonth', 'Season'])['Revenue'].sum().reset_index(),
+        'products': leaf(['ProductName'])['Quantity'].sum().reset_index(),
+        'customers': leaf(['CustomerNo'])['Revenue'].sum().reset_index(),
+        'prices': leaf(['Price']).size().rename('Count').reset_index(),
+        'trx_qty': leaf(['TransactionNo'])['Quantity'].sum().reset_index(),
+        'days': leaf(['Date'])['Revenue'].sum().reset_index(),
+    }
+
+
+# ------------------------------------------------------------
+# Distinct counts: transactions/customers per (leaf, group) bucket on integer
+# category codes. A leaf is one combination of FILTER_COLS values; any filter
+# selection, multi-selects included, is a set of leaves, and counts over it
+# are unions of the leaves' ID sets instead of nunique() over the 'keys' table.
+# ------------------------------------------------------------
+DISTINCT_MODE = os.environ.get('DISTINCT_MODE', 'exact')  # or 'hll' for very large ID spaces
+HLL_PRECISION = int(os.environ.get('HLL_PRECISION', '12'))
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+
+def splitmix64(x):
+    x = x.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+class DistinctCounter:
+    # 'exact' keeps each bucket's IDs as a sorted code array, one slice of a
+    # flat array, plus a packed bitmap once denser than 1/32, so unions are
+    # exact. 'hll' keeps HyperLogLog registers; relative error is about
+    # 1.04 / sqrt(2 ** precision), i.e. 1.6% at the default precision of 12.
+    def __init__(self, leaf, ids, n_leaves, group=None, mode='exact', precision=12, carry=None):
+        # ids: a categorical Series of IDs per row; group: an optional
+        # categorical Series splitting each bucket further (e.g. by month).
+        # carry: this counter before an ingest; the buckets of leaves without
+        # rows here are taken from it, recoded to the new categories.
+        self.n_leaves, self.mode = n_leaves, mode
+        self.id_categories = ids.cat.categories
+        self.n_ids = n_ids = len(self.id_categories)
+        self.group_dtype = None if group is None else group.dtype
+        self.group_name = None if group is None else group.name
+        self.n_groups = 1 if group is None else len(group.cat.categories)
+        codes = ids.cat.codes.to_numpy().astype(np.int64)
+        group = np.zeros(len(codes), dtype=np.int64) if group is None else group.cat.codes.to_numpy().astype(np.int64)
+        leaf = np.asarray(leaf, dtype=np.int64)
+        kept = None
+        if carry is not None:
+            kept = np.ones(carry.n_leaves, dtype=bool)
+            kept[leaf[leaf < carry.n_leaves]] = False
+            group_map = (np.zeros(1, dtype=np.int64) if self.group_dtype is None else
+                         self.group_dtype.categories.get_indexer(carry.group_dtype.categories))
+            id_map = self.id_categories.get_indexer(carry.id_categories)
+        valid = (group >= 0) & (codes >= 0)
+        bucket = leaf[valid] * self.n_groups + group[valid]
+        codes = codes[valid]
+
+        if mode == 'hll':
+            self.m = 1 << precision
+            h = splitmix64(codes)
+            reg = (h >> np.uint64(64 - precision)).astype(np.int64)
+            # Rank of the first set bit in the next 32 hash bits (1-based, 33 if none).
+            rest = ((h >> np.uint64(32 - precision)) & np.uint64(0xFFFFFFFF)).astype(np.float64)
+            rho = 33 - np.frexp(rest)[1]
+            regs = np.zeros((n_leaves, self.n_groups, self.m), dtype=np.uint8)
+            if kept is not None:
+                rows = np.flatnonzero(kept)
+                regs[np.ix_(rows, group_map)] = carry.regs[rows]
+            np.maximum.at(regs.reshape(-1), bucket * self.m + reg, rho.astype(np.uint8))
+            self.regs = regs
+            return
+
+        keys = np.unique(bucket * n_ids + codes)
+        if kept is not None:
+            # Both code maps keep the order, so the sort only merges two sorted runs.
+            old_bucket = np.repeat(np.arange(len(carry.sizes)), carry.sizes)
+            old_leaf, old_group = np.divmod(old_bucket, carry.n_groups)
+            keep = kept[old_leaf]
+            carried = ((old_leaf[keep] * self.n_groups + group_map[old_group[keep]]) * n_ids
+                       + id_map[carry.ids[keep]])
+            keys = np.sort(np.concatenate([carried, keys]), kind='stable')
+        bucket, ids = keys // n_ids, (keys % n_ids).astype(np.uint32)
+        bounds = np.searchsorted(bucket, np.arange(n_leaves * self.n_groups + 1))
+        # IDs sorted by (leaf, group): a run of groups of one leaf is one slice.
+        self.ids, self.bounds, self.sizes = ids, bounds, np.diff(bounds)
+        self.bitmaps = {}
+        for b in np.flatnonzero(self.sizes * 32 > n_ids):
+            bits = np.zeros(n_ids, dtype=bool)
+            bits[ids[bounds[b]:bounds[b + 1]]] = True
+            self.bitmaps[b] = np.packbits(bits)
+
+    def _union_size(self, buckets):
+        buckets = buckets[self.sizes[buckets] > 0]
+        if len(buckets) <= 1:
+            return int(self.sizes[buckets].sum())
+        bitmaps = [self.bitmaps[b] for b in buckets if b in self.bitmaps]
+        arrays = [self.ids[self.bounds[b]:self.bounds[b + 1]] for b in buckets if b not in self.bitmaps]
+        if not bitmaps and sum(len(a) for a in arrays) * 16 < self.n_ids:
+            return len(np.unique(np.concatenate(arrays)))
+        bits = np.bitwise_or.reduce(bitmaps) if bitmaps else np.zeros((self.n_ids + 7) // 8, dtype=np.uint8)
+        if arrays:
+            extra = np.zeros(self.n_ids, dtype=bool)
+            extra[np.concatenate(arrays)] = True
+            bits = bits | np.packbits(extra)
+        return int(POPCOUNT[bits].sum())
+
+    def _hll_estimate(self, regs):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        est = alpha * m * m / np.power(2.0, -regs.astype(np.float64)).sum(axis=-1)
+        zeros = (regs == 0).sum(axis=-1)
+        # Linear counting for small cardinalities.
+        small = (est <= 2.5 * m) & (zeros > 0)
+        est[small] = m * np.log(m / zeros[small])
+        return np.rint(est).astype(np.int64)
+
+    def counts(self, leaves):
+        leaves = np.asarray(leaves, dtype=np.int64)
+        if len(leaves) == 0:
+            return np.zeros(self.n_groups, dtype=np.int64)
+        if self.mode == 'hll':
+            return self._hll_estimate(self.regs[leaves].max(axis=0))
+        return np.array([self._union_size(leaves * self.n_groups + g) for g in range(self.n_groups)],
+                        dtype=np.int64)
+
+    def count(self, leaves):
+        return int(self.counts(leaves)[0])
+
+    def count_range(self, leaves, lo, hi):
+        # Distinct IDs over groups lo..hi-1 together, e.g. a run of days on a sorted date grid.
+        leaves = np.asarray(leaves, dtype=np.int64)
+        if len(leaves) == 0 or hi <= lo:
+            return 0
+        if self.mode == 'hll':
+            return int(self._hll_estimate(self.regs[leaves, lo:hi].max(axis=(0, 1))[None])[0])
+        seen = np.zeros(self.n_ids, dtype=bool)
+        for a, b in zip(self.bounds[leaves * self.n_groups + lo], self.bounds[leaves * self.n_groups + hi]):
+            seen[self.ids[a:b]] = True
+        return int(np.count_nonzero(seen))
+
+    def by_group(self, leaves):
+        # Non-zero counts indexed by group label, like groupby(...).nunique().
+        counts = self.counts(leaves)
+        hit = np.flatnonzero(counts)
+        index = pd.CategoricalIndex(pd.Categorical.from_codes(hit, dtype=self.group_dtype),
+                                    name=self.group_name)
+        return pd.Series(counts[hit], index=index)
+
+
+def distinct_index(keys, mode=None, precision=None, carry=None):
+    # carry: (index, touched) after an ingest, keys being the merged table and
+    # touched the delta's leaves (FILTER_COLS rows). Only the touched leaves'
+    # rows are counted, every other bucket is carried over from index; leaf
+    # numbers stay as they were and new leaves are numbered after them.
+    mode = mode or DISTINCT_MODE
+    precision = precision or HLL_PRECISION
+    rows, old = keys, {}
+    if carry is None:
+        leaf = keys.groupby(FILTER_COLS, dropna=False, observed=True, sort=False).ngroup().to_numpy()
+        _, first = np.unique(leaf, return_index=True)
+        leaves = keys[FILTER_COLS].iloc[first].reset_index(drop=True)
+        calendar = keys[['Date'] + DATE_PART_COLS]
+    else:
+        old, touched = carry
+        dtypes = {col: keys[col].dtype for col in FILTER_COLS}
+        leaves, touched = old['leaves'].astype(dtypes), touched.astype(dtypes)
+        touched_codes = leaf_codes(touched)
+        leaves = pd.concat([leaves, touched[~np.isin(touched_codes, leaf_codes(leaves))]], ignore_index=True)
+        # HLL registers hash the ID codes: they are only carried while new IDs
+        # sort after the old ones, else everything is counted again.
+        if mode != 'hll' or all(keys[col].cat.categories[:old[name].n_ids].equals(old[name].id_categories)
+                                for name, col in (('trx', 'TransactionNo'), ('customers', 'CustomerNo'))):
+            rows = keys[np.isin(leaf_codes(keys), touched_codes)]
+        else:
+            old = {'calendar': old['calendar']}
+        leaf = pd.Index(leaf_codes(leaves)).get_indexer(leaf_codes(rows))
+        calendar = pd.concat([old['calendar'].reset_index().astype({col: rows[col].dtype for col in DATE_PART_COLS}),
+                              rows[['Date'] + DATE_PART_COLS]])
+    index = {'leaves': leaves}
+
+    def counter(name, id_col, group=None, precision=precision):
+        index[name] = DistinctCounter(leaf, rows[id_col], len(leaves), group, mode, precision, old.get(name))
+
+    counter('trx', 'TransactionNo')
+    counter('customers', 'CustomerNo')
+    for col in ('YearMonth', 'DayName', 'Country'):
+        counter(f'trx_by_{col}', 'TransactionNo', rows[col])
+    # The day grid for date ranges: sorted distinct dates with their labels.
+    calendar = calendar.drop_duplicates('Date').sort_values('Date').set_index('Date')
+    index['calendar'] = calendar
+    # One bucket per (leaf, day); HLL registers are capped at 2 ** 8 per bucket
+    # (about 6.5% error) to keep leaves x days x registers small.
+    date = rows['Date'].astype(pd.CategoricalDtype(calendar.index))
+    counter('trx_by_Date', 'TransactionNo', date, min(precision, 8))
+    counter('customers_by_Date', 'CustomerNo', date, min(precision, 8))
+    return index
+
+
+def leaf_codes(frame):
+    # One integer per row naming its leaf, comparable between frames whose FILTER_COLS share dtypes.
+    codes = np.zeros(len(frame), dtype=np.int64)
+    for col in FILTER_COLS:
+        codes = codes * (len(frame[col].cat.categories) + 1) + frame[col].cat.codes.to_numpy() + 1
+    return codes
+
+
+def select_leaves(t, key):
+    mask = np.ones(len(t), dtype=bool)
+    for col, val in zip(FILTER_COLS, key):
+        if isinstance(val, str):
+            if val != 'All':
+                mask &= (t[col] == val).to_numpy()
+        else:
+            mask &= t[col].isin(val).to_numpy()
+    return t[mask]
+
+
+def cube_entry(tables, index, key):
+    leaves = select_leaves(index['leaves'], key)
+    ids = leaves.index
+    keys = select_leaves(tables['keys'], key)
+    rev = select_leaves(tables['revenue'], key)
+    prods = select_leaves(tables['products'], key)
+    custs = select_leaves(tables['customers'], key)
+    prices = select_leaves(tables['prices'], key)
+    trx_qty = select_leaves(tables['trx_qty'], key)
+
+    def partition(col, counter):
+        return {val: index[counter].by_group(part.index) if counter.startswith('trx_by_')
+                else index[counter].count(part.index)
+                for val, part in leaves.groupby(col, observed=True)}
+
+    monthly = (rev.groupby('YearMonth', observed=True)['Revenue'].sum().to_frame()
+               .join(index['trx_by_YearMonth'].by_group(ids).rename('Transaksi'))
+               .reset_index().sort_values('YearMonth'))
+    daily = index['trx_by_DayName'].by_group(ids).reindex(DAY_ORDER).reset_index()
+    daily.columns = ['Day', 'Count']
+    seasonal = rev.groupby('Season', observed=True)['Revenue'].sum().reindex(SEASON_ORDER).reset_index()
+
+    top_products = prods.groupby('ProductName', observed=True)['Quantity'].sum().nlargest(max(TOP_K_OPTIONS)).reset_index()
+    product_groups = rev.groupby('Product_Group', observed=True)['Revenue'].sum().reindex(PRODUCT_GROUPS).dropna().reset_index()
+    price_bins = histogram_bins(prices.groupby('Price', observed=True)['Count'].sum())
+    trx_quantity = trx_qty.groupby('TransactionNo', observed=True)['Quantity'].sum().value_counts().sort_index()
+    quantity_bins = histogram_bins(trx_quantity[trx_quantity.index <= weighted_quantile(trx_quantity, 0.99)])
+
+    segments = pd.Series(partition('Customer_Segment', 'customers')).reindex(CUSTOMER_SEGMENTS).dropna().reset_index()
+    segments.columns = ['Segment', 'Count']
+    segment_revenue = rev.groupby('Customer_Segment', observed=True)['Revenue'].sum().reindex(CUSTOMER_SEGMENTS).dropna().reset_index()
+    # Per-customer frequency needs the IDs themselves, so it stays on the keys table.
+    customers = summary_customers(index.get('summary'), key)
+    if customers is None:
+        customers = (pd.concat([
+            keys.groupby(['CustomerNo', 'Customer_Segment'], observed=True)['TransactionNo'].nunique().rename('Frequency'),
+            custs.groupby(['CustomerNo', 'Customer_Segment'], observed=True)['Revenue'].sum().rename('Monetary'),
+        ], axis=1).reset_index(), custs.groupby('CustomerNo', observed=True).agg(Revenue=('Revenue', 'sum')))
+    customer_activity, by_customer = customers
+    top_customers = by_customer.nlargest(max(TOP_K_OPTIONS), 'Revenue').reset_index()
+
+    # Prefix sums over the day grid, so any date range is two binary searches
+    # and a subtraction; see range_entry().
+    calendar = index['calendar']
+    day_revenue = select_leaves(tables['days'], key).groupby('Date')['Revenue'].sum()
+    day_trx = keys.drop_duplicates(['Date', 'TransactionNo'])['Date'].value_counts()
+    timeline = {'calendar': calendar,
+                'Revenue': np.r_[0.0, day_revenue.reindex(calendar.index, fill_value=0).cumsum()],
+                'Transaksi': np.r_[0, day_trx.reindex(calendar.index, fill_value=0).cumsum()]}
+
+    countries = (index['trx_by_Country'].by_group(ids).rename('Transaksi').to_frame()
+                 .join(rev.groupby('Country', observed=True)['Revenue'].sum()).reset_index())
+    geo = geo_entry(countries, partition('Country_Group', 'trx_by_Country'),
+                    rev.groupby('Country_Group', observed=True)['Revenue'].sum(),
+                    pd.Series(partition('Country_Group', 'customers'), name='Pelanggan'))
+
+    return {
+        'revenue': rev['Revenue'].sum(),
+        'transactions': index['trx'].count(ids),
+        'customers': index['customers'].count(ids),
+        'monthly': monthly, 'daily': daily, 'seasonal': seasonal,
+        'top_products': top_products, 'product_groups': product_groups,
+        'price_bins': price_bins, 'quantity_bins': quantity_bins,
+        'segments': segments, 'segment_revenue': segment_revenue,
+        'customer_activity': customer_activity, 'top_customers': top_customers,
+        'leaves': ids.to_numpy(), 'timeline': timeline, **geo,
+    }
+
+
+def summary_customers(summary, key):
+    # The Customer page's per-customer tables read from the pipeline summary
+    # instead of regrouping the leaves. Exact for all product groups or one of
+    # them, as every customer has one segment and country (summary_agrees()).
+    pg = key[0]
+    if summary is None or not isinstance(pg, str):
+        return None
+    table = summary['customers']
+    if pg != 'All':
+        groups = summary['customer_groups']
+        table = (groups[groups.index.get_level_values('Product_Group') == pg].droplevel('Product_Group')
+                 .join(table[['Customer_Segment', 'Country_Group', 'Country']]))
+    mask = np.ones(len(table), dtype=bool)
+    for col, val in zip(FILTER_COLS[1:], key[1:]):
+        if val != 'All':
+            mask &= table[col].isin(selected_values(val)).to_numpy()
+    table = table[mask]
+    activity = table[['Customer_Segment', 'Frequency', 'Monetary']].rename_axis('CustomerNo').reset_index()
+    return activity, table[['Monetary']].rename(columns={'Monetary': 'Revenue'}).rename_axis('CustomerNo')
+
+
+def summary_agrees(summary, tables):
+    # The summary stands in for the leaves only while it labels every
+    # customer and product as their rows do.
+    if summary is None:
+        return False
+    checks = [('keys', 'CustomerNo', ['Customer_Segment', 'Country_Group', 'Country'], summary['customers']),
+              ('products', 'ProductName', ['Product_Group'], summary['products'])]
+    for name, key, cols, table in checks:
+        labels = tables[name][[key] + cols].drop_duplicates()
+        ids = labels[key].astype(str)
+        if ids.duplicated().any() or len(labels) != len(table):
+            return False
+        known = table.reindex(ids)
+        for col in cols:
+            if not (known[col].to_numpy() == labels[col].astype(object).to_numpy()).all():
+                return False
+    return True
+
+
+def customer_summary(frame, tables):
+    # The batch pipeline's summary when it was built from this CSV, else one
+    # computed from the loaded rows (none in stream mode: only a sample is loaded).
+    summary = pipeline.load(pipeline.SUMMARY_DIR)
+    if not pipeline.matches(summary, SOURCE_CSV):
+        summary = pipeline.summarize(frame) if frame is not None else None
+    return summary if summary_agrees(summary, tables) else None
+
+
+def geo_entry(countries, by_group, group_revenue, group_customers):
+    # The Geo page's tables, shared by both query engines. countries: Country,
+    # Transaksi, Revenue; by_group: Country_Group -> transactions per country.
+    country_trx = (pd.concat(by_group, names=['Country_Group']).rename('Transaksi').reset_index()
+                   if by_group else pd.DataFrame(columns=['Country_Group', 'Country', 'Transaksi']))
+    country_trx = country_trx[['Country', 'Country_Group', 'Transaksi']].sort_values(['Country', 'Country_Group'], ignore_index=True)
+    country_groups = group_revenue.reindex(COUNTRY_GROUPS).dropna().reset_index()
+    # Choropleth inputs, resolved through the labels' unique values so the ISO
+    # lookup is one array take per entry instead of a string map per request.
+    labels, codes = np.unique(countries['Country'].astype(str).to_numpy(), return_inverse=True)
+    iso = np.array([COUNTRY_ISO.get(name) for name in labels], dtype=object)[codes]
+    mapped = pd.notna(iso)
+    country_map = {'locations': iso[mapped].tolist(),
+                   'z': countries['Transaksi'].to_numpy()[mapped].tolist(),
+                   'text': countries['Country'].to_numpy()[mapped].tolist()}
+    cgs = pd.Index(list(by_group), name='Country_Group')
+    group_table = (pd.DataFrame({'Negara': [len(s) for s in by_group.values()],
+                                 'Transaksi': [int(s.sum()) for s in by_group.values()]}, index=cgs)
+                   .join(group_revenue).join(group_customers)
+                   .reindex(COUNTRY_GROUPS).reset_index())
+    return {'country_map': country_map, 'country_trx': country_trx,
+            'country_groups': country_groups, 'group_table': group_table}
+
+
+def union_dtypes(*frames):
+    cats = {}
+    for frame in frames:
+        for col, dtype in frame.dtypes.items():
+            if isinstance(dtype, pd.CategoricalDtype):
+                cats[col] = cats[col].union(dtype.categories) if col in cats else dtype.categories
+    return {col: pd.CategoricalDtype(c.sort_values()) for col, c in cats.items()}
+
+
+def merge_cube_tables(tables, delta_tables, dtypes=None):
+    merged = {}
+    for name, t in tables.items():
+        delta = delta_tables[name]
+        # Categories of the two sides may differ; align them or concat falls back to object.
+        # Given dtypes (the merged frame's) win; the date parts exist only here.
+        aligned = union_dtypes(t, delta)
+        if dtypes is not None:
+            aligned.update({col: dt for col, dt in dtypes.items() if col in t.columns})
+        both = pd.concat([t.astype(aligned), delta.astype(aligned)], ignore_index=True)
+        if name == 'keys':
+            merged[name] = both.drop_duplicates()
+        else:
+            # Every other table is group columns plus one additive value column.
+            by = list(both.columns[:-1])
+            merged[name] = both.groupby(by, dropna=False, observed=True)[both.columns[-1]].sum().reset_index()
+    return merged
+
+
+def merge_leaf_rows(tables, delta_tables):
+    # merge_cube_tables() for an ingest: only the rows of the leaves the delta
+    # touches are regrouped with it. The others are carried over as they are,
+    # recoded where the delta brings new categories.
+    dtypes = union_dtypes(*tables.values(), *delta_tables.values())
+    merged = {}
+    for name, t in tables.items():
+        aligned = {col: dt for col, dt in dtypes.items() if col in t.columns}
+        t, delta = t.astype(aligned, copy=False), delta_tables[name].astype(aligned)
+        hit = np.isin(leaf_codes(t), leaf_codes(delta))
+        both = pd.concat([t[hit], delta], ignore_index=True)
+        if name == 'keys':
+            both = both.drop_duplicates()
+        else:
+            by = list(both.columns[:-1])
+            both = both.groupby(by, dropna=False, observed=True)[both.columns[-1]].sum().reset_index()
+        merged[name] = pd.concat([t[~hit], both], ignore_index=True)
+    return merged
+
+
+def dataset_stats(tables, start, end):
+    keys = tables['keys']
+    return {
+        'start': start, 'end': end,
+        'transactions': keys['TransactionNo'].nunique(), 'products': tables['products']['ProductName'].nunique(),
+        'customers': keys['CustomerNo'].nunique(), 'countries': keys['Country'].nunique(),
+    }
+
+
+def reservoir_update(sample, chunk, seen, size, rng):
+    # Algorithm R, vectorized per chunk. Which slot a replaced row occupied does not
+    # matter for a uniform sample, so victims are dropped and winners appended.
+    fill = min(len(chunk), max(size - seen, 0))
+    parts = [chunk.iloc[:fill].copy()] if sample is None else [sample, chunk.iloc[:fill].copy()]
+    sample = pd.concat(parts, ignore_index=True)
+    t = seen + fill + np.arange(1, len(chunk) - fill + 1)
+    slot = rng.integers(0, t)
+    hit = np.flatnonzero(slot < size)
+    if len(hit):
+        # A later row drawing the same slot replaces the earlier winner.
+        winners = pd.Series(hit + fill, index=slot[hit])
+        winners = winners[~winners.index.duplicated(keep='last')]
+        sample = pd.concat([sample.drop(index=winners.index), chunk.iloc[winners.to_numpy()]],
+                           ignore_index=True)
+    return sample, seen + len(chunk)
+
+
+def stream_dataset(src):
+    # Reads the CSV in chunks sized to STREAM_MEMORY_MB and folds each one into
+    # the leaf tables; no full row-level frame is built. Row-level consumers
+    # (fdf) get a uniform reservoir sample of STREAM_SAMPLE_ROWS rows instead.
+    # The leaf tables themselves grow with the data ('keys' by about a row per
+    # transaction) and come on top of the budget; their size is reported.
+    budget = STREAM_MEMORY_MB * 2 ** 20
+    rng = np.random.default_rng(0)
+    levels, sample, seen, n_chunks = [], None, 0, 0
+    start, end = pd.Timestamp.max, pd.Timestamp.min
+    chunk_rows = 10_000
+    with pd.read_csv(src, encoding='utf-8-sig', iterator=True) as reader:
+        while True:
+            try:
+                raw = reader.get_chunk(chunk_rows)
+            except StopIteration:
+                break
+            n_chunks += 1
+            # A raw chunk, its normalized copy and the groupby temporaries take
+            # roughly four times the raw size; size the next read accordingly.
+            per_row = raw.memory_usage(deep=True).sum() / max(len(raw), 1)
+            chunk_rows = max(1_000, int(budget / (4 * per_row)))
+
+            sample, seen = reservoir_update(sample, raw, seen, STREAM_SAMPLE_ROWS, rng)
+            chunk = normalize(raw)
+            start, end = min(start, chunk['Date'].min()), max(end, chunk['Date'].max())
+            # Merged like a binary counter: a table is folded into the one
+            # before it once it has grown to half its size, so every leaf row
+            # is regrouped O(log chunks) times, not once per later chunk.
+            levels.append(cube_tables(chunk))
+            while len(levels) > 1 and 2 * table_rows(levels[-1]) >= table_rows(levels[-2]):
+                newer = levels.pop()
+                levels[-1] = merge_cube_tables(levels[-1], newer)
+
+    tables = levels[0]
+    for newer in levels[1:]:
+        tables = merge_cube_tables(tables, newer)
+    LOAD_REPORT.update(mode='stream', rows=seen, chunks=n_chunks, sample_rows=len(sample),
+                       budget_mb=STREAM_MEMORY_MB, tables_mb=round(tables_mb(tables), 1),
+                       table_rows=table_rows(tables), peak_rss_mb=peak_rss_mb())
+    print(f"Streaming: {seen:,} baris dalam {n_chunks} chunk | tabel leaf {LOAD_REPORT['tables_mb']:,.1f} MB "
+          f"({LOAD_REPORT['table_rows']:,} baris) | peak RSS {LOAD_REPORT['peak_rss_mb']:,.0f} MB "
+          f"(budget {STREAM_MEMORY_MB:,.0f} MB)")
+    if LOAD_REPORT['tables_mb'] > STREAM_MEMORY_MB:
+        print("Tabel leaf lebih besar dari STREAM_MEMORY_MB: peak memori mengikuti ukuran data, bukan budget.")
+    return normalize(sample), tables, dataset_stats(tables, start, end)
+
+
+def table_rows(tables):
+    return sum(len(t) for t in tables.values())
+
+
+def tables_mb(tables):
+    return sum(t.memory_usage(deep=True).sum() for t in tables.values()) / 2 ** 20
+
+
+def build_cube(tables, index):
+    dims = [['All'] + sorted(tables['keys'][col].dropna().unique()) for col in CUBE_COLS]
+    return {key + ('All',): cube_entry(tables, index, key + ('All',)) for key in itertools.product(*dims)}
+
+
+def date_bounds(days, start, end):
+    # Positions [lo, hi) of the sorted day grid inside [start, end], both inclusive.
+    lo = int(days.searchsorted(pd.Timestamp(start))) if start else 0
+    hi = int(days.searchsorted(pd.Timestamp(end) + pd.Timedelta(days=1))) if end else len(days)
+    return lo, max(lo, hi)
+
+
+def range_totals(c, start, end):
+    # The entry's KPI totals for dates in [start, end] (None = open): revenue
+    # is a difference of prefix sums, the distinct counts are unions of the
+    # selected leaves' per-day ID sets.
+    t = c['timeline']
+    lo, hi = date_bounds(t['calendar'].index, start, end)
+
+    if 'leaves' not in c:
+        return {'revenue': t['Revenue'][hi] - t['Revenue'][lo], **SQL_BACKEND.distinct_range(c['key'], start, end)}
+
+    def distinct(name):
+        counter = DISTINCT_INDEX[f'{name}_by_Date']
+        return counter.count_range(c['leaves'], *date_bounds(counter.group_dtype.categories, start, end))
+
+    return {'revenue': t['Revenue'][hi] - t['Revenue'][lo],
+            'transactions': distinct('trx'), 'customers': distinct('customers')}
+
+
+def range_entry(c, start, end):
+    # range_totals() plus the Overview's time charts for the same range.
+    if not start and not end:
+        return c
+    t = c['timeline']
+    lo, hi = date_bounds(t['calendar'].index, start, end)
+    cal = t['calendar'].iloc[lo:hi]
+    revenue = np.diff(t['Revenue'][lo:hi + 1])
+    trx = np.diff(t['Transaksi'][lo:hi + 1])
+    active = trx > 0
+
+    months = cal['YearMonth'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]]) if hi > lo else np.array([], dtype=int)
+    bounds = lo + np.r_[starts, hi - lo]
+    monthly = pd.DataFrame({'YearMonth': months[starts], 'Revenue': np.diff(t['Revenue'][bounds]),
+                            'Transaksi': np.diff(t['Transaksi'][bounds])})
+    daily = pd.Series(trx[active]).groupby(cal['DayName'].to_numpy()[active]).sum().reindex(DAY_ORDER)
+    seasonal = pd.Series(revenue[active]).groupby(cal['Season'].to_numpy()[active]).sum().reindex(SEASON_ORDER)
+
+    return {**c, **range_totals(c, start, end),
+            'monthly': monthly[monthly['Transaksi'] > 0].reset_index(drop=True),
+            'daily': daily.rename_axis('Day').rename('Count').reset_index(),
+            'seasonal': seasonal.rename_axis('Season').rename('Revenue').reset_index()}
+
+
+# ------------------------------------------------------------
+# SQL engine (QUERY_ENGINE=sql): the rows and the leaf tables of cube_tables()
+# live in a SQLite file next to the CSV, indexed on the filter columns, and
+# cube_entry()'s aggregates are queries over them parameterized by the filter
+# values. Workers share the file through the OS page cache instead of each
+# holding the data; every process keeps its own small connection pool.
+# ------------------------------------------------------------
+SQL_PATH = os.environ.get('SQL_PATH')  # default: dashboard.sqlite in the CSV's cache dir
+SQL_POOL_SIZE = int(os.environ.get('SQL_POOL_SIZE', '4'))
+SQL_SCHEMA_VERSION = 2
+SQL_CHUNK_ROWS = 100_000
+# Leaf table -> (columns grouped by besides FILTER_COLS, aggregate), as in cube_tables().
+SQL_LEAF_TABLES = {
+    'keys': (KEY_COLS, None),
+    'revenue': (['YearMonth', 'Season'], 'SUM("Revenue") AS "Revenue"'),
+    'products': (['ProductName'], 'SUM("Quantity") AS "Quantity"'),
+    'customers': (['CustomerNo'], 'SUM("Revenue") AS "Revenue"'),
+    'prices': (['Price'], 'COUNT(*) AS "Count"'),
+    'trx_qty': (['TransactionNo'], 'SUM("Quantity") AS "Quantity"'),
+    'days': (['Date'], 'SUM("Revenue") AS "Revenue"'),
+}
+SQL_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'  # sorts like the timestamps it stores
+
+
+def sql_columns(cols):
+    return ', '.join(f'"{col}"' for col in cols)
+
+
+def sql_filter(key, *conditions):
+    # WHERE clause and parameters for a filter key plus extra (clause, params) pairs.
+    clauses, params = [], []
+    for col, val in zip(FILTER_COLS, key):
+        if val != 'All':
+            values = selected_values(val)
+            clauses.append(f'"{col}" IN ({", ".join("?" * len(values))})')
+            params.extend(values)
+    for clause, extra in conditions:
+        clauses.append(clause)
+        params.extend(extra)
+    return ('WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+def sql_records(frame):
+    # Python scalars for sqlite3: timestamps as text, missing values as NULL.
+    frame = frame.assign(Date=frame['Date'].dt.strftime(SQL_DATE_FORMAT)).astype(object)
+    return list(frame.where(frame.notna(), None).itertuples(index=False, name=None))
+
+
+class SqlBackend:
+    def __init__(self, path, pool_size):
+        self.path, self.pool_size = path, pool_size
+        self.lock = threading.Lock()
+        self.pool, self.pid, self.opened = None, None, 0
+        self.columns, self.header, self.calendar, self.values = None, None, None, {}
+
+    # --- connections -------------------------------------------------------
+    def connect(self):
+        con = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        con.execute('PRAGMA journal_mode=WAL')
+        return con
+
+    @contextmanager
+    def connection(self):
+        # sqlite connections must not cross a fork, so the pool is per process.
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pool, self.pid, self.opened = queue.LifoQueue(), os.getpid(), 0
+            if self.pool.empty() and self.opened < self.pool_size:
+                self.opened += 1
+                self.pool.put(self.connect())
+            pool = self.pool
+        con = pool.get()
+        try:
+            yield con
+        finally:
+            pool.put(con)
+
+    def query(self, sql, params=()):
+        with self.connection() as con:
+            return pd.read_sql_query(sql, con, params=params)
+
+    def scalar(self, sql, params=()):
+        with self.connection() as con:
+            return con.execute(sql, params).fetchone()[0]
+
+    # --- building and loading ----------------------------------------------
+    def meta(self, con):
+        try:
+            return dict(con.execute('SELECT key, value FROM meta'))
+        except sqlite3.DatabaseError:
+            return {}
+
+    def open(self, src):
+        # The file is reused while it was built from this exact source, like the
+        # column cache; the lock keeps workers starting together from all building it.
+        # Rows other workers have ingested stay in: returns the source offset
+        # and delta files the file holds, and the watcher adds what it lacks.
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            version = f'{SQL_SCHEMA_VERSION}:{BASE_VERSION}'
+            con = sqlite3.connect(self.path) if os.path.exists(self.path) else None
+            meta = self.meta(con) if con else {}
+            if con:
+                con.close()
+            if meta.get('version') != version:
+                meta = self.build(src, version)
+        self.pid = None  # reopen the pool on the new file
+        self.refresh()
+        return int(meta['offset']), set(json.loads(meta['deltas']))
+
+    def build(self, src, version):
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        con = sqlite3.connect(tmp)
+        try:
+            offset = os.path.getsize(src)
+            meta = {'version': version, 'offset': str(offset), 'deltas': '[]'}
+            with pd.read_csv(src, encoding='utf-8-sig', chunksize=SQL_CHUNK_ROWS) as reader:
+                for raw in reader:
+                    self.insert_rows(con, with_date_parts(normalize(raw)))
+            for name, (cols, agg) in SQL_LEAF_TABLES.items():
+                select = sql_columns(FILTER_COLS + cols) + (f', {agg}' if agg else '')
+                con.execute(f'CREATE TABLE leaf_{name} AS SELECT {select} FROM rows WHERE 0')
+            self.aggregate(con, 0)
+            for name in SQL_LEAF_TABLES:
+                for col in FILTER_COLS + (['Date'] if name == 'keys' else []):
+                    con.execute(f'CREATE INDEX leaf_{name}_{col} ON leaf_{name}("{col}")')
+            con.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+            con.executemany('INSERT INTO meta VALUES (?, ?)', list(meta.items()))
+            con.commit()
+        finally:
+            con.close()
+        os.replace(tmp, self.path)
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+        return meta
+
+    def insert_rows(self, con, frame):
+        if not con.execute("SELECT 1 FROM sqlite_master WHERE name = 'rows'").fetchone():
+            types = ['REAL' if pd.api.types.is_float_dtype(dt) else 'INTEGER' if pd.api.types.is_integer_dtype(dt)
+                     else 'TEXT' for dt in frame.dtypes]
+            con.execute('CREATE TABLE rows (' + ', '.join(f'"{col}" {t}' for col, t in zip(frame.columns, types)) + ')')
+            self.columns = list(frame.columns)
+        frame = frame.reindex(columns=self.columns)
+        con.executemany(f'INSERT INTO rows ({sql_columns(self.columns)}) VALUES ({", ".join("?" * len(self.columns))})',
+                        sql_records(frame))
+
+    def aggregate(self, con, after):
+        # Leaf rows for rows past rowid `after`. Appended next to the existing
+        # ones rather than merged: every query sums or counts distinct over them.
+        for name, (cols, agg) in SQL_LEAF_TABLES.items():
+            group = sql_columns(FILTER_COLS + cols)
+            select = f'SELECT DISTINCT {group}' if agg is None else f'SELECT {group}, {agg}'
+            con.execute(f'INSERT INTO leaf_{name} {select} FROM rows WHERE rowid > ?'
+                        + ('' if agg is None else f' GROUP BY {group}'), (after,))
+
+    def refresh(self):
+        # Lookups that depend on the data only: read again after every ingest.
+        with self.connection() as con:
+            types = {row[1]: row[2] for row in con.execute('PRAGMA table_info(rows)')}
+        self.columns = list(types)
+        # Typed empty frame, so an export's header chunk carries the schema.
+        self.header = pd.DataFrame({col: pd.Series(dtype={'INTEGER': 'int64', 'REAL': 'float64'}.get(t, object))
+                                    for col, t in types.items()}).assign(Date=pd.Series(dtype='datetime64[ns]'))
+        calendar = self.query('SELECT "Date", "YearMonth", "DayName", "Season" FROM leaf_keys '
+                              'GROUP BY "Date" ORDER BY "Date"')
+        calendar['Date'] = pd.to_datetime(calendar['Date'])
+        self.calendar = calendar.set_index('Date')
+        self.values = {col: self.query(f'SELECT DISTINCT "{col}" AS v FROM leaf_keys WHERE "{col}" IS NOT NULL '
+                                       f'ORDER BY 1')['v'].tolist() for col in FILTER_COLS}
+
+    def ingest(self, read_new):
+        # read_new(offset, seen) -> (frames, offset, names). Runs in one write
+        # transaction, so with several workers only the first ingests a
+        # change; the others find it recorded in meta and skip it.
+        con = sqlite3.connect(self.path, timeout=30)
+        try:
+            con.execute('BEGIN IMMEDIATE')
+            meta = self.meta(con)
+            offset, deltas = int(meta['offset']), set(json.loads(meta['deltas']))
+            frames, new_offset, names = read_new(offset, deltas)
+            n_rows = sum(len(f) for f in frames)
+            if n_rows:
+                after = con.execute('SELECT COALESCE(MAX(rowid), 0) FROM rows').fetchone()[0]
+                for frame in frames:
+                    self.insert_rows(con, with_date_parts(normalize(frame)))
+                self.aggregate(con, after)
+            deltas |= set(names)
+            con.executemany('UPDATE meta SET value = ? WHERE key = ?',
+                            [(str(new_offset), 'offset'), (json.dumps(sorted(deltas)), 'deltas')])
+            con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+        finally:
+            con.close()
+        return new_offset, deltas, n_rows
+
+    # --- queries -----------------------------------------------------------
+    def dataset_stats(self):
+        first, last = self.query('SELECT MIN("Date") AS first, MAX("Date") AS last FROM rows').iloc[0]
+        return {
+            'start': pd.Timestamp(first), 'end': pd.Timestamp(last),
+            'transactions': self.scalar('SELECT COUNT(DISTINCT "TransactionNo") FROM leaf_keys'),
+            'products': self.scalar('SELECT COUNT(DISTINCT "ProductName") FROM leaf_products'),
+            'customers': self.scalar('SELECT COUNT(DISTINCT "CustomerNo") FROM leaf_keys'),
+            'countries': self.scalar('SELECT COUNT(DISTINCT "Country") FROM leaf_keys'),
+        }
+
+    def row_count(self):
+        return self.scalar('SELECT COUNT(*) FROM rows')
+
+    def series(self, table, by, value, name, key, *conditions):
+        # One aggregate per group of `by` over the selected leaf rows, like groupby(by)[...].agg().
+        where, params = sql_filter(key, *conditions)
+        notnull = ' AND '.join(f'"{col}" IS NOT NULL' for col in by)
+        where = f'{where} AND {notnull}' if where else f'WHERE {notnull}'
+        frame = self.query(f'SELECT {sql_columns(by)}, {value} AS "{name}" FROM leaf_{table} {where} '
+                           f'GROUP BY {sql_columns(by)} ORDER BY {sql_columns(by)}', params)
+        # An empty result has no types to infer; keep the value numeric as pandas would.
+        return frame.set_index(by)[name].pipe(pd.to_numeric)
+
+    def distinct(self, col, key, *conditions):
+        where, params = sql_filter(key, *conditions)
+        return self.scalar(f'SELECT COUNT(DISTINCT "{col}") FROM leaf_keys {where}', params)
+
+    def distinct_range(self, key, start, end):
+        # Days lo..hi-1 of the grid, as in range_totals(), as a half-open timestamp interval.
+        days = self.calendar.index
+        lo, hi = date_bounds(days, start, end)
+        if hi <= lo:
+            return {'transactions': 0, 'customers': 0}
+        upper = days[hi].strftime(SQL_DATE_FORMAT) if hi < len(days) else '9999'
+        bounds = ('"Date" >= ? AND "Date" < ?', [days[lo].strftime(SQL_DATE_FORMAT), upper])
+        return {'transactions': self.distinct('TransactionNo', key, bounds),
+                'customers': self.distinct('CustomerNo', key, bounds)}
+
+    def rows(self, key, chunk_rows):
+        # The selected rows as frames of at most chunk_rows, like fdf() in chunks.
+        where, params = sql_filter(key)
+        yield self.header
+        with self.connection() as con:
+            cur = con.execute(f'SELECT {sql_columns(self.columns)} FROM rows {where} ORDER BY rowid', params)
+            while True:
+                batch = cur.fetchmany(chunk_rows)
+                if not batch:
+                    break
+                frame = pd.DataFrame(batch, columns=self.columns)
+                frame['Date'] = pd.to_datetime(frame['Date'])
+                yield frame
+
+    def entry(self, key):
+        # cube_entry() as queries; same tables, so the page builders cannot tell.
+        def count(col, by):
+            counts = self.series('keys', by, f'COUNT(DISTINCT "{col}")', 'Count', key)
+            return counts[counts > 0]
+
+        rev_by = {col: self.series('revenue', [col], 'SUM("Revenue")', 'Revenue', key)
+                  for col in ('YearMonth', 'Season', 'Product_Group', 'Customer_Segment', 'Country', 'Country_Group')}
+
+        monthly = (rev_by['YearMonth'].to_frame().join(count('TransactionNo', ['YearMonth']).rename('Transaksi'))
+                   .reset_index().sort_values('YearMonth'))
+        daily = count('TransactionNo', ['DayName']).reindex(DAY_ORDER).reset_index()
+        daily.columns = ['Day', 'Count']
+        seasonal = rev_by['Season'].reindex(SEASON_ORDER).reset_index()
+
+        top_products = self.series('products', ['ProductName'], 'SUM("Quantity")', 'Quantity', key).nlargest(max(TOP_K_OPTIONS)).reset_index()
+        product_groups = rev_by['Product_Group'].reindex(PRODUCT_GROUPS).dropna().reset_index()
+        price_bins = histogram_bins(self.series('prices', ['Price'], 'SUM("Count")', 'Count', key))
+        trx = self.series('trx_qty', ['TransactionNo'], 'SUM("Quantity")', 'Quantity', key)
+        trx_quantity = trx.value_counts().sort_index()
+        quantity_bins = histogram_bins(trx_quantity[trx_quantity.index <= weighted_quantile(trx_quantity, 0.99)])
+
+        segments = pd.Series(self.series('keys', ['Customer_Segment'], 'COUNT(DISTINCT "CustomerNo")', 'Count', key).to_dict())
+        segments = segments.reindex(CUSTOMER_SEGMENTS).dropna().reset_index()
+        segments.columns = ['Segment', 'Count']
+        segment_revenue = rev_by['Customer_Segment'].reindex(CUSTOMER_SEGMENTS).dropna().reset_index()
+        customer_activity = pd.concat([
+            self.series('keys', ['CustomerNo', 'Customer_Segment'], 'COUNT(DISTINCT "TransactionNo")', 'Frequency', key),
+            self.series('customers', ['CustomerNo', 'Customer_Segment'], 'SUM("Revenue")', 'Monetary', key),
+        ], axis=1).reset_index()
+        top_customers = (self.series('customers', ['CustomerNo'], 'SUM("Revenue")', 'Revenue', key).to_frame()
+                         .nlargest(max(TOP_K_OPTIONS), 'Revenue').reset_index())
+
+        calendar = self.calendar
+        day_revenue = self.series('days', ['Date'], 'SUM("Revenue")', 'Revenue', key)
+        day_trx = self.series('keys', ['Date'], 'COUNT(DISTINCT "TransactionNo")', 'Count', key)
+        day_revenue.index, day_trx.index = pd.to_datetime(day_revenue.index), pd.to_datetime(day_trx.index)
+        timeline = {'calendar': calendar,
+                    'Revenue': np.r_[0.0, day_revenue.reindex(calendar.index, fill_value=0).cumsum()],
+                    'Transaksi': np.r_[0, day_trx.reindex(calendar.index, fill_value=0).cumsum()]}
+
+        countries = count('TransactionNo', ['Country']).rename('Transaksi').to_frame().join(rev_by['Country']).reset_index()
+        pairs = count('TransactionNo', ['Country_Group', 'Country'])
+        by_group = {cg: part.droplevel('Country_Group').rename(None) for cg, part in pairs.groupby(level='Country_Group')}
+        geo = geo_entry(countries, by_group, rev_by['Country_Group'],
+                        self.series('keys', ['Country_Group'], 'COUNT(DISTINCT "CustomerNo")', 'Pelanggan', key))
+
+        where, params = sql_filter(key)
+        return {
+            'revenue': self.scalar(f'SELECT COALESCE(SUM("Revenue"), 0.0) FROM leaf_revenue {where}', params),
+            'transactions': self.distinct('TransactionNo', key),
+            'customers': self.distinct('CustomerNo', key),
+            'monthly': monthly, 'daily': daily, 'seasonal': seasonal,
+            'top_products': top_products, 'product_groups': product_groups,
+            'price_bins': price_bins, 'quantity_bins': quantity_bins,
+            'segments': segments, 'segment_revenue': segment_revenue,
+            'customer_activity': customer_activity, 'top_customers': top_customers,
+            'key': key, 'timeline': timeline, **geo,
+        }
+
+
+SQL_BACKEND = SqlBackend(SQL_PATH or os.path.join(cache_dir_for(SOURCE_CSV), 'dashboard.sqlite'), SQL_POOL_SIZE)
+
+
+CUBE_ADHOC_SIZE = int(os.environ.get('CUBE_ADHOC_SIZE', '64'))
+
+
+class AdhocCube:
+    # Entries for selections outside the precomputed cube, least recently used
+    # evicted first. A new instance is published with every new cube, so an
+    # entry computed from old tables never lands in the current one.
+    # pinned: precomputed keys an ingest dropped from CUBE (section 14); they
+    # are built on first use and never evicted.
+    def __init__(self, size, pinned=()):
+        self.size, self.pinned = size, frozenset(pinned)
+        self.entries = OrderedDict()
+        self.kept = {}  # pinned key -> entry
+        self.building = {}  # key -> Future of the build in flight
+        self.lock = threading.Lock()
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.kept), OrderedDict(self.entries)
+
+    def get(self, key, build, *args):
+        # Concurrent misses on one key wait for the first caller's build, as
+        # JobManager coalesces page jobs, instead of each building the entry.
+        with self.lock:
+            if key in self.kept:
+                return self.kept[key]
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            future = self.building.get(key)
+            owner = future is None
+            if owner:
+                future = self.building[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            entry = build(*args, key)
+        except BaseException as e:
+            with self.lock:
+                del self.building[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            del self.building[key]
+            if key in self.pinned:
+                self.kept[key] = entry
+            else:
+                self.entries[key] = entry
+                while len(self.entries) > self.size:
+                    self.entries.popitem(last=False)
+        future.set_result(entry)
+        return entry
+
+
+def cube_lookup(pg, cs, cg, co=None):
+    if DATA_VERSION is None:
+        # STARTUP_MODE=lazy before the warm-up has loaded the data: callbacks
+        # run again once data-version is set.
+        raise PreventUpdate
+    key = filter_key(pg, cs, cg, co)
+    if QUERY_ENGINE == 'sql':
+        return CUBE_ADHOC.get(key, SQL_BACKEND.entry)
+    if key in CUBE:
+        return CUBE[key]
+    # Values outside the data (e.g. a stale dropdown) select no leaves.
+    return CUBE_ADHOC.get(key, cube_entry, CUBE_TABLES, DISTINCT_INDEX)
+
+
+def load_state():
+    # Everything is built first and published together, as in ingest().
+    global df, CUBE_TABLES, DATASET_STATS, FILTER_INDEX, DISTINCT_INDEX, CUBE, CUBE_ADHOC, DATA_VERSION
+    if QUERY_ENGINE == 'sql':
+        # Nothing row-level or cube-sized stays in the process; entries are
+        # queried on demand and kept in the ad-hoc LRU.
+        with startup_timer('data'):
+            offset, deltas = SQL_BACKEND.open(SOURCE_CSV)
+            stats = SQL_BACKEND.dataset_stats()
+            LOAD_REPORT.update(mode='sql', rows=SQL_BACKEND.row_count(), peak_rss_mb=peak_rss_mb())
+        with INGEST_LOCK:
+            INGEST_STATE['offset'], INGEST_STATE['deltas'] = offset, deltas
+        DATASET_STATS, CUBE_ADHOC = stats, AdhocCube(CUBE_ADHOC_SIZE)
+        DATA_VERSION = ingested_version()
+        return
+    with startup_timer('data'):
+        if LOAD_MODE == 'stream':
+            frame, tables, stats = stream_dataset(SOURCE_CSV)
+        else:
+            frame = load_dataset()
+            tables = cube_tables(frame)
+            stats = dataset_stats(tables, frame['Date'].min(), frame['Date'].max())
+            LOAD_REPORT.update(mode='memory', rows=len(frame), peak_rss_mb=peak_rss_mb(),
+                               memory_mb=round(column_mb(frame).sum(), 2))
+    with startup_timer('summary'):
+        summary = customer_summary(None if LOAD_MODE == 'stream' else frame, tables)
+    with startup_timer('cube'):
+        # Frame and masks are swapped together, so a reader never pairs one with the other's rows.
+        filter_index = [(frame, build_filter_masks(frame))]
+        index = {**distinct_index(tables['keys']), 'summary': summary}
+        cube = build_cube(tables, index)
+    df, CUBE_TABLES, DATASET_STATS, FILTER_INDEX, DISTINCT_INDEX, CUBE = frame, tables, stats, filter_index, index, cube
+    CUBE_ADHOC = AdhocCube(CUBE_ADHOC_SIZE)
+    DATA_VERSION = BASE_VERSION
+
+
+CUBE_TABLES = DATASET_STATS = FILTER_INDEX = DISTINCT_INDEX = None
+CUBE = {}
+CUBE_ADHOC = AdhocCube(CUBE_ADHOC_SIZE)
+if STARTUP_MODE != 'lazy':
+    load_state()
+
+
+# ============================================================
+# 5. INIT APP
+# ============================================================
+app = dash.Dash(
+    __name__,
+    suppress_callback_exceptions=True,
+    title='ShopInsight - E-Commerce Analytics',
+    update_title='Loading...',
+    meta_tags=[{'name': 'viewport', 'content': 'width=device-width, initial-scale=1.0'}],
+)
+server = app.server
+
+
+# ============================================================
+# 6. SIDEBAR — NAVIGASI
+# ============================================================
+NAV_ITEMS = [
+    {'value': 'overview',  'icon': '📊', 'label': 'Overview'},
+    {'value': 'product',   'icon': '📦', 'label': 'Analisis Produk'},
+    {'value': 'customer',  'icon': '👥', 'label': 'Analisis Pelanggan'},
+    {'value': 'geo',       'icon': '🌍', 'label': 'Analisis Geografis'},
+]
+
+
+STAT_ROWS = [('stat-period', 'Periode'), ('stat-transactions', 'Transaksi'), ('stat-products', 'Produk'),
+             ('stat-customers', 'Pelanggan'), ('stat-countries', 'Negara')]
+
+
+def create_sidebar():
+    return html.Div(className='sidebar', children=[
+        # Logo
+        html.Div(className='sidebar-logo', children=[
+            html.Div(className='sidebar-logo-icon', children='📈'),
+            html.Div([
+                html.Div('ShopInsight', className='sidebar-logo-text'),
+                html.Div('E-Commerce Analytics', className='sidebar-logo-sub'),
+            ]),
+        ]),
+
+        html.Div(className='filter-divider'),
+
+        # Navigasi
+        html.Div(className='nav-section', children=[
+            html.Div('MENU', className='nav-section-title'),
+            dcc.RadioItems(
+                id='nav-menu',
+                options=[
+                    {'label': html.Span([
+                        html.Span(item['icon'], className='nav-icon'),
+                        html.Span(item['label'], className='nav-label'),
+                    ], className='nav-item-inner'),
+                     'value': item['value']}
+                    for item in NAV_ITEMS
+                ],
+                value='overview',
+                className='nav-radio-group',
+                inputClassName='nav-radio-input',
+                labelClassName='nav-radio-label',
+            ),
+        ]),
+
+        html.Div(className='filter-divider'),
+
+        # Ringkasan
+        html.Div(className='sidebar-stats', children=[
+            html.Div('DATASET', className='nav-section-title'),
+        ] + [
+            html.Div(className='stat-row', children=[
+                html.Span(label, className='stat-label'),
+                html.Span(value, className='stat-value', id=stat_id),
+            ])
+            for (stat_id, label), value in zip(STAT_ROWS, stat_values(DATASET_STATS))
+        ]),
+
+        html.Div(style={'flex': '1'}),
+
+        html.Div(className='dashboard-footer', children=[
+            html.Div('Remedial UAS Business Intelligence'),
+            html.Div('Universitas Islam Indonesia'),
+        ]),
+    ])
+
+
+# ============================================================
+# 7. FILTER BAR
+# ============================================================
+def filter_values(col):
+    # Sorted values of a filter column in the data, None until it is loaded.
+    if QUERY_ENGINE == 'sql':
+        return SQL_BACKEND.values.get(col) if DATA_VERSION is not None else None
+    if DISTINCT_INDEX is None:
+        return None
+    return sorted(set(DISTINCT_INDEX['leaves'][col].dropna()))
+
+
+def filter_options():
+    # Values present in the data (all known ones until it is loaded), from the
+    # cube's leaves. Nothing selected means all values, so there is no 'All' option.
+    def options(col, values=None):
+        present = filter_values(col)
+        if present is not None:
+            values = present if values is None else [v for v in values if v in set(present)]
+        return [{'label': v, 'value': v} for v in values or []]
+
+    return (options('Product_Group', PRODUCT_GROUPS), options('Customer_Segment', CUSTOMER_SEGMENTS),
+            options('Country_Group', COUNTRY_GROUPS), options('Country'))
+
+
+def date_limits():
+    if DATASET_STATS is None:
+        return None, None
+    return DATASET_STATS['start'].date(), DATASET_STATS['end'].date()
+
+
+def create_filter_bar():
+    def dd(id_, label, all_label, options):
+        return html.Div(className='filter-bar-item', children=[
+            html.Label(label, className='filter-bar-label'),
+            dcc.Dropdown(id=id_, options=options, value=[], multi=True,
+                         placeholder=all_label, className='dash-dropdown'),
+        ])
+
+    pg, cs, cg, co = filter_options()
+    first, last = date_limits()
+    return html.Div(className='filter-bar', children=[
+        dd('filter-product-group', 'Kelompok Produk', 'Semua Kelompok', pg),
+        dd('filter-customer-segment', 'Segmen Pelanggan', 'Semua Segmen', cs),
+        dd('filter-country-group', 'Kelompok Negara', 'Semua Kelompok Negara', cg),
+        dd('filter-country', 'Negara', 'Semua Negara', co),
+        # Empty means the whole period. Applies to the KPIs and the Overview page.
+        html.Div(className='filter-bar-item', children=[
+            html.Label('Periode (KPI & Overview)', className='filter-bar-label'),
+            dcc.DatePickerRange(id='filter-date', min_date_allowed=first, max_date_allowed=last, clearable=True,
+                                start_date_placeholder_text='Awal', end_date_placeholder_text='Akhir',
+                                display_format='DD MMM YYYY'),
+        ]),
+    ])
+
+
+# ============================================================
+# 8. MAIN CONTENT
+# ============================================================
+def create_main_content():
+    return html.Div(className='main-content', children=[
+        html.Div(className='page-header', children=[
+            html.H1('E-Commerce Business Intelligence Dashboard', className='page-title'),
+            html.P('Analisis strategis transaksi penjualan, segmentasi produk & pelanggan, dan distribusi geografis.',
+                    className='page-description'),
+        ]),
+        create_filter_bar(),
+        html.Div(className='kpi-container', children=[
+            html.Div(className='kpi-card kpi-revenue', children=[
+                html.Div(className='kpi-icon icon-revenue', children='£'),
+                html.Div('TOTAL REVENUE', className='kpi-label'),
+                html.Div('—', className='kpi-value', id='kpi-revenue'),
+            ]),
+            html.Div(className='kpi-card kpi-transactions', children=[
+                html.Div(className='kpi-icon icon-transactions', children='🛒'),
+                html.Div('TOTAL TRANSAKSI', className='kpi-label'),
+                html.Div('—', className='kpi-value', id='kpi-transactions'),
+            ]),
+            html.Div(className='kpi-card kpi-customers', children=[
+                html.Div(className='kpi-icon icon-customers', children='👥'),
+                html.Div('TOTAL PELANGGAN', className='kpi-label'),
+                html.Div('—', className='kpi-value', id='kpi-customers'),
+            ]),
+            html.Div(className='kpi-card kpi-aov', children=[
+                html.Div(className='kpi-icon icon-aov', children='📈'),
+                html.Div('AVG ORDER VALUE', className='kpi-label'),
+                html.Div('—', className='kpi-value', id='kpi-aov'),
+            ]),
+        ]),
+        dcc.Loading(
+            id='page-loading',
+            type='default',
+            children=[html.Div(id='page-content')]
+        ),
+    ])
+
+
+# ============================================================
+# 9. PAGE BUILDERS
+# ============================================================
+# Each page is split into independent chart tasks that run on a per-process
+# thread pool (CHART_WORKERS, 1 = run inline). Timings per chart are kept so
+# the slow ones show up in /chart-stats.
+CHART_WORKERS = int(os.environ.get('CHART_WORKERS', str(min(4, os.cpu_count() or 1))))
+CHART_POOL = {'pool': None, 'pid': None}
+CHART_TIMINGS = {}
+CHART_LOCK = threading.Lock()
+
+
+def chart_pool():
+    # Created lazily and per process: executor threads do not survive a gunicorn fork.
+    with CHART_LOCK:
+        if CHART_POOL['pid'] != os.getpid():
+            CHART_POOL['pool'] = ThreadPoolExecutor(CHART_WORKERS, thread_name_prefix='chart')
+            CHART_POOL['pid'] = os.getpid()
+        return CHART_POOL['pool']
+
+
+def timed_chart(task, c):
+    # Stages inside the task (apply_layout) are collected separately, since the
+    # task may run on a pool thread, and merged into the caller's by run_charts.
+    outer, PROFILE_LOCAL.stages = getattr(PROFILE_LOCAL, 'stages', None), {}
+    t0 = time.perf_counter()
+    try:
+        out = task(c)
+    finally:
+        inner, PROFILE_LOCAL.stages = PROFILE_LOCAL.stages, outer
+    ms = (time.perf_counter() - t0) * 1e3
+    with CHART_LOCK:
+        t = CHART_TIMINGS.setdefault(task.__name__, {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        t['calls'] += 1
+        t['total_ms'] += ms
+        t['max_ms'] = max(t['max_ms'], ms)
+        t['last_ms'] = ms
+    return out, ms, inner
+
+
+def run_charts(c, *tasks):
+    # A profiled callback runs its charts inline: cProfile only sees the calling thread.
+    if CHART_WORKERS <= 1 or getattr(PROFILE_LOCAL, 'profiling', False):
+        results = [timed_chart(task, c) for task in tasks]
+    else:
+        results = list(chart_pool().map(lambda task: timed_chart(task, c), tasks))
+    stages = getattr(PROFILE_LOCAL, 'stages', None)
+    if stages is not None:
+        for task, (_, ms, inner) in zip(tasks, results):
+            stages[f'chart:{task.__name__}'] = ms
+            for name, value in inner.items():
+                stages[name] = stages.get(name, 0.0) + value
+    return [out for out, _, _ in results]
+
+
+@server.route('/chart-stats')
+def chart_stats():
+    with CHART_LOCK:
+        stats = {name: {**t, 'mean_ms': t['total_ms'] / t['calls']} for name, t in CHART_TIMINGS.items()}
+    return jsonify({'workers': CHART_WORKERS, 'charts': stats})
+
+
+def peak_day(daily):
+    if daily['Count'].isna().all():
+        return '—'
+    return daily.loc[daily['Count'].idxmax(), 'Day']
+
+
+def overview_revenue(c):
+    monthly = c['monthly']
+
+    fig1 = go.Figure()
+    fig1.add_trace(go.Scatter(
+        x=monthly['YearMonth'], y=monthly['Revenue'],
+        mode='lines+markers', line=dict(color='#6366f1', width=4, shape='spline'),
+        marker=dict(size=3), fill='tozeroy', fillcolor='rgba(99,102,241,0.1)',
+        hovertemplate='<b>%{x}</b><br>Revenue: £%{y:,.0f}<extra></extra>'))
+    apply_layout(fig1, title='Tren Revenue Bulanan', xaxis_title='Bulan',
+                 yaxis_title='Revenue (£)', hovermode='x unified')
+    return fig1
+
+
+def overview_transactions(c):
+    monthly = c['monthly']
+
+    fig2 = go.Figure()
+    fig2.add_trace(go.Bar(
+        x=monthly['YearMonth'], y=monthly['Transaksi'],
+        marker=dict(color='#0ea5e9', line=dict(width=2, color='rgba(255,255,255,0)'), cornerradius=8),
+        opacity=0.9,
+        hovertemplate='<b style="font-size: 14px; color: #ffffff;">%{x}</b><br><b>Volume Transaksi:</b> %{y:,} transaksi<extra></extra>'))
+    apply_layout(fig2, title='Jumlah Transaksi per Bulan', xaxis_title='Bulan',
+                 yaxis_title='Jumlah Transaksi')
+    fig2.update_traces(
+        hovertemplate='<b style="font-size: 14px; color: #ffffff;">%{x}</b><br><b>Volume Transaksi:</b> %{y:,} transaksi<extra></extra>',
+        selector=dict(type='bar')
+    )
+    return fig2
+
+
+def overview_daily(c):
+    daily = c['daily']
+    peak = peak_day(daily)
+
+    fig3 = go.Figure()
+    colors = ['#6366f1' if d == peak else '#334155' for d in daily['Day']]
+    fig3.add_trace(go.Bar(
+        x=daily['Day'], y=daily['Count'],
+        marker=dict(color=colors, line=dict(width=2, color='rgba(255,255,255,0)'), cornerradius=8),
+        opacity=0.9,
+        hovertemplate='<b style="font-size: 14px; color: #ffffff;">%{x}</b><br><b>Jumlah Transaksi:</b> %{y:,}<extra></extra>'))
+    apply_layout(fig3, title='Distribusi Transaksi per Hari', xaxis_title='Hari',
+                 yaxis_title='Jumlah Transaksi')
+    return fig3
+
+
+def overview_seasonal(c):
+    s_col = {'Spring': '#10b981', 'Summer': '#f59e0b', 'Autumn': '#fb923c', 'Winter': '#0ea5e9'}
+    seasonal = c['seasonal']
+
+    fig4 = go.Figure()
+    fig4.add_trace(go.Bar(
+        x=seasonal['Season'], y=seasonal['Revenue'],
+        marker=dict(
+            color=[s_col.get(s, '#6366f1') for s in seasonal['Season']],
+            line=dict(width=2, color='rgba(255,255,255,0)'),
+            cornerradius=8
+        ),
+        opacity=0.9,
+        hovertemplate='<b style="font-size: 14px; color: #ffffff;">%{x}</b><br><b>Total Revenue:</b> £%{y:,.0f}<extra></extra>'))
+    apply_layout(fig4, title='Revenue per Musim', xaxis_title='Musim', yaxis_title='Revenue (£)')
+    return fig4
+
+
+def build_overview(c):
+    c = range_entry(c, c.get('start_date'), c.get('end_date'))
+    figs = run_charts(c, overview_revenue, overview_transactions, overview_daily, overview_seasonal)
+    return figs + [f"Hari dengan transaksi tertinggi: {peak_day(c['daily'])}"]
+
+
+def overview_layout():
+    return html.Div([
+        html.Div(className='section-title', children='Tren Penjualan'),
+        html.Div(className='grid-2', children=[
+            chart_card('Tren Revenue Bulanan', 'Pendapatan total per bulan', G('overview-revenue'), 'Time Series'),
+            chart_card('Jumlah Transaksi per Bulan', 'Volume transaksi bulanan', G('overview-transactions'), 'Bar Chart'),
+        ]),
+        html.Div(className='section-title', children='Pola Waktu'),
+        html.Div(className='grid-2', children=[
+            chart_card('Distribusi Transaksi per Hari', '', G('overview-daily'), subtitle_id='overview-peak-day'),
+            chart_card('Revenue per Musim', 'Perbandingan revenue antar musim', G('overview-seasonal')),
+        ]),
+    ])
+
+
+def product_top(c):
+    top = c['top_products'].head(c['top_k']).sort_values('Quantity')
+    fig1 = go.Figure()
+    fig1.add_trace(go.Bar(
+        y=top['ProductName'].str[:35], x=top['Quantity'],
+        orientation='h',
+        marker=dict(color='#6366f1', line=dict(width=2, color='rgba(255,255,255,0)'), cornerradius=8),
+        opacity=0.9,
+        hovertemplate='<b style="font-size: 14px; color: #ffffff;">%{y}</b><br><b>Total Quantity:</b> %{x:,} unit<extra></extra>'))
+    apply_layout(fig1, title='Produk dengan Penjualan Tertinggi', xaxis_title='Total Quantity', yaxis_title='')
+    return fig1
+
+
+def product_group_revenue(c):
+    fig2 = go.Figure()
+    pg = c['product_groups']
+    fig2.add_trace(go.Pie(
+        labels=pg['Product_Group'], values=pg['Revenue'],
+        marker=dict(
+            colors=[COLOR_PRODUCT.get(g, '#6366f1') for g in pg['Product_Group']],
+            line=dict(color='#1e2235', width=2)
+        ),
+        hole=0.55, textinfo='percent+label', textposition='outside', textfont_size=11,
+        hovertemplate='<b style="font-size: 14px;">%{label}</b><br><b>Revenue:</b> £%{value:,.0f}<br>%{percent}<extra></extra>'))
+    apply_layout(fig2, title='Proporsi Revenue per Kelompok Produk', showlegend=False)
+    return fig2
+
+
+def histogram_bar(bins, color, hovertemplate):
+    # Histograms are binned in the cube; the browser only draws the bars.
+    return go.Bar(
+        x=(bins['start'] + bins['end']) / 2, y=bins['Count'], width=bins['end'] - bins['start'],
+        customdata=bins[['start', 'end']].to_numpy(),
+        marker=dict(color=color, line=dict(width=1, color='rgba(255,255,255,0.2)'), cornerradius=4),
+        opacity=0.85, hovertemplate=hovertemplate)
+
+
+def product_prices(c):
+    fig3 = go.Figure()
+    fig3.add_trace(histogram_bar(
+        c['price_bins'], '#6366f1',
+        '<b>Harga Range:</b> £%{customdata[0]:.2f} - £%{customdata[1]:.2f}<br><b>Frekuensi:</b> %{y:,} produk<extra></extra>'))
+    apply_layout(fig3, title='Distribusi Harga Produk', xaxis_title='Harga (£)', yaxis_title='Frekuensi', bargap=0)
+    return fig3
+
+
+def product_quantity(c):
+    fig4 = go.Figure()
+    fig4.add_trace(histogram_bar(
+        c['quantity_bins'], '#0ea5e9',
+        '<b>Quantity Range:</b> %{customdata[0]:,.0f} - %{customdata[1]:,.0f} unit<br><b>Frekuensi:</b> %{y:,} transaksi<extra></extra>'))
+    apply_layout(fig4, title=f'Distribusi Quantity per Transaksi',
+                 xaxis_title='Total Quantity', yaxis_title='Frekuensi', bargap=0)
+    return fig4
+
+
+def build_product(c):
+    return run_charts(c, product_top, product_group_revenue, product_prices, product_quantity)
+
+
+def product_layout():
+    return html.Div([
+        html.Div(className='section-title', children='Produk Terlaris'),
+        html.Div(className='grid-2', children=[
+            chart_card('Produk dengan Penjualan Tertinggi', 'Berdasarkan total jumlah unit terjual', G('product-top'), 'Ranking',
+                       control=top_k_control('product-top-k')),
+            chart_card('Proporsi Revenue per Kelompok', 'Kategori: Very Freq → Very Rare', G('product-group-revenue'), 'Donut'),
+        ]),
+        html.Div(className='section-title', children='Distribusi'),
+        html.Div(className='grid-2', children=[
+            chart_card('Distribusi Harga Produk', 'Histogram harga per unit (£)', G('product-prices')),
+            chart_card('Distribusi Quantity per Transaksi', 'Histogram jumlah item per transaksi', G('product-quantity')),
+        ]),
+    ])
+
+
+def customer_segments(c):
+    fig1 = go.Figure()
+    seg = c['segments']
+    fig1.add_trace(go.Bar(
+        x=seg['Segment'], y=seg['Count'],
+        marker=dict(
+            color=[COLOR_SEGMENT.get(s, '#6366f1') for s in seg['Segment']],
+            line=dict(width=2, color='rgba(255,255,255,0)'),
+            cornerradius=8
+        ),
+        opacity=0.9,
+        hovertemplate='<b style="font-size: 14px; color: #ffffff;">%{x}</b><br><b>Total Pelanggan:</b> %{y:,} orang<extra></extra>'))
+    apply_layout(fig1, title='Jumlah Pelanggan per Segmen', xaxis_title='Segmen', yaxis_title='Jumlah Pelanggan')
+    return fig1
+
+
+def customer_segment_revenue(c):
+    fig2 = go.Figure()
+    sr = c['segment_revenue']
+    fig2.add_trace(go.Pie(
+        labels=sr['Customer_Segment'], values=sr['Revenue'],
+        marker=dict(
+            colors=[COLOR_SEGMENT.get(s, '#6366f1') for s in sr['Customer_Segment']],
+            line=dict(color='#1e2235', width=2)
+        ),
+        hole=0.55, textinfo='percent+label', textposition='outside', textfont_size=11,
+        hovertemplate='<b style="font-size: 14px;">%{label}</b><br><b>Revenue:</b> £%{value:,.0f}<br>%{percent}<extra></extra>'))
+    apply_layout(fig2, title='Proporsi Revenue per Segmen', showlegend=False)
+    return fig2
+
+
+# Scatter reduction: up to SCATTER_MAX_POINTS customers are drawn as they are.
+# Above that the bulk becomes a SCATTER_BINS x SCATTER_BINS density heatmap,
+# and only customers that would otherwise disappear are kept as points: the
+# SCATTER_EXTREMES highest by revenue and by frequency, and those alone in
+# their bin. Zooming re-bins the visible range (see zoom_customer_scatter).
+SCATTER_MAX_POINTS = int(os.environ.get('SCATTER_MAX_POINTS', '2000'))
+SCATTER_BINS = int(os.environ.get('SCATTER_BINS', '50'))
+SCATTER_EXTREMES = int(os.environ.get('SCATTER_EXTREMES', '50'))
+
+
+def bin_edges(values, bounds):
+    lo, hi = bounds if bounds is not None else (values.min(), values.max())
+    if hi <= lo:
+        lo, hi = lo - 0.5, hi + 0.5
+    return np.linspace(lo, hi, SCATTER_BINS + 1)
+
+
+def reduce_scatter(ca, x_range=None, y_range=None):
+    if x_range is not None:
+        ca = ca[ca['Frequency'].between(*x_range)]
+    if y_range is not None:
+        ca = ca[ca['Monetary'].between(*y_range)]
+    if len(ca) <= SCATTER_MAX_POINTS:
+        return ca, None
+
+    x, y = ca['Frequency'].to_numpy(dtype=float), ca['Monetary'].to_numpy(dtype=float)
+    x_edges, y_edges = bin_edges(x, x_range), bin_edges(y, y_range)
+    counts = np.histogram2d(x, y, bins=[x_edges, y_edges])[0]
+    xi = np.clip(np.searchsorted(x_edges, x, side='right') - 1, 0, SCATTER_BINS - 1)
+    yi = np.clip(np.searchsorted(y_edges, y, side='right') - 1, 0, SCATTER_BINS - 1)
+    keep = counts[xi, yi] <= 1
+    keep |= (ca['Monetary'].rank(ascending=False, method='first') <= SCATTER_EXTREMES).to_numpy()
+    keep |= (ca['Frequency'].rank(ascending=False, method='first') <= SCATTER_EXTREMES).to_numpy()
+    points = ca[keep]
+    if len(points) > SCATTER_MAX_POINTS:
+        points = points.nlargest(SCATTER_MAX_POINTS, 'Monetary')
+    return points, (x_edges, y_edges, counts)
+
+
+def scatter_figure(ca, x_range=None, y_range=None):
+    ca, density = reduce_scatter(ca, x_range, y_range)
+    fig3 = go.Figure()
+    if density is not None:
+        x_edges, y_edges, counts = density
+        # Integer counts keep the grid small on the wire; empty bins are made
+        # transparent by the colorscale rather than by NaN cells.
+        top = max(counts.max(), 1)
+        z = counts.T.astype(np.uint8 if top < 2 ** 8 else np.uint16 if top < 2 ** 16 else np.uint32)
+        fig3.add_trace(go.Heatmap(
+            x=(x_edges[:-1] + x_edges[1:]) / 2, y=(y_edges[:-1] + y_edges[1:]) / 2,
+            z=z, zmin=0, zmax=top, name='Kepadatan', showscale=False,
+            colorscale=[[0, 'rgba(0,0,0,0)'], [0.99 / top, 'rgba(0,0,0,0)'],
+                        [1 / top, 'rgba(99,102,241,0.15)'], [1, 'rgba(99,102,241,0.95)']],
+            hovertemplate='<b>Frequency:</b> ~%{x:,.0f} kali<br><b>Revenue:</b> ~£%{y:,.0f}<br>'
+                          '<b>Jumlah Pelanggan:</b> %{z:,}<extra></extra>'))
+    for s in CUSTOMER_SEGMENTS:
+        sub = ca[ca['Customer_Segment'] == s]
+        if len(sub) == 0:
+            continue
+        fig3.add_trace(go.Scattergl(
+            x=sub['Frequency'], y=sub['Monetary'], mode='markers', name=s,
+            marker=dict(
+                color=COLOR_SEGMENT.get(s),
+                size=8,
+                opacity=0.7,
+                line=dict(width=1, color='white')
+            ),
+            hovertemplate=f'<b style="font-size: 14px; color: #ffffff;">{s}</b><br><b>Transaksi Frequency:</b> %{{x}} kali<br><b>Total Revenue:</b> £%{{y:,.0f}}<extra></extra>'))
+    apply_layout(fig3, title='Segmentasi: Frequency vs Revenue',
+                 xaxis_title='Frequency (Jumlah Transaksi)', yaxis_title='Total Revenue (£)')
+    if x_range is not None:
+        fig3.update_xaxes(range=list(x_range))
+    if y_range is not None:
+        fig3.update_yaxes(range=list(y_range))
+    return fig3
+
+
+def customer_scatter(c):
+    return scatter_figure(c['customer_activity'])
+
+
+def customer_top(c):
+    tc = c['top_customers'].head(c['top_k']).sort_values('Revenue')
+    fig4 = go.Figure()
+    fig4.add_trace(go.Bar(
+        y=tc['CustomerNo'], x=tc['Revenue'], orientation='h',
+        marker=dict(color='#8b5cf6', line=dict(width=2, color='rgba(255,255,255,0)'), cornerradius=8),
+        text=[f'£{r:,.0f}' for r in tc['Revenue']], textposition='outside', textfont_size=10,
+        opacity=0.9,
+        hovertemplate='<b style="font-size: 14px; color: #ffffff;">Customer ID: %{y}</b><br><b>Total Revenue:</b> £%{x:,.0f}<extra></extra>'))
+    apply_layout(fig4, title='Pelanggan dengan Revenue Tertinggi', xaxis_title='Revenue (£)', yaxis_title='')
+    return fig4
+
+
+def build_customer(c):
+    return run_charts(c, customer_segments, customer_segment_revenue, customer_scatter, customer_top)
+
+
+def customer_layout():
+    return html.Div([
+        html.Div(className='section-title', children='Segmentasi Pelanggan'),
+        html.Div(className='grid-2', children=[
+            chart_card('Jumlah Pelanggan per Segmen', 'Kategori: Loyal → Inactive', G('customer-segments'), 'Segmentasi'),
+            chart_card('Proporsi Revenue per Segmen', 'Kontribusi revenue tiap segmen', G('customer-segment-revenue'), 'Donut'),
+        ]),
+        html.Div(className='section-title', children='Detail Pelanggan'),
+        chart_card('Segmentasi: Frequency vs Revenue',
+                   'Pemetaan kontribusi pelanggan berdasarkan intensitas transaksi', G('customer-scatter', GRAPH_STYLE_TALL)),
+        chart_card('Pelanggan dengan Revenue Tertinggi', 'Berdasarkan total revenue yang dihasilkan', G('customer-top'), 'Ranking',
+                   control=top_k_control('customer-top-k')),
+    ])
+
+
+# Only the country data changes between filters, so the validated choropleth
+# (template, colorscale, geo settings) is built once and each call swaps in
+# locations/z/text on a plain figure dict.
+GEO_MAP_BASE = {}
+
+
+def geo_map_base():
+    if not GEO_MAP_BASE:
+        fig_map = go.Figure()
+        fig_map.add_trace(go.Choropleth(
+            colorscale='YlOrRd', colorbar_title='Transaksi',
+            hovertemplate='<b>%{text}</b><br>Transaksi: %{z:,}<extra></extra>'))
+        apply_layout(fig_map, title='Peta Distribusi Transaksi per Negara',
+                     geo=dict(showframe=False, showcoastlines=True, projection_type='natural earth',
+                              bgcolor='rgba(0,0,0,0)', landcolor='#1a1d2e',
+                              coastlinecolor='rgba(255,255,255,0.15)'))
+        GEO_MAP_BASE.update(fig_map.to_plotly_json())
+    return GEO_MAP_BASE
+
+
+def geo_map(c):
+    base = geo_map_base()
+    return {'data': [{**base['data'][0], **c['country_map']}], 'layout': base['layout']}
+
+
+def geo_top_countries(c):
+    ct = (c['country_trx']
+          .sort_values('Transaksi', ascending=False).head(15).sort_values('Transaksi'))
+    fig_bar = go.Figure()
+    fig_bar.add_trace(go.Bar(
+        y=ct['Country'], x=ct['Transaksi'], orientation='h',
+        marker=dict(
+            color=[COLOR_COUNTRY.get(g, '#6366f1') for g in ct['Country_Group']],
+            line=dict(width=2, color='rgba(255,255,255,0)'),
+            cornerradius=8
+        ),
+        opacity=0.9,
+        hovertemplate='<b style="font-size: 14px; color: #ffffff;">%{y}</b><br><b>Total Transaksi:</b> %{x:,} transaksi<extra></extra>'))
+    apply_layout(fig_bar, title='Negara dengan Transaksi Tertinggi',
+                 xaxis_title='Jumlah Transaksi', yaxis_title='')
+    return fig_bar
+
+
+def geo_groups(c):
+    fig_pie = go.Figure()
+    cg = c['country_groups']
+    fig_pie.add_trace(go.Pie(
+        labels=cg['Country_Group'], values=cg['Revenue'],
+        marker=dict(
+            colors=[COLOR_COUNTRY.get(g, '#6366f1') for g in cg['Country_Group']],
+            line=dict(color='#1e2235', width=2)
+        ),
+        hole=0.55, textinfo='percent+label', textposition='outside', textfont_size=11,
+        hovertemplate='<b style="font-size: 14px;">%{label}</b><br><b>Revenue:</b> £%{value:,.0f}<br>%{percent}<extra></extra>'))
+    apply_layout(fig_pie, title='Proporsi Revenue per Kelompok Negara', showlegend=False)
+    return fig_pie
+
+
+GEO_TABLE_COLUMNS = ['Kelompok', 'Negara', 'Transaksi', 'Revenue', 'Pelanggan', 'AOV']
+
+
+def geo_table(c):
+    gt = c['group_table']
+    aov = (gt['Revenue'] / gt['Transaksi']).round(2)
+    gt = gt.assign(Revenue=gt['Revenue'].map('£{:,.0f}'.format), AOV=aov.map('£{:,.2f}'.format))
+    gt.columns = GEO_TABLE_COLUMNS
+    return gt.to_dict('records')
+
+
+def build_geo(c):
+    return run_charts(c, geo_map, geo_top_countries, geo_groups, geo_table)
+
+
+def geo_layout():
+    table_comp = dash_table.DataTable(
+        id='geo-table',
+        columns=[{'name': col, 'id': col} for col in GEO_TABLE_COLUMNS],
+        style_header={
+            'backgroundColor': '#1a1d2e', 'color': '#94a3b8', 'fontWeight': '600',
+            'fontSize': '11px', 'textTransform': 'uppercase', 'letterSpacing': '0.5px',
+            'border': 'none', 'borderBottom': '1px solid rgba(255,255,255,0.1)'},
+        style_cell={
+            'backgroundColor': '#1e2235', 'color': '#f1f5f9', 'fontSize': '13px',
+            'border': 'none', 'borderBottom': '1px solid rgba(255,255,255,0.05)',
+            'padding': '12px 16px', 'fontFamily': 'Inter, sans-serif'},
+        style_data_conditional=[
+            {'if': {'row_index': 'odd'}, 'backgroundColor': '#222640'}])
+
+    return html.Div([
+        html.Div(className='section-title', children='Peta Global'),
+        chart_card('Peta Distribusi Transaksi Global', 'Sebaran transaksi berdasarkan lokasi pelanggan',
+                   G('geo-map', GRAPH_STYLE_TALL), 'Map'),
+        html.Div(className='section-title', children='Perbandingan Negara'),
+        html.Div(className='grid-2', children=[
+            chart_card('Negara dengan Transaksi Tertinggi', 'Negara dikelompokkan berdasarkan tingkat aktivitas transaksi', G('geo-top-countries', GRAPH_STYLE_TALL)),
+            chart_card('Proporsi Revenue per Kelompok', 'Kategori: Tinggi → Rendah', G('geo-groups')),
+        ]),
+        html.Div(className='section-title', children='Ringkasan Data'),
+        html.Div(className='chart-card', children=[
+            html.Div(className='chart-card-header', children=[
+                html.Div([html.Div('Ringkasan per Kelompok Negara', className='chart-title'),
+                           html.Div('Perbandingan indikator utama', className='chart-subtitle')]),
+                html.Span('Table', className='chart-badge'),
+            ]),
+            table_comp,
+        ]),
+    ])
+
+
+# Each page is a static layout with empty slots plus a builder that returns
+# the slots' values, in the order listed here. Controls (name, id, prop) are
+# extra inputs of the page's callback, passed to the builder as c[name].
+PAGES = {
+    'overview': (overview_layout, build_overview,
+                 [('overview-revenue', 'figure'), ('overview-transactions', 'figure'),
+                  ('overview-daily', 'figure'), ('overview-seasonal', 'figure'),
+                  ('overview-peak-day', 'children')],
+                 [('start_date', 'filter-date', 'start_date'), ('end_date', 'filter-date', 'end_date')]),
+    'product': (product_layout, build_product,
+                [('product-top', 'figure'), ('product-group-revenue', 'figure'),
+                 ('product-prices', 'figure'), ('product-quantity', 'figure')],
+                [('top_k', 'product-top-k', 'value')]),
+    'customer': (customer_layout, build_customer,
+                 [('customer-segments', 'figure'), ('customer-segment-revenue', 'figure'),
+                  ('customer-scatter', 'figure'), ('customer-top', 'figure')],
+                 [('top_k', 'customer-top-k', 'value')]),
+    'geo': (geo_layout, build_geo,
+            [('geo-map', 'figure'), ('geo-top-countries', 'figure'),
+             ('geo-groups', 'figure'), ('geo-table', 'data')], []),
+}
+
+
+# ============================================================
+# 10. APP LAYOUT
+# ============================================================
+# Built per page load, so a load after the warm-up or an ingest shows current
+# stats and filter values. Until the data is loaded (STARTUP_MODE=lazy) the
+# shell has placeholders and data-poll runs, so refresh_data_version fills
+# them in and the data callbacks rerun.
+def serve_layout():
+    return html.Div(className='grid-sidebar', children=[
+        create_sidebar(),
+        create_main_content(),
+        dcc.Store(id='data-version', data=DATA_VERSION),
+        # One id per page load, so two tabs of one browser session do not supersede each other.
+        dcc.Store(id='tab-id', data=os.urandom(8).hex()),
+        # Figure skeletons for FIGURE_TRANSPORT=patch, kept for the browser session.
+        dcc.Store(id='figure-skeletons', storage_type='session'),
+        dcc.Store(id='figure-skeleton-keys', storage_type='session'),
+        dcc.Interval(id='data-poll', interval=max(WATCH_INTERVAL, 1) * 1000,
+                     disabled=WATCH_INTERVAL <= 0 and DATA_VERSION is not None),
+    ])
+
+
+app.layout = serve_layout
+
+
+# ============================================================
+# 11. RENDER CACHE
+# ============================================================
+# Bounded LRU of serialized callback output per (data version, page, filters).
+# Most traffic hits a few default views, which are then served without
+# rebuilding any figure. RENDER_CACHE_DIR adds a disk tier shared by workers.
+RENDER_CACHE_SIZE = int(os.environ.get('RENDER_CACHE_SIZE', '128'))
+RENDER_CACHE_DIR = os.environ.get('RENDER_CACHE_DIR')
+
+
+class RenderCache:
+    def __init__(self, maxsize, disk_dir=None):
+        self.maxsize = maxsize
+        self.disk_dir = disk_dir
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'disk_hits': 0, 'disk_evictions': 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha1(repr(key).encode()).hexdigest() + '.json')
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _remember(self, key, payload):
+        with self.lock:
+            self.entries[key] = payload
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                payload = f.read()
+            os.utime(path)  # disk entries are evicted by mtime, so a read refreshes them
+        except OSError:
+            return None
+        self._count('disk_hits')
+        self._remember(key, payload)
+        return payload
+
+    def _write_disk(self, key, payload):
+        path = self._path(key)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp, path)
+            files = sorted((e for e in os.scandir(self.disk_dir) if e.name.endswith('.json')),
+                           key=lambda e: e.stat().st_mtime)
+            for entry in files[:-self.maxsize]:
+                os.remove(entry.path)
+                self._count('disk_evictions')
+        except OSError:
+            # Another worker may have trimmed the same file; the cache is best-effort.
+            pass
+
+    def get(self, key):
+        with self.lock:
+            payload = self.entries.get(key)
+            if payload is not None:
+                self.entries.move_to_end(key)
+        if payload is None and self.disk_dir:
+            payload = self._read_disk(key)
+        self._count('misses' if payload is None else 'hits')
+        return None if payload is None else json.loads(payload)
+
+    def put(self, key, value):
+        return self.store(key, to_json_plotly(value))
+
+    def store(self, key, payload):
+        self._remember(key, payload)
+        if self.disk_dir:
+            self._write_disk(key, payload)
+        return len(payload)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def info(self):
+        with self.lock:
+            return {**self.stats, 'size': len(self.entries), 'maxsize': self.maxsize,
+                    'bytes': sum(len(p) for p in self.entries.values()),
+                    'data_version': DATA_VERSION, 'disk_dir': self.disk_dir}
+
+
+RENDER_CACHE = RenderCache(RENDER_CACHE_SIZE, RENDER_CACHE_DIR)
+
+
+@server.route('/cache-stats')
+def cache_stats():
+    return jsonify(RENDER_CACHE.info())
+
+
+# ============================================================
+# 12. FIGURE TRANSPORT
+# ============================================================
+# With FIGURE_TRANSPORT=patch a page callback does not send figures. Each
+# figure is split into a skeleton (layout, styling, hovertemplates; the
+# plotly template is split off as its own skeleton) and its data arrays.
+# Skeletons are content-addressed and sent only when the browser does not
+# have them yet ('figure-skeleton-keys'); a clientside callback keeps them in
+# session storage and patches the arrays in. Numeric arrays travel as
+# plotly's base64 typed arrays, narrowed to the smallest lossless dtype.
+FIGURE_TRANSPORT = os.environ.get('FIGURE_TRANSPORT', 'json')  # or 'patch'
+INT_DTYPES = [np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32]
+
+
+def pack_array(value):
+    arr = np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype'])
+    if arr.dtype.kind == 'f' and len(arr) and np.isfinite(arr).all() and (arr == np.round(arr)).all():
+        arr = arr.astype(np.int64)
+    if arr.dtype.kind in 'iu' and len(arr):
+        lo, hi = arr.min(), arr.max()
+        dtype = next((t for t in INT_DTYPES if np.iinfo(t).min <= lo and hi <= np.iinfo(t).max), None)
+        if dtype is not None:
+            arr = arr.astype(dtype)
+    elif arr.dtype == np.float64 and np.array_equal(arr.astype(np.float32), arr, equal_nan=True):
+        arr = arr.astype(np.float32)
+    packed = {'dtype': np.dtype(arr.dtype).str[1:], 'bdata': base64.b64encode(arr.tobytes()).decode()}
+    if 'shape' in value:
+        packed['shape'] = value['shape']
+    return packed
+
+
+def is_array(value):
+    if isinstance(value, dict):
+        return 'bdata' in value and 'dtype' in value
+    return isinstance(value, list) and all(not isinstance(v, (dict, list)) for v in value)
+
+
+def skeleton_key(skeleton):
+    return hashlib.sha1(json.dumps(skeleton, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def split_figure(fig, skeletons):
+    # Arrays inside traces are replaced by None and returned as [path, value] pairs.
+    arrays = []
+
+    def strip(node, path):
+        for k, v in (node.items() if isinstance(node, dict) else enumerate(node)):
+            if is_array(v):
+                arrays.append([path + [k], pack_array(v) if isinstance(v, dict) else v])
+                node[k] = None
+            elif isinstance(v, (dict, list)):
+                strip(v, path + [k])
+
+    fig = {'data': fig.get('data', []), 'layout': dict(fig.get('layout', {}))}
+    for i, trace in enumerate(fig['data']):
+        strip(trace, ['data', i])
+    template = fig['layout'].pop('template', None)
+    slot = {'skeleton': skeleton_key(fig), 'arrays': arrays}
+    skeletons[slot['skeleton']] = fig
+    if template is not None:
+        slot['template'] = skeleton_key(template)
+        skeletons[slot['template']] = template
+    return slot
+
+
+def pack_page(page, values):
+    # values: the page builder's output as plain JSON (see update_page).
+    packed = {'skeletons': {}, 'slots': []}
+    for (_, prop), value in zip(PAGES[page][2], values):
+        packed['slots'].append(split_figure(value, packed['skeletons']) if prop == 'figure' else {'value': value})
+    return packed
+
+
+def trim_skeletons(packed, known):
+    known = set(known or ())
+    return {**packed, 'skeletons': {k: v for k, v in packed['skeletons'].items() if k not in known}}
+
+
+PATCH_FIGURES_JS = """
+function (payload, skeletons, keys) {
+    const noUpdate = window.dash_clientside.no_update;
+    if (!payload) {
+        return Array(N_SLOTS + 2).fill(noUpdate);
+    }
+    const store = Object.assign({}, skeletons || {}, payload.skeletons);
+    let missing = false;
+    const values = payload.slots.map(function (slot) {
+        if (!('skeleton' in slot)) {
+            return slot.value;
+        }
+        if (!store[slot.skeleton] || (slot.template && !store[slot.template])) {
+            missing = true;
+            return noUpdate;
+        }
+        const fig = JSON.parse(JSON.stringify(store[slot.skeleton]));
+        if (slot.template) {
+            fig.layout.template = store[slot.template];
+        }
+        slot.arrays.forEach(function (entry) {
+            let node = fig;
+            const path = entry[0];
+            for (let i = 0; i < path.length - 1; i++) {
+                node = node[path[i]];
+            }
+            node[path[path.length - 1]] = entry[1];
+        });
+        return fig;
+    });
+    const added = Object.keys(payload.skeletons).length > 0;
+    // A skeleton lost from storage empties the key list, so the next response resends it.
+    const newKeys = missing ? [] : (added ? Object.keys(store) : noUpdate);
+    return values.concat([added ? store : noUpdate, newKeys]);
+}
+"""
+
+
+# ============================================================
+# 13. PROFILING
+# ============================================================
+# Every update_kpis/update_page call leaves a record with its stage timings (cache
+# lookup, cube lookup, page build, per-chart, apply_layout, serialization)
+# and output size in a ring buffer of PROFILE_BUFFER_SIZE entries, served as
+# JSON at /profile and as Prometheus text at /metrics. PROFILE_SLOWEST=N
+# also runs each call under cProfile and tracemalloc and keeps the reports
+# of the N slowest calls; this is for diagnosis, it slows every call down.
+PROFILE_BUFFER_SIZE = int(os.environ.get('PROFILE_BUFFER_SIZE', '1000'))
+PROFILE_SLOWEST = int(os.environ.get('PROFILE_SLOWEST', '0'))
+PROFILE_LOCK = threading.Lock()
+PROFILE_RECORDS = deque(maxlen=PROFILE_BUFFER_SIZE)
+PROFILE_SNAPSHOTS = []  # min-heap of (total_ms, seq, report)
+PROFILE_SEQ = itertools.count()
+# Cumulative per-page/per-stage totals for Prometheus counters; the ring buffer only covers a window.
+PROFILE_TOTALS = {'calls': {}, 'seconds': {}, 'cache_hits': {}, 'stage_seconds': {}, 'stage_calls': {}}
+
+
+def profile_report(profiler, before):
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(30)
+    report = {'cprofile': out.getvalue()}
+    if before is not None:
+        # tracemalloc is process-wide, so concurrent callbacks share these numbers.
+        diff = tracemalloc.take_snapshot().compare_to(before, 'lineno')
+        report['allocations'] = [str(d) for d in diff[:15]]
+    return report
+
+
+@contextmanager
+def request_trace(page, pg, cs, cg, co=None):
+    pg, cs, cg, co = filter_key(pg, cs, cg, co)
+    record = {'time': time.time(), 'page': page or 'overview', 'product_group': pg,
+              'customer_segment': cs, 'country_group': cg, 'country': co,
+              'cache_hit': False, 'bytes': None, 'stages': {}}
+    profiling = PROFILE_SLOWEST > 0
+    profiler, before = None, None
+    if profiling:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        start_mem = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+    PROFILE_LOCAL.stages, PROFILE_LOCAL.profiling = record['stages'], profiling
+    t0 = time.perf_counter()
+    try:
+        if profiler:
+            profiler.enable()
+        yield record
+    finally:
+        if profiler:
+            profiler.disable()
+        record['total_ms'] = (time.perf_counter() - t0) * 1e3
+        PROFILE_LOCAL.stages, PROFILE_LOCAL.profiling = None, False
+        if profiling:
+            record['alloc_peak_kb'] = (tracemalloc.get_traced_memory()[1] - start_mem) / 1024
+        record_trace(record, profiler, before)
+
+
+def record_trace(record, profiler, before):
+    page, t = record['page'], PROFILE_TOTALS
+    with PROFILE_LOCK:
+        PROFILE_RECORDS.append(record)
+        t['calls'][page] = t['calls'].get(page, 0) + 1
+        t['seconds'][page] = t['seconds'].get(page, 0.0) + record['total_ms'] / 1e3
+        t['cache_hits'][page] = t['cache_hits'].get(page, 0) + record['cache_hit']
+        for name, ms in record['stages'].items():
+            t['stage_seconds'][name] = t['stage_seconds'].get(name, 0.0) + ms / 1e3
+            t['stage_calls'][name] = t['stage_calls'].get(name, 0) + 1
+        keep = profiler is not None and (len(PROFILE_SNAPSHOTS) < PROFILE_SLOWEST
+                                         or record['total_ms'] > PROFILE_SNAPSHOTS[0][0])
+    if not keep:
+        return
+    # Formatting the reports is slow, so it happens outside the lock and only for kept calls.
+    entry = (record['total_ms'], next(PROFILE_SEQ), {**record, **profile_report(profiler, before)})
+    with PROFILE_LOCK:
+        if len(PROFILE_SNAPSHOTS) < PROFILE_SLOWEST:
+            heapq.heappush(PROFILE_SNAPSHOTS, entry)
+        elif entry[0] > PROFILE_SNAPSHOTS[0][0]:
+            heapq.heapreplace(PROFILE_SNAPSHOTS, entry)
+
+
+@server.route('/profile')
+def profile_json():
+    with PROFILE_LOCK:
+        recent = list(PROFILE_RECORDS)
+        slowest = [report for _, _, report in sorted(PROFILE_SNAPSHOTS, reverse=True)]
+    return jsonify({'buffer_size': PROFILE_BUFFER_SIZE, 'recent': recent, 'slowest': slowest})
+
+
+@server.route('/metrics')
+def profile_metrics():
+    def label(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+    with PROFILE_LOCK:
+        recent = list(PROFILE_RECORDS)
+        t = {name: dict(values) for name, values in PROFILE_TOTALS.items()}
+    lines = ['# HELP dashboard_callback_seconds Callback latency per page, page="kpi" for the KPI cards (quantiles over the recent window).',
+             '# TYPE dashboard_callback_seconds summary']
+    for page in sorted(t['calls']):
+        totals = np.array([r['total_ms'] for r in recent if r['page'] == page]) / 1e3
+        for q in (0.5, 0.9, 0.99):
+            value = np.quantile(totals, q) if len(totals) else float('nan')
+            lines.append(f'dashboard_callback_seconds{{page="{label(page)}",quantile="{q}"}} {value:.6f}')
+        lines.append(f'dashboard_callback_seconds_sum{{page="{label(page)}"}} {t["seconds"][page]:.6f}')
+        lines.append(f'dashboard_callback_seconds_count{{page="{label(page)}"}} {t["calls"][page]}')
+    lines += ['# HELP dashboard_render_cache_hits_total Page callbacks answered from the render cache.',
+              '# TYPE dashboard_render_cache_hits_total counter']
+    lines += [f'dashboard_render_cache_hits_total{{page="{label(page)}"}} {hits}'
+              for page, hits in sorted(t['cache_hits'].items())]
+    lines += ['# HELP dashboard_stage_seconds_total Time spent per callback stage.',
+              '# TYPE dashboard_stage_seconds_total counter']
+    lines += [f'dashboard_stage_seconds_total{{stage="{label(name)}"}} {value:.6f}'
+              for name, value in sorted(t['stage_seconds'].items())]
+    lines += ['# HELP dashboard_stage_calls_total Callbacks that went through each stage.',
+              '# TYPE dashboard_stage_calls_total counter']
+    lines += [f'dashboard_stage_calls_total{{stage="{label(name)}"}} {value}'
+              for name, value in sorted(t['stage_calls'].items())]
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+# ============================================================
+# 14. INCREMENTAL INGESTION
+# ============================================================
+# With WATCH_INTERVAL > 0 every worker polls for complete lines appended to
+# the source CSV and for new *.csv delta files in DELTA_DIR (write them under
+# another name and rename, so half-written files are never read). New rows go
+# through normalize() and become a FILTER_INDEX segment with its own masks;
+# df and its masks are never rewritten, so under preload_app they stay shared
+# with the master. Ingested segments are merged like a binary counter, as in
+# stream_dataset(). Only the leaf rows and distinct-count buckets of the
+# leaves the rows fall in are regrouped, and the cube entries over them are
+# dropped and rebuilt on first use (AdhocCube pinned keys); the rest is kept.
+#
+# Each worker ingests on its own, so two workers can serve different
+# versions for up to WATCH_INTERVAL plus an ingest. A callback that carries a
+# data-version this worker does not have ingests first (catch_up()), so what
+# one browser sees never goes back to an older version.
+
+
+def concat_frames(base, delta):
+    # Sorted union categories keep category order equal to value order, as after a full load.
+    delta = delta.reindex(columns=base.columns)
+    for col in base.columns:
+        if isinstance(base[col].dtype, pd.CategoricalDtype):
+            new = delta[col].astype('category')
+            dtype = pd.CategoricalDtype(base[col].cat.categories.union(new.cat.categories).sort_values())
+            base = base.assign(**{col: base[col].astype(dtype)})
+            delta = delta.assign(**{col: delta[col].astype(dtype)})
+    return pd.concat([base, delta], ignore_index=True)
+
+
+def conform(delta, base):
+    # The base's columns, and its numeric dtypes where every value survives
+    # the cast, so an export writes one schema across segments.
+    delta = delta.reindex(columns=base.columns)
+    for col, dtype in base.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype) or delta[col].dtype == dtype or dtype.kind not in 'iuf':
+            continue
+        cast = delta[col].astype(dtype)
+        if np.array_equal(cast.to_numpy(np.float64), delta[col].to_numpy(np.float64), equal_nan=True):
+            delta[col] = cast
+    return delta
+
+
+def affected_keys(delta):
+    keys = set()
+    for leaf in delta[CUBE_COLS].drop_duplicates().itertuples(index=False):
+        keys.update(itertools.product(*[('All',) if pd.isna(v) else (v, 'All') for v in leaf], ['All']))
+    return keys
+
+
+def ingest(new_rows):
+    global FILTER_INDEX, CUBE, CUBE_ADHOC, CUBE_TABLES, DISTINCT_INDEX, DATASET_STATS
+    delta = conform(normalize(new_rows), df)
+    delta_tables = cube_tables(delta)
+    touched = delta_tables['keys'][FILTER_COLS].drop_duplicates()
+
+    tables = merge_leaf_rows(CUBE_TABLES, delta_tables)
+    summary = DISTINCT_INDEX['summary']
+    if summary is not None:
+        # Only the customers, products and countries in the delta are recomputed.
+        summary = pipeline.summarize(delta, summary)
+    index = {**distinct_index(tables['keys'], carry=(DISTINCT_INDEX, touched)),
+             'summary': summary if summary_agrees(summary, tables) else None}
+    stats = dataset_stats(tables, min(DATASET_STATS['start'], delta['Date'].min()),
+                          max(DATASET_STATS['end'], delta['Date'].max()))
+
+    # Entries over touched leaves are left to cube_lookup(); the others keep
+    # their numbers, as leaf numbers and their buckets are unchanged.
+    affected = affected_keys(delta)
+    rebuilt, entries = CUBE_ADHOC.snapshot()
+    cube = {key: entry for key, entry in {**CUBE, **rebuilt}.items() if key not in affected}
+    adhoc = AdhocCube(CUBE_ADHOC_SIZE, (CUBE.keys() | CUBE_ADHOC.pinned | affected) - cube.keys())
+    adhoc.entries.update((key, entry) for key, entry in entries.items() if select_leaves(touched, key).empty)
+
+    segments = FILTER_INDEX + [(delta, build_filter_masks(delta))]
+    while len(segments) > 2 and 2 * len(segments[-1][0]) >= len(segments[-2][0]):
+        frame = concat_frames(segments[-2][0], segments.pop()[0])
+        segments[-1] = (frame, build_filter_masks(frame))
+
+    FILTER_INDEX, CUBE, CUBE_TABLES, DISTINCT_INDEX, DATASET_STATS = segments, cube, tables, index, stats
+    CUBE_ADHOC = adhoc
+
+
+def read_appended_rows(offset):
+    if os.path.getsize(SOURCE_CSV) <= offset:
+        return None, offset
+    with open(SOURCE_CSV, 'rb') as f:
+        header = f.readline()
+        f.seek(offset)
+        chunk = f.read()
+    end = chunk.rfind(b'\n') + 1
+    if end == 0:
+        return None, offset  # the writer has not finished its first line yet
+    names = pd.read_csv(io.BytesIO(header), encoding='utf-8-sig', nrows=0).columns
+    rows = pd.read_csv(io.BytesIO(chunk[:end]), names=list(names), header=None)
+    return rows, offset + end
+
+
+def read_delta_files(seen):
+    if not os.path.isdir(DELTA_DIR):
+        return [], []
+    names = sorted(n for n in os.listdir(DELTA_DIR) if n.endswith('.csv') and n not in seen)
+    return [pd.read_csv(os.path.join(DELTA_DIR, n), encoding='utf-8-sig') for n in names], names
+
+
+def read_new_rows(offset, seen):
+    # Non-empty frames past the source offset and in unseen delta files, the new offset and the files read.
+    appended, offset = read_appended_rows(offset)
+    frames, names = read_delta_files(seen)
+    if appended is not None:
+        frames.insert(0, appended)
+    return [f for f in frames if len(f)], offset, names
+
+
+def ingest_sql():
+    # The SQLite file is shared, so another worker may have ingested the
+    # change already; its meta says what is in, and this worker catches up.
+    global DATASET_STATS, CUBE_ADHOC
+    offset, deltas, n_rows = SQL_BACKEND.ingest(read_new_rows)
+    if (offset, deltas) == (INGEST_STATE['offset'], INGEST_STATE['deltas']):
+        return 0, False
+    SQL_BACKEND.refresh()
+    DATASET_STATS, CUBE_ADHOC = SQL_BACKEND.dataset_stats(), AdhocCube(CUBE_ADHOC_SIZE)
+    INGEST_STATE['offset'], INGEST_STATE['deltas'] = offset, deltas
+    return n_rows, True
+
+
+def poll_new_data():
+    global DATA_VERSION
+    if DATA_VERSION is None:
+        return False  # still loading (STARTUP_MODE=lazy)
+    with INGEST_LOCK:
+        if QUERY_ENGINE == 'sql':
+            n_rows, changed = ingest_sql()
+        else:
+            frames, offset, names = read_new_rows(INGEST_STATE['offset'], INGEST_STATE['deltas'])
+            if frames:
+                ingest(pd.concat(frames, ignore_index=True))
+            INGEST_STATE['offset'] = offset
+            INGEST_STATE['deltas'].update(names)
+            n_rows, changed = sum(len(f) for f in frames), bool(frames)
+        if not changed:
+            return False
+        DATA_VERSION = ingested_version()
+        RENDER_CACHE.clear()
+        total = SQL_BACKEND.row_count() if QUERY_ENGINE == 'sql' else sum(len(frame) for frame, _ in FILTER_INDEX)
+        print(f"Data baru: {n_rows:,} baris | total {total:,} baris")
+        return True
+
+
+def safe_poll():
+    try:
+        poll_new_data()
+    except Exception as e:
+        # A malformed delta must not kill the watcher or fail a callback; the next poll retries.
+        print(f"Gagal memuat data baru: {e}")
+
+
+def watch_loop():
+    while True:
+        time.sleep(WATCH_INTERVAL)
+        safe_poll()
+
+
+def catch_up(version):
+    # version: the data-version a callback carries from the browser.
+    if WATCH_INTERVAL > 0 and version and version != DATA_VERSION:
+        safe_poll()
+
+
+@server.before_request
+def start_watcher():
+    # Started lazily in each serving process: threads do not survive gunicorn's fork.
+    if WATCH_INTERVAL > 0 and INGEST_STATE['pid'] != os.getpid():
+        INGEST_STATE['pid'] = os.getpid()
+        threading.Thread(target=watch_loop, name='data-watcher', daemon=True).start()
+
+
+# ============================================================
+# 15. BACKGROUND JOBS
+# ============================================================
+# With PAGE_JOBS=thread or process, page builds run on a job pool and the
+# request only waits for the result. Identical builds in flight (same render
+# cache key) are coalesced into one job, whoever asked for them. A newer
+# request from the same browser tab for the same page supersedes the
+# older one: the older request returns at once without an update (Dash would
+# drop its response anyway), and its job is cancelled if it has not started
+# and nobody else is waiting for it. A job that already runs finishes and
+# fills the render cache.
+#
+# Process jobs are forked once per serving process by JobManager.start(),
+# before any other thread runs (gunicorn's post_fork hook): a fork while
+# another thread holds e.g. CHART_LOCK would leave the job process waiting
+# on that lock forever. They keep the data they were forked with and catch
+# up on ingested rows themselves (page_job). In lazy startup the data is
+# loaded after that point, by a thread, so process jobs fall back to threads.
+PAGE_JOBS = os.environ.get('PAGE_JOBS', 'off')  # or 'thread' / 'process'
+if PAGE_JOBS == 'process' and STARTUP_MODE == 'lazy':
+    print("PAGE_JOBS=process butuh STARTUP_MODE=eager; memakai thread.")
+    PAGE_JOBS = 'thread'
+PAGE_JOB_WORKERS = int(os.environ.get('PAGE_JOB_WORKERS', '2'))
+SESSION_COOKIE = 'dashboard_session'
+JOB_PROCESS = {'child': False}
+
+
+def job_process_init():
+    JOB_PROCESS['child'] = True
+
+
+class JobManager:
+    def __init__(self, kind, workers):
+        self.kind = kind
+        self.workers = workers
+        self.pool, self.pool_key = None, None
+        self.jobs = {}    # job key -> [future, waiting requests]
+        self.latest = {}  # session slot -> ticket of its newest request
+        self.lock = threading.RLock()  # future.cancel() runs finish() in the calling thread
+        self.stats = {'inline': 0, 'submitted': 0, 'coalesced': 0, 'superseded': 0, 'cancelled': 0}
+
+    def start(self):
+        # Call while this is the process's only thread. With the fork context
+        # every job process is forked on the first submit, so one no-op
+        # submit forks them all now instead of under load.
+        if self.kind == 'process' and self.pool_key != os.getpid():
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'),
+                                            initializer=job_process_init)
+            self.pool.submit(os.getpid).result()
+            self.pool_key = os.getpid()
+
+    def executor(self):
+        # Thread pools are created lazily and per process, like chart_pool.
+        if self.pool_key != os.getpid():
+            if self.kind == 'process':
+                raise RuntimeError("Pool proses belum dimulai: panggil JOB_MANAGER.start() sebelum thread lain berjalan.")
+            self.pool, self.pool_key = ThreadPoolExecutor(self.workers), os.getpid()
+        return self.pool
+
+    def finish(self, key, future, done):
+        with self.lock:
+            if self.jobs.get(key, [None])[0] is future:
+                del self.jobs[key]
+        if done is not None and not future.cancelled() and future.exception() is None:
+            done(future.result())
+
+    def run(self, key, slot, fn, *args, done=None):
+        # Returns (result, whether this request submitted the job); done(result)
+        # is called once per job. Raises PreventUpdate when superseded.
+        if self.kind == 'off' or getattr(PROFILE_LOCAL, 'profiling', False):
+            # A profiled callback builds inline: cProfile only sees the calling thread.
+            result = fn(*args)
+            if done is not None:
+                done(result)
+            with self.lock:
+                self.stats['inline'] += 1
+            return result, True
+        ticket = Future()
+        with self.lock:
+            job = self.jobs.get(key)
+            owner = job is None
+            if owner:
+                future = self.executor().submit(fn, *args)
+                job = self.jobs[key] = [future, 0]
+                self.stats['submitted'] += 1
+            else:
+                future = job[0]
+                self.stats['coalesced'] += 1
+            job[1] += 1
+            if slot is not None:
+                previous, self.latest[slot] = self.latest.get(slot), ticket
+                if previous is not None:
+                    previous.set_result(None)
+        if owner:
+            future.add_done_callback(lambda f: self.finish(key, f, done))
+        wait([future, ticket], return_when=FIRST_COMPLETED)
+        with self.lock:
+            job[1] -= 1
+            if slot is not None and self.latest.get(slot) is ticket:
+                del self.latest[slot]
+            superseded = not future.done()
+            if superseded:
+                self.stats['superseded'] += 1
+                if job[1] == 0 and future.cancel():
+                    self.stats['cancelled'] += 1
+        if superseded:
+            raise PreventUpdate
+        return future.result(), owner
+
+    def info(self):
+        with self.lock:
+            return {**self.stats, 'kind': self.kind, 'workers': self.workers,
+                    'in_flight': len(self.jobs), 'waiting': sum(n for _, n in self.jobs.values())}
+
+
+JOB_MANAGER = JobManager(PAGE_JOBS, PAGE_JOB_WORKERS)
+
+
+@server.after_request
+def set_session_cookie(response):
+    if PAGE_JOBS != 'off' and SESSION_COOKIE not in request.cookies:
+        response.set_cookie(SESSION_COOKIE, os.urandom(8).hex(), httponly=True, samesite='Lax')
+    return response
+
+
+def session_slot(page, tab=None):
+    # Calls outside a browser session (scripts, the benchmark) are never superseded.
+    session = request.cookies.get(SESSION_COOKIE) if has_request_context() else None
+    return None if session is None else (session, tab, page)
+
+
+@server.route('/job-stats')
+def job_stats():
+    return jsonify(JOB_MANAGER.info())
+
+
+# ============================================================
+# 16. CALLBACKS
+# ============================================================
+# Three kinds of callbacks, so an interaction only redoes what it affects:
+# the KPIs depend on the filters, the page layout on the menu, and each
+# page's slots on the filters while that page is shown (Dash skips callbacks
+# whose outputs are not in the layout).
+FILTER_INPUTS = [Input('filter-product-group', 'value'),
+                 Input('filter-customer-segment', 'value'),
+                 Input('filter-country-group', 'value'),
+                 Input('filter-country', 'value'),
+                 Input('data-version', 'data')]
+
+
+DATE_INPUTS = [Input('filter-date', 'start_date'), Input('filter-date', 'end_date')]
+
+
+def kpi_values(c):
+    total_trx = c['transactions']
+    aov = c['revenue'] / total_trx if total_trx > 0 else 0
+    return c['revenue'], total_trx, c['customers'], aov
+
+
+def previous_period(start, end):
+    # The same number of days right before [start, end].
+    start = pd.Timestamp(start) if start else DATASET_STATS['start'].normalize()
+    end = pd.Timestamp(end) if end else DATASET_STATS['end'].normalize()
+    span = end - start + pd.Timedelta(days=1)
+    return str((start - span).date()), str((start - pd.Timedelta(days=1)).date())
+
+
+def kpi_delta(now, before):
+    if not before:
+        return html.Div('— vs periode sebelumnya', className='kpi-delta')
+    change = (now - before) / before * 100
+    return html.Div(f"{'▲' if change >= 0 else '▼'} {abs(change):.1f}% vs periode sebelumnya",
+                    className='kpi-delta', style={'color': '#10b981' if change >= 0 else '#f43f5e'})
+
+
+@app.callback(
+    [Output('kpi-revenue', 'children'),
+     Output('kpi-transactions', 'children'),
+     Output('kpi-customers', 'children'),
+     Output('kpi-aov', 'children')],
+    FILTER_INPUTS + DATE_INPUTS,
+)
+def update_kpis(pg, cs, cg, co=None, version=None, start=None, end=None):
+    catch_up(version)
+    with request_trace('kpi', pg, cs, cg, co):
+        with stage('cube'):
+            c = cube_lookup(pg, cs, cg, co)
+        if not start and not end:
+            total_rev, total_trx, total_cust, aov = kpi_values(c)
+            return fmt(total_rev, '£', 1), fmt(total_trx), fmt(total_cust), f'£{aov:,.2f}'
+        # A date range also shows the change against the period just before it.
+        with stage('range'):
+            now = kpi_values(range_totals(c, start, end))
+            before = kpi_values(range_totals(c, *previous_period(start, end)))
+        texts = fmt(now[0], '£', 1), fmt(now[1]), fmt(now[2]), f'£{now[3]:,.2f}'
+        return [[text, kpi_delta(a, b)] for text, a, b in zip(texts, now, before)]
+
+
+@app.callback(Output('page-content', 'children'), Input('nav-menu', 'value'))
+def update_page_layout(page):
+    page = page if page in PAGES else 'overview'
+    layout = PAGES[page][0]()
+    if FIGURE_TRANSPORT == 'patch':
+        return html.Div([layout, dcc.Store(id=f'{page}-payload')])
+    return layout
+
+
+def page_controls(page, controls=None):
+    # A control left empty (e.g. before its component renders) takes its default.
+    return {name: (controls or {}).get(name) or CONTROL_DEFAULTS[name] for name, _, _ in PAGES[page][3]}
+
+
+def page_entry(page, pg, cs, cg, co=None, controls=None):
+    # What the page's builder reads: the cube entry plus the page's controls.
+    return {**cube_lookup(pg, cs, cg, co), **page_controls(page, controls)}
+
+
+def build_page(page, pg, cs, cg, co, controls):
+    with stage('cube'):
+        c = page_entry(page, pg, cs, cg, co, controls)
+    with stage('build'):
+        out = PAGES[page][1](c)
+    if FIGURE_TRANSPORT == 'patch':
+        with stage('pack'):
+            out = pack_page(page, json.loads(to_json_plotly(out)))
+    with stage('serialize'):
+        return to_json_plotly(out)
+
+
+def page_job(version, page, pg, cs, cg, co, controls):
+    # A job process holds the data it was forked with: ingest the rows the
+    # server has taken in since, which gives the same DATA_VERSION.
+    if JOB_PROCESS['child'] and version != DATA_VERSION:
+        poll_new_data()
+    # Stages are collected separately, as in timed_chart: the job may run on
+    # a pool thread or in another process.
+    outer, PROFILE_LOCAL.stages = getattr(PROFILE_LOCAL, 'stages', None), {}
+    try:
+        payload = build_page(page, pg, cs, cg, co, controls)
+    finally:
+        stages, PROFILE_LOCAL.stages = PROFILE_LOCAL.stages, outer
+    return payload, stages
+
+
+def update_page(page, pg, cs, cg, co=None, controls=None, known=None, tab=None):
+    # known: skeleton keys the browser already has (FIGURE_TRANSPORT=patch only).
+    controls = page_controls(page, controls)
+    # Normalized once, so e.g. ['Loyal', 'Active'] and ['Active', 'Loyal'] share a cache entry and a job.
+    pg, cs, cg, co = filter_key(pg, cs, cg, co)
+    with request_trace(page, pg, cs, cg, co) as trace:
+        key = (DATA_VERSION, FIGURE_TRANSPORT, page, pg, cs, cg, co, tuple(sorted(controls.items())))
+        with stage('cache_get'):
+            out = RENDER_CACHE.get(key)
+        trace['cache_hit'] = out is not None
+        if out is None:
+            with stage('job'):
+                (payload, stages), owner = JOB_MANAGER.run(
+                    key, session_slot(page, tab), page_job, key[0], page, pg, cs, cg, co, controls,
+                    done=lambda result: RENDER_CACHE.store(key, result[0]))
+            if owner:
+                for name, ms in stages.items():
+                    trace['stages'][name] = trace['stages'].get(name, 0.0) + ms
+            trace['bytes'] = len(payload)
+            out = json.loads(payload)
+        if FIGURE_TRANSPORT == 'patch':
+            return trim_skeletons(out, known)
+        return out
+
+
+CONTROL_DEFAULTS = {'top_k': TOP_K_OPTIONS[0], 'start_date': None, 'end_date': None}
+
+
+def page_callback(page):
+    names = [name for name, _, _ in PAGES[page][3]]
+
+    # Arguments: the filters, the data version, the page's controls, then
+    # 'known' as State in patch mode and the tab id.
+    def update(pg, cs, cg, co, version, *args):
+        catch_up(version)
+        known = args[len(names)] if FIGURE_TRANSPORT == 'patch' else None
+        return update_page(page, pg, cs, cg, co, dict(zip(names, args)), known, args[-1])
+    update.__name__ = f'update_{page}'
+    return update
+
+
+for page, (_, _, outputs, controls) in PAGES.items():
+    inputs = FILTER_INPUTS + [Input(cid, prop) for _, cid, prop in controls]
+    if FIGURE_TRANSPORT == 'patch':
+        app.callback(Output(f'{page}-payload', 'data'), inputs,
+                     [State('figure-skeleton-keys', 'data'), State('tab-id', 'data')])(page_callback(page))
+        app.clientside_callback(
+            PATCH_FIGURES_JS.replace('N_SLOTS', str(len(outputs))),
+            [Output(cid, prop) for cid, prop in outputs]
+            + [Output('figure-skeletons', 'data', allow_duplicate=True),
+               Output('figure-skeleton-keys', 'data', allow_duplicate=True)],
+            Input(f'{page}-payload', 'data'),
+            State('figure-skeletons', 'data'),
+            State('figure-skeleton-keys', 'data'),
+            prevent_initial_call=True,
+        )
+    else:
+        app.callback([Output(cid, prop) for cid, prop in outputs], inputs, State('tab-id', 'data'))(page_callback(page))
+
+
+def relayout_ranges(relayout):
+    # (x_range, y_range) after a zoom, (None, None) after a reset, None if the axes did not change.
+    if not relayout:
+        return None
+    ranges, changed = [], False
+    for axis in ('xaxis', 'yaxis'):
+        if f'{axis}.range[0]' in relayout:
+            ranges.append((relayout[f'{axis}.range[0]'], relayout[f'{axis}.range[1]']))
+        elif f'{axis}.range' in relayout:
+            ranges.append(tuple(relayout[f'{axis}.range']))
+        else:
+            ranges.append(None)
+            changed |= bool(relayout.get(f'{axis}.autorange'))
+            continue
+        changed = True
+    return tuple(ranges) if changed else None
+
+
+@app.callback(
+    Output('customer-scatter', 'figure', allow_duplicate=True),
+    Input('customer-scatter', 'relayoutData'),
+    [State('filter-product-group', 'value'),
+     State('filter-customer-segment', 'value'),
+     State('filter-country-group', 'value'),
+     State('filter-country', 'value')],
+    prevent_initial_call=True,
+)
+def zoom_customer_scatter(relayout, pg, cs, cg, co):
+    ranges = relayout_ranges(relayout)
+    ca = cube_lookup(pg, cs, cg, co)['customer_activity']
+    # Small selections are drawn in full, so plotly zooms them without a round trip.
+    if ranges is None or len(ca) <= SCATTER_MAX_POINTS:
+        raise PreventUpdate
+    with request_trace('customer-zoom', pg, cs, cg, co):
+        with stage('build'):
+            return scatter_figure(ca, *ranges)
+
+
+@app.callback(
+    [Output('data-version', 'data')] + [Output(stat_id, 'children') for stat_id, _ in STAT_ROWS]
+    + [Output('filter-date', 'min_date_allowed'), Output('filter-date', 'max_date_allowed'),
+       Output('filter-product-group', 'options'), Output('filter-customer-segment', 'options'),
+       Output('filter-country-group', 'options'), Output('filter-country', 'options'),
+       Output('data-poll', 'disabled')],
+    Input('data-poll', 'n_intervals'),
+    State('data-version', 'data'),
+)
+def refresh_data_version(_, version):
+    catch_up(version)
+    if DATA_VERSION is None or version == DATA_VERSION:
+        raise PreventUpdate
+    return ((DATA_VERSION,) + stat_values(DATASET_STATS) + date_limits() + filter_options()
+            + (WATCH_INTERVAL <= 0,))
+
+
+# ============================================================
+# 17. WARM-UP & READINESS
+# ============================================================
+# With STARTUP_MODE=lazy every process serves the layout shell at once and
+# loads the data in a warm-up thread. The warm-up then renders each page for
+# the unfiltered view, so plotly's templates are loaded and first visitors
+# hit the render cache. /ready answers 503 until then, for the load
+# balancer's health check. Eager mode is ready when the import finishes.
+READY = threading.Event()
+WARMUP_STATE = {'pid': None}
+
+
+def startup_summary():
+    parts = [f"{label} {STARTUP[key]:.2f}s" for key, label in
+             (('imports_s', 'import'), ('data_s', 'data'), ('summary_s', 'summary'), ('cube_s', 'cube'),
+              ('shell_s', 'shell'), ('warm_s', 'warm-up')) if key in STARTUP]
+    return f"Startup {STARTUP_MODE}: siap dalam {STARTUP['ready_s']:.2f}s ({', '.join(parts)})"
+
+
+def mark_ready():
+    STARTUP['ready_s'] = round(time.perf_counter() - STARTUP_T0, 3)
+    READY.set()
+    print(startup_summary())
+
+
+def warm_up():
+    try:
+        load_state()
+        with startup_timer('warm'):
+            for page in PAGES:
+                update_page(page, 'All', 'All', 'All')
+    except Exception as e:
+        # /ready keeps answering 503 and shows the error.
+        STARTUP['error'] = repr(e)
+        print(f"Warm-up gagal: {e}")
+        return
+    mark_ready()
+
+
+def start_warmup():
+    # Once per process, like the data watcher: threads do not survive a fork.
+    if WARMUP_STATE['pid'] != os.getpid():
+        WARMUP_STATE['pid'] = os.getpid()
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+
+@server.before_request
+def ensure_warmup():
+    if STARTUP_MODE == 'lazy' and not READY.is_set():
+        start_warmup()
+
+
+@server.route('/ready')
+def ready():
+    body = {'ready': READY.is_set(), 'data_version': DATA_VERSION, 'startup': STARTUP}
+    return jsonify(body), 200 if READY.is_set() else 503
+
+
+STARTUP['shell_s'] = round(time.perf_counter() - STARTUP_T0, 3)
+if STARTUP_MODE == 'lazy':
+    start_warmup()
+else:
+    mark_ready()
+
+
+# ============================================================
+# 18. EXPORT
+# ============================================================
+# /export/rows streams the filtered rows and /export/<page>/<table> one of
+# a page's cube tables, as csv, csv.gz or parquet (?format=, needs pyarrow).
+# Filters are the dashboard's: pg, cs, cg and co, each repeatable for a
+# multi-select. Rows are encoded EXPORT_CHUNK_ROWS at a time, so memory does
+# not grow with the export, and at most EXPORT_MAX_CONCURRENT exports run per
+# process; further ones get 429. An export holds its thread for as long as the
+# client reads, so gunicorn.conf.py gives each worker EXPORT_MAX_CONCURRENT
+# threads on top of the ones serving the callbacks; 0 turns exports off.
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', '50000'))
+EXPORT_MAX_CONCURRENT = int(os.environ.get('EXPORT_MAX_CONCURRENT', '2'))
+EXPORT_SLOTS = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+EXPORT_FORMATS = {'csv': 'text/csv', 'csv.gz': 'application/gzip', 'parquet': 'application/vnd.apache.parquet'}
+EXPORT_TABLES = {
+    'overview': ['monthly', 'daily', 'seasonal'],
+    'product': ['top_products', 'product_groups'],
+    'customer': ['segments', 'segment_revenue', 'top_customers', 'customer_activity'],
+    'geo': ['country_trx', 'country_groups', 'group_table'],
+}
+
+
+class ExportSink(io.RawIOBase):
+    # Collects what an encoder writes; drained after every chunk. tell() keeps
+    # counting, as the parquet writer records offsets with it.
+    def __init__(self):
+        self.parts, self.pos = [], 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.parts.append(bytes(b))
+        self.pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self.pos
+
+    def drain(self):
+        out, self.parts = b''.join(self.parts), []
+        return out
+
+
+def row_chunks(pg, cs, cg, co):
+    if QUERY_ENGINE == 'sql':
+        yield from SQL_BACKEND.rows(filter_key(pg, cs, cg, co), EXPORT_CHUNK_ROWS)
+        return
+    if LOAD_REPORT.get('mode') == 'stream':
+        # Only a sample is in memory: filter the source again chunk by chunk.
+        with pd.read_csv(SOURCE_CSV, encoding='utf-8-sig', chunksize=EXPORT_CHUNK_ROWS) as reader:
+            for raw in reader:
+                yield with_date_parts(fdf(normalize(raw), pg, cs, cg, co))
+        return
+    segments = FILTER_INDEX
+    yield with_date_parts(segments[0][0].iloc[:0])  # the header, even when nothing matches
+    for frame, masks in segments:
+        sel = row_selection(masks, len(frame), pg, cs, cg, co)
+        rows = None if sel is None else np.flatnonzero(sel)
+        n = len(frame) if rows is None else len(rows)
+        for i in range(0, n, EXPORT_CHUNK_ROWS):
+            yield with_date_parts(frame.iloc[i:i + EXPORT_CHUNK_ROWS] if rows is None else frame.iloc[rows[i:i + EXPORT_CHUNK_ROWS]])
+
+
+def csv_chunks(frames, compress):
+    sink = ExportSink()
+    out = gzip.GzipFile(fileobj=sink, mode='wb', compresslevel=6) if compress else sink
+    header = True
+    for frame in frames:
+        if len(frame) or header:
+            out.write(frame.to_csv(index=False, header=header).encode('utf-8'))
+            header = False
+        yield sink.drain()
+    if compress:
+        out.close()
+    yield sink.drain()
+
+
+def parquet_chunks(frames):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    sink, writer = ExportSink(), None
+    for frame in frames:
+        # Plain strings: the categories of a re-read source differ per chunk.
+        frame = frame.astype({col: object for col, dtype in frame.dtypes.items()
+                              if isinstance(dtype, pd.CategoricalDtype)})
+        if writer is None:
+            schema = pa.Schema.from_pandas(frame, preserve_index=False)
+            schema = pa.schema([f.with_type(pa.string()) if pa.types.is_null(f.type) else f for f in schema],
+                               metadata=schema.metadata)
+            writer = pq.ParquetWriter(sink, schema)
+        if len(frame):
+            writer.write_table(pa.Table.from_pandas(frame, schema=writer.schema, preserve_index=False))
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+    yield sink.drain()
+
+
+def export_filters():
+    return filter_key(*(request.args.getlist(name) for name in ('pg', 'cs', 'cg', 'co')))
+
+
+def export_response(frames, name):
+    if EXPORT_MAX_CONCURRENT <= 0:
+        return jsonify({'error': 'export dinonaktifkan (EXPORT_MAX_CONCURRENT=0)'}), 404
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format harus salah satu dari {', '.join(EXPORT_FORMATS)}"}), 400
+    if fmt == 'parquet':
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            return jsonify({'error': 'export parquet membutuhkan pyarrow'}), 501
+    if not EXPORT_SLOTS.acquire(blocking=False):
+        return jsonify({'error': 'terlalu banyak export berjalan, coba lagi nanti'}), 429, {'Retry-After': '5'}
+    body = parquet_chunks(frames) if fmt == 'parquet' else csv_chunks(frames, fmt == 'csv.gz')
+    response = Response(body, mimetype=EXPORT_FORMATS[fmt],
+                        headers={'Content-Disposition': f'attachment; filename="{name}.{fmt}"'})
+    # Also when the client goes away before the body is read.
+    response.call_on_close(EXPORT_SLOTS.release)
+    return response
+
+
+@server.route('/export/rows')
+def export_rows():
+    if DATA_VERSION is None:
+        return jsonify({'error': 'data belum dimuat'}), 503
+    return export_response(row_chunks(*export_filters()), 'transactions')
+
+
+@server.route('/export/<page>/<table>')
+def export_table(page, table):
+    if table not in EXPORT_TABLES.get(page, []):
+        return jsonify({'error': f'tabel tidak dikenal: {page}/{table}', 'tables': EXPORT_TABLES}), 404
+    if DATA_VERSION is None:
+        return jsonify({'error': 'data belum dimuat'}), 503
+    c = cube_lookup(*export_filters())
+    if page == 'overview':
+        # The Overview's tables follow its date range, as on the page.
+        c = range_entry(c, request.args.get('start_date'), request.args.get('end_date'))
+    return export_response(iter([c[table]]), f'{page}-{table}')
+
+
+# ============================================================
+# 19. RUN
+# ============================================================
+if __name__ == '__main__':
+    rows = f"{LOAD_REPORT['rows']:,} rows" if DATA_VERSION is not None else 'loading in background'
+    print(f"Dataset: {rows} | Running at http://127.0.0.1:8050")
+    JOB_MANAGER.start()
     app.run(debug=True, host='0.0.0.0', port=8050)
\ No newline at end of file
@@ -0,0 +1,433 @@
+"""Benchmarks for the dashboard's data layer.
+
+    python benchmark.py filter [--repeat N]
+    python benchmark.py memory [--workers N]
+    python benchmark.py distinct [--repeat N]
+    python benchmark.py range [--repeat N] [--ranges N]
+    python benchmark.py sizes [--rows N ...] [--data-dir DIR] [--json FILE]
+    python benchmark.py burst [--sessions N] [--flips N] [--gap-ms MS] [--workers N]
+    python benchmark.py sql [--sql-path FILE]
+
+'filter' compares the legacy fdf (full-frame copy + object string
+comparisons) with the categorical mask engine in app.py for every
+filter combination and checks that both select the same rows.
+
+'memory' forks N workers after importing app (as gunicorn's preload_app
+does), renders every page in each of them and reports per-worker RSS,
+PSS and private memory from /proc (Linux only).
+
+'distinct' counts transactions and customers for every filter combination
+(plus 100 random multi-selects that include the Country filter) with
+pandas nunique() on the filtered rows, the exact leaf-union engine and
+the HyperLogLog engine, checks that the exact engine matches pandas and
+reports the HLL relative error.
+
+'range' answers the KPIs for --ranges random date ranges per filter
+combination by scanning the filtered rows and with the cube's prefix sums
+and per-day distinct sets (app.range_totals), and checks that both agree.
+
+'sizes' generates synthetic transaction CSVs (100K, 1M and 10M rows by
+default, reused from --data-dir when present) and, for each one, imports
+app in a fresh process twice: without the column cache and with it. Every
+run times the import, fdf and all four page builders over every filter
+combination and records peak RSS. Results are printed and written as JSON
+so they can be diffed against a previous run.
+
+'burst' replays bursty filter changes on the customer page: every session
+flips the filters --flips times, --gap-ms apart, without waiting for the
+responses (as the Dash renderer does), and all sessions follow the same
+sequence. It runs once per PAGE_JOBS mode and reports how many builds ran,
+how many requests were superseded or coalesced, and the request-seconds
+spent holding a server thread.
+
+'sql' builds (or reuses) the SQLite file of QUERY_ENGINE=sql at --sql-path
+and computes every cube entry, plus 20 random multi-selects, with both
+engines and compares the time per entry. That both engines return the same
+data is checked by tests/test_sql_parity.py.
+"""
+import argparse
+import gc
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def legacy_fdf(df_src, pg, cs, cg):
+    dff = df_src.copy()
+    if pg and pg != 'All':
+        dff = dff[dff['Product_Group'] == pg]
+    if cs and cs != 'All':
+        dff = dff[dff['Customer_Segment'] == cs]
+    if cg and cg != 'All':
+        dff = dff[dff['Country_Group'] == cg]
+    return dff
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def filter_keys():
+    dims = [['All'] + list(app.df[col].cat.categories) for col in app.CUBE_COLS]
+    return list(itertools.product(*dims))
+
+
+def multi_filter_keys(n, seed=0):
+    # Random multi-selects: for each filter, all values or a random subset of them.
+    rng = np.random.default_rng(seed)
+    keys = []
+    for _ in range(n):
+        key = []
+        for col in app.FILTER_COLS:
+            values = list(app.df[col].cat.categories)
+            size = rng.integers(0, min(len(values), 4) + 1)
+            key.append(list(rng.choice(values, size, replace=False)) if size else 'All')
+        keys.append(app.filter_key(*key))
+    return keys
+
+
+def bench_filter(repeat):
+    df_obj = app.df.astype({col: object for col in app.CATEGORY_COLS})
+    rows = []
+    for key in filter_keys():
+        before = legacy_fdf(df_obj, *key)
+        after = app.fdf(app.df, *key)
+        assert np.array_equal(before.index.to_numpy(), after.index.to_numpy()), key
+        rows.append((key, timed(lambda: legacy_fdf(df_obj, *key), repeat),
+                     timed(lambda: app.fdf(app.df, *key), repeat)))
+
+    print(f"{len(app.df):,} rows, best of {repeat}")
+    print(f"{'filter':<60} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for key, t_before, t_after in rows:
+        print(f"{' / '.join(key):<60} {t_before * 1e3:>10.2f} {t_after * 1e3:>10.2f} "
+              f"{t_before / t_after:>7.1f}x")
+    t_before = sum(r[1] for r in rows) / len(rows)
+    t_after = sum(r[2] for r in rows) / len(rows)
+    print(f"{'mean':<60} {t_before * 1e3:>10.2f} {t_after * 1e3:>10.2f} {t_before / t_after:>7.1f}x")
+
+
+def proc_memory():
+    mem = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            key, *rest = line.split()
+            if key in ('Rss:', 'Pss:', 'Private_Clean:', 'Private_Dirty:'):
+                mem[key[:-1]] = int(rest[0]) * 1024
+    mem['Private'] = mem.pop('Private_Clean') + mem.pop('Private_Dirty')
+    return mem
+
+
+def _memory_worker(results, barrier):
+    app.update_kpis('All', 'All', 'All')
+    for page in app.PAGES:
+        app.update_page(page, 'All', 'All', 'All')
+    # Measure while all workers are alive so PSS splits the shared pages between them.
+    barrier.wait()
+    results.put(proc_memory())
+    barrier.wait()
+
+
+def bench_memory(workers):
+    gc.freeze()  # as in gunicorn.conf.py's pre_fork hook
+    ctx = multiprocessing.get_context('fork')
+    results, barrier = ctx.Queue(), ctx.Barrier(workers)
+    procs = [ctx.Process(target=_memory_worker, args=(results, barrier)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    mems = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    mb = 1 / 2 ** 20
+    print(f"{len(app.df):,} rows, {workers} worker(s) forked after import")
+    print(f"{'worker':<8} {'RSS MB':>10} {'PSS MB':>10} {'private MB':>11}")
+    for i, m in enumerate(mems):
+        print(f"{i:<8} {m['Rss'] * mb:>10.1f} {m['Pss'] * mb:>10.1f} {m['Private'] * mb:>11.1f}")
+    print(f"{'total':<8} {'':>10} {sum(m['Pss'] for m in mems) * mb:>10.1f} "
+          f"{sum(m['Private'] for m in mems) * mb:>11.1f}")
+
+
+def bench_distinct(repeat):
+    keys = app.CUBE_TABLES['keys']
+    t0 = time.perf_counter()
+    exact = app.distinct_index(keys, mode='exact')
+    t_exact_build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    hll = app.distinct_index(keys, mode='hll')
+    t_hll_build = time.perf_counter() - t0
+
+    rows = []
+    for key in filter_keys() + multi_filter_keys(100):
+        dff = app.fdf(app.df, *key)
+        ids = app.select_leaves(exact['leaves'], app.filter_key(*key)).index
+        for col, name in (('TransactionNo', 'trx'), ('CustomerNo', 'customers')):
+            truth = dff[col].nunique()
+            assert exact[name].count(ids) == truth, (key, col)
+            est = hll[name].count(ids)
+            rows.append((key, col, truth, est,
+                         timed(lambda: dff[col].nunique(), repeat),
+                         timed(lambda: exact[name].count(ids), repeat),
+                         timed(lambda: hll[name].count(ids), repeat)))
+
+    print(f"{len(app.df):,} rows, best of {repeat}; index build exact {t_exact_build:.2f}s, "
+          f"hll {t_hll_build:.2f}s (precision {app.HLL_PRECISION})")
+    print(f"{'column':<14} {'pandas ms':>10} {'exact ms':>10} {'hll ms':>10} {'hll err mean':>13} {'hll err max':>12}")
+    for col in ('TransactionNo', 'CustomerNo'):
+        sel = [r for r in rows if r[1] == col]
+        errors = [abs(r[3] - r[2]) / r[2] for r in sel if r[2]]
+        print(f"{col:<14} {np.mean([r[4] for r in sel]) * 1e3:>10.3f} {np.mean([r[5] for r in sel]) * 1e3:>10.3f} "
+              f"{np.mean([r[6] for r in sel]) * 1e3:>10.3f} {np.mean(errors):>12.2%} {np.max(errors):>11.2%}")
+
+
+COUNTRIES = ['United Kingdom', 'Germany', 'France', 'EIRE', 'Spain', 'Netherlands', 'Belgium', 'Switzerland',
+             'Portugal', 'Australia', 'Norway', 'Italy', 'Channel Islands', 'Finland', 'Cyprus', 'Sweden',
+             'Austria', 'Denmark', 'Japan', 'Poland', 'USA', 'Israel', 'Singapore', 'Iceland', 'Canada']
+PRODUCT_GROUPS = ['Very Frequently Purchased', 'Frequently Purchased', 'Moderately Purchased',
+                  'Rarely Purchased', 'Very Rarely Purchased']
+CUSTOMER_SEGMENTS = ['Loyal', 'Active', 'Occasional', 'Inactive']
+COUNTRY_GROUPS = ['Transaksi Tinggi', 'Transaksi Sedang', 'Transaksi Rendah']
+SEASONS = np.array(['Winter'] * 2 + ['Spring'] * 3 + ['Summer'] * 3 + ['Autumn'] * 3 + ['Winter'])
+
+
+def scan_range(key, start, end):
+    dff = app.fdf(app.df, *key)
+    dff = dff[(dff['Date'] >= start) & (dff['Date'] <= end)]
+    return dff['Revenue'].sum(), dff['TransactionNo'].nunique(), dff['CustomerNo'].nunique()
+
+
+def bench_range(repeat, n_ranges):
+    days = app.DISTINCT_INDEX['calendar'].index
+    rng = np.random.default_rng(0)
+    rows = []
+    for key in filter_keys():
+        c = app.cube_lookup(*key)
+        for lo, hi in np.sort(rng.choice(len(days), (n_ranges, 2)), axis=1):
+            start, end = str(days[lo].date()), str(days[hi].date())
+            r = app.range_totals(c, start, end)
+            revenue, trx, customers = scan_range(key, start, end)
+            assert np.isclose(r['revenue'], revenue) and (r['transactions'], r['customers']) == (trx, customers), \
+                (key, start, end)
+            rows.append((timed(lambda: scan_range(key, start, end), repeat),
+                         timed(lambda: app.range_totals(c, start, end), repeat)))
+
+    t_scan, t_range = np.array(rows).T * 1e3
+    print(f"{len(app.df):,} rows, {len(days)} days, {len(rows)} ranges, best of {repeat}")
+    print(f"{'':<10} {'scan ms':>10} {'prefix ms':>10} {'speedup':>8}")
+    for name, fn in (('mean', np.mean), ('p95', lambda a: np.percentile(a, 95)), ('max', np.max)):
+        print(f"{name:<10} {fn(t_scan):>10.2f} {fn(t_range):>10.2f} {fn(t_scan) / fn(t_range):>7.1f}x")
+
+
+def bench_sql(path):
+    existed = os.path.exists(path)
+    backend = app.SqlBackend(path, app.SQL_POOL_SIZE)
+    t0 = time.perf_counter()
+    backend.open(app.SOURCE_CSV)
+    t_open = time.perf_counter() - t0
+
+    rows = []
+    for key in [k + ('All',) for k in filter_keys()] + multi_filter_keys(20):
+        rows.append((timed(lambda: app.cube_entry(app.CUBE_TABLES, app.DISTINCT_INDEX, key), 1),
+                     timed(lambda: backend.entry(key), 1)))
+
+    t_pandas, t_sql = np.array(rows).T * 1e3
+    print(f"{backend.row_count():,} rows, {len(rows)} entries; {path} "
+          f"{'reused' if existed else 'built'} in {t_open:.2f}s ({os.path.getsize(path) / 2 ** 20:,.0f} MB)")
+    print(f"{'engine':<8} {'mean ms':>10} {'p95 ms':>10} {'max ms':>10}")
+    for name, t in (('pandas', t_pandas), ('sql', t_sql)):
+        print(f"{name:<8} {t.mean():>10.1f} {np.percentile(t, 95):>10.1f} {t.max():>10.1f}")
+
+
+def synthetic_csv(path, n_rows, chunk_rows=1_000_000, seed=0):
+    # Same columns as df_dashboard.csv. Customers keep one country and segment,
+    # products one group, so every filter combination behaves like the real data.
+    rng = np.random.default_rng(seed)
+    n_cust, n_prod = max(1_000, n_rows // 50), 4_000
+    weights = np.r_[40, np.ones(len(COUNTRIES) - 1)]
+    cust_country = rng.choice(len(COUNTRIES), n_cust, p=weights / weights.sum())
+    cust_segment = rng.choice(CUSTOMER_SEGMENTS, n_cust)
+    country_group = np.array(COUNTRY_GROUPS)[np.minimum(np.arange(len(COUNTRIES)) // 4, 2)]
+    prod_group = rng.choice(PRODUCT_GROUPS, n_prod)
+    prod_name = np.array([f'SYNTHETIC PRODUCT {i:04d}' for i in range(n_prod)])
+    prod_price = np.round(rng.lognormal(1.2, 0.8, n_prod), 2)
+    start = np.datetime64('2018-12-01')
+
+    written, trx_no = 0, 536000
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        while written < n_rows:
+            n = min(chunk_rows, n_rows - written)
+            # Basket sizes of 1-39 lines, cut so the chunk has exactly n rows.
+            ends = np.minimum(np.cumsum(rng.integers(1, 40, n // 10 + 1)), n)
+            ends[-1] = n
+            items = np.diff(np.r_[0, ends])
+            items = items[items > 0]
+            trx = np.repeat(np.arange(len(items)), items)
+            cust = rng.integers(0, n_cust, len(items))[trx]
+            day = start + rng.integers(0, 730, len(items))[trx]
+            prod = rng.integers(0, n_prod, n)
+            qty = rng.integers(1, 25, n)
+            dates = pd.DatetimeIndex(day)
+            chunk = pd.DataFrame({
+                'Date': dates.strftime('%Y-%m-%d'),
+                'TransactionNo': (trx_no + trx).astype(str),
+                'CustomerNo': (12000 + cust).astype(str),
+                'ProductName': prod_name[prod],
+                'Price': prod_price[prod],
+                'Quantity': qty,
+                'Revenue': np.round(prod_price[prod] * qty, 2),
+                'Country': np.array(COUNTRIES)[cust_country[cust]],
+                'Product_Group': prod_group[prod],
+                'Customer_Segment': cust_segment[cust],
+                'Country_Group': country_group[cust_country[cust]],
+                'DayName': dates.day_name(),
+                'Season': SEASONS[dates.month - 1],
+            })
+            chunk.to_csv(f, header=written == 0, index=False)
+            written += n
+            trx_no += len(items)
+
+
+def summarize(seconds):
+    ms = np.array(seconds) * 1e3
+    return {'mean_ms': float(ms.mean()), 'p95_ms': float(np.percentile(ms, 95)), 'max_ms': float(ms.max())}
+
+
+def measure(repeat):
+    # Runs in a child process right after 'import app'; see bench_sizes().
+    keys = filter_keys()
+    result = {'rows': app.LOAD_REPORT['rows'], 'filters': len(keys),
+              'fdf': summarize([timed(lambda: app.fdf(app.df, *key), repeat) for key in keys])}
+    for name in ('overview', 'product', 'customer', 'geo'):
+        build = getattr(app, f'build_{name}')
+        result[f'build_{name}'] = summarize([timed(lambda: build(app.page_entry(name, *key)), repeat) for key in keys])
+    result['peak_rss_mb'] = app.peak_rss_mb()
+    return result
+
+
+def run_child(csv, cache, repeat):
+    env = dict(os.environ, DATA_CSV=csv, DATA_CACHE='1' if cache else '0')
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), 'sizes', '--measure', '--repeat', str(repeat)],
+                         env=env, check=True, capture_output=True, text=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result['process_s'] = time.perf_counter() - t0
+    return result
+
+
+def bench_sizes(sizes, data_dir, json_path, repeat):
+    os.makedirs(data_dir, exist_ok=True)
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+              'pandas': pd.__version__, 'numpy': np.__version__, 'cpus': os.cpu_count(), 'runs': []}
+    for n_rows in sizes:
+        csv = os.path.join(data_dir, f'synthetic_{n_rows}.csv')
+        if not os.path.exists(csv):
+            t0 = time.perf_counter()
+            synthetic_csv(csv, n_rows)
+            print(f"generated {csv} in {time.perf_counter() - t0:.1f}s")
+        for cache in (False, True):
+            if cache:
+                run_child(csv, True, 1)  # first cached import writes the column cache
+            result = run_child(csv, cache, repeat)
+            result.update(csv=csv, data_cache=cache)
+            report['runs'].append(result)
+            print(f"{n_rows:>11,} rows cache={'on ' if cache else 'off'} import {result['import_s']:7.2f}s  "
+                  f"fdf {result['fdf']['mean_ms']:8.2f}ms  "
+                  + '  '.join(f"{p} {result[f'build_{p}']['mean_ms']:6.1f}ms"
+                              for p in ('overview', 'product', 'customer', 'geo'))
+                  + f"  peak RSS {result['peak_rss_mb']:,.0f} MB")
+    with open(json_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {json_path}")
+
+
+def _burst_request(key, session, results, slot):
+    with app.server.test_request_context(headers={'Cookie': f'{app.SESSION_COOKIE}={session}'}):
+        t0 = time.perf_counter()
+        try:
+            app.update_page('customer', *key)
+            superseded = False
+        except app.PreventUpdate:
+            superseded = True
+        results[slot] = (superseded, time.perf_counter() - t0)
+
+
+def bench_burst(sessions, flips, gap_ms, workers):
+    keys = filter_keys()
+    rng = np.random.default_rng(0)
+    sequence = [keys[i] for i in rng.choice(len(keys), flips, replace=False)]
+    print(f"{len(app.df):,} rows, {sessions} session(s) x {flips} flips {gap_ms} ms apart, {workers} job worker(s)")
+    print(f"{'PAGE_JOBS':<10} {'requests':>9} {'builds':>7} {'superseded':>11} {'coalesced':>10} "
+          f"{'wall s':>7} {'last ms':>8} {'thread s':>9}")
+    for kind in ('off', 'thread', 'process'):
+        app.JOB_MANAGER = app.JobManager(kind, workers)
+        app.JOB_MANAGER.start()  # before this suite's request threads
+        app.RENDER_CACHE.clear()
+        results, threads = {}, []
+        t0 = time.perf_counter()
+        for step, key in enumerate(sequence):
+            for session in range(sessions):
+                thread = threading.Thread(target=_burst_request, args=(key, f's{session}', results, (session, step)))
+                thread.start()
+                threads.append(thread)
+            time.sleep(gap_ms / 1e3)
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - t0
+        stats = app.JOB_MANAGER.info()
+        builds = stats['inline'] + stats['submitted'] - stats['cancelled']
+        last = np.mean([results[(session, flips - 1)][1] for session in range(sessions)])
+        print(f"{kind:<10} {len(results):>9} {builds:>7} {sum(r[0] for r in results.values()):>11} "
+              f"{stats['coalesced']:>10} {wall:>7.2f} {last * 1e3:>8.0f} {sum(r[1] for r in results.values()):>9.2f}")
+        if app.JOB_MANAGER.pool is not None:
+            app.JOB_MANAGER.pool.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('suite', choices=['filter', 'memory', 'distinct', 'range', 'sizes', 'burst', 'sql'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--data-dir', default='benchmark_data')
+    parser.add_argument('--json', default='benchmark_results.json')
+    parser.add_argument('--ranges', type=int, default=5)
+    parser.add_argument('--sessions', type=int, default=8)
+    parser.add_argument('--flips', type=int, default=6)
+    parser.add_argument('--gap-ms', type=float, default=30)
+    parser.add_argument('--sql-path', default=os.path.join('benchmark_data', 'dashboard.sqlite'))
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.suite != 'sizes' or args.measure:
+        t0 = time.perf_counter()
+        import app
+        import_s = time.perf_counter() - t0
+    if args.suite == 'sizes':
+        if args.measure:
+            print(json.dumps({'import_s': import_s, **measure(args.repeat)}))
+        else:
+            bench_sizes(args.rows, args.data_dir, args.json, args.repeat)
+    elif args.suite == 'filter':
+        bench_filter(args.repeat)
+    elif args.suite == 'memory':
+        bench_memory(args.workers)
+    elif args.suite == 'distinct':
+        bench_distinct(args.repeat)
+    elif args.suite == 'range':
+        bench_range(args.repeat, args.ranges)
+    elif args.suite == 'burst':
+        bench_burst(args.sessions, args.flips, args.gap_ms, args.workers)
+    elif args.suite == 'sql':
+        bench_sql(args.sql_path)
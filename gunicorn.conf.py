@@ -0,0 +1,39 @@
+# gunicorn -c gunicorn.conf.py app:server
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+# Import app.py once in the master: the memory-mapped dataset, filter masks and
+# aggregate cube are built there and inherited copy-on-write by every worker,
+# so adding workers does not add copies of the data. STARTUP_MODE=lazy trades
+# that for fast worker boot: each worker imports the app itself, serves the
+# layout at once and loads its own copy of the data in the background.
+# With QUERY_ENGINE=sql there is no in-memory copy to share: workers query one
+# SQLite file and each opens its own connections after the fork.
+preload_app = os.environ.get('STARTUP_MODE', 'eager') != 'lazy'
+
+
+def pre_fork(server, worker):
+    # Move inherited objects out of the cyclic GC's reach; collections in the
+    # workers would otherwise touch their headers and un-share the pages.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # The worker runs one thread until it starts serving: fork the process
+    # job pool now, so no job process inherits a lock held by another thread.
+    if preload_app and os.environ.get('PAGE_JOBS') == 'process':
+        import app
+        app.JOB_MANAGER.start()
+
+
+# With PAGE_JOBS set, page builds run on a job pool and a request thread only
+# waits for its result, so extra threads let a worker take the next request.
+callback_threads = int(os.environ.get('GUNICORN_THREADS', '1' if os.environ.get('PAGE_JOBS', 'off') == 'off' else '4'))
+# A streamed export holds its thread until the client has read it all. The
+# EXPORT_MAX_CONCURRENT exports a worker admits get threads of their own, so
+# the callback threads above stay free however slow the downloads are.
+threads = callback_threads + max(int(os.environ.get('EXPORT_MAX_CONCURRENT', '2')), 0)
@@ -0,0 +1,341 @@
+"""Batch stage that derives the dashboard's labels and customer summary.
+
+    python pipeline.py build [--source CSV] [--out CSV] [--summary-dir DIR]
+    python pipeline.py update FILE ... [--delta-dir DIR] [--summary-dir DIR]
+
+'build' reads raw transactions (df_clean.csv by default), computes RFM
+metrics per customer, transaction counts per product and country, and
+assigns Customer_Segment, Product_Group and Country_Group from quantile
+scores of those metrics. It writes the labelled rows as the dashboard CSV
+and the summary tables to --summary-dir, with the quantile cut points, so
+later updates score new customers, products and countries the same way.
+
+'update' folds new transaction files into the summary. Only the customers,
+products and countries that appear in them are recomputed; known ones keep
+their labels, so the rows the dashboard already holds stay consistent with
+the summary, and new ones are scored with the stored cut points. Each file
+is written to --delta-dir with its labels, where the dashboard's ingestion
+(WATCH_INTERVAL) picks it up. Labels of known entities change on the next
+'build', which refits the cut points and relabels everything.
+
+app.py uses the same functions to keep a summary in memory when there is
+no summary for the CSV it loaded, and to update it when new rows arrive.
+"""
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SUMMARY_DIR = os.environ.get('SUMMARY_DIR', os.path.join(BASE_DIR, 'summary'))
+SUMMARY_VERSION = 1
+
+PRODUCT_GROUPS = [
+    'Very Frequently Purchased', 'Frequently Purchased',
+    'Moderately Purchased', 'Rarely Purchased', 'Very Rarely Purchased'
+]
+CUSTOMER_SEGMENTS = ['Loyal', 'Active', 'Occasional', 'Inactive']
+COUNTRY_GROUPS = ['Transaksi Tinggi', 'Transaksi Sedang', 'Transaksi Rendah']
+LABEL_COLS = ['Product_Group', 'Customer_Segment', 'Country_Group']
+ID_COLS = ['TransactionNo', 'CustomerNo', 'ProductName', 'Country']
+
+# Sum of the R, F and M quintile scores (3-15) -> segment, first match wins.
+SEGMENT_RULES = [(12, 'Loyal'), (9, 'Active'), (6, 'Occasional'), (3, 'Inactive')]
+
+# Table -> key columns, as stored in the summary directory.
+TABLES = {
+    'products': ['ProductName'],
+    # One row per transaction, customer and product group: exact distinct
+    # counts across batches, also when a transaction's lines arrive in two of them.
+    'transactions': ['TransactionNo', 'CustomerNo', 'Product_Group'],
+    'customers': ['CustomerNo'],
+    'customer_groups': ['CustomerNo', 'Product_Group'],
+    'countries': ['Country'],
+}
+
+
+def strings(values):
+    # Categoricals (app.py's normalized rows) convert their categories only.
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        labels = np.append(values.cat.categories.astype(str).to_numpy(object), 'nan')
+        return labels[values.cat.codes.to_numpy()]  # code -1 (missing) picks 'nan', as astype(str) would
+    return values.astype(str).to_numpy()
+
+
+def prepare(rows):
+    # Plain string keys and numeric values, whether rows come raw from a CSV or normalized by app.py.
+    out = pd.DataFrame({
+        'TransactionNo': strings(rows['TransactionNo']),
+        'CustomerNo': strings(rows['CustomerNo']),
+        'ProductName': strings(rows['ProductName']),
+        'Country': strings(rows['Country']),
+        'Date': pd.to_datetime(rows['Date']).to_numpy(),
+        'Quantity': pd.to_numeric(rows['Quantity'], errors='coerce').fillna(0).to_numpy(),
+        'Revenue': pd.to_numeric(rows['Revenue'], errors='coerce').fillna(0).to_numpy(),
+    })
+    for col in LABEL_COLS:
+        if col in rows.columns:
+            out[col] = rows[col].astype(object).to_numpy()
+    return out
+
+
+def grouped(frame, by, sums=(), maxes=(), firsts=(), count=None):
+    # One row per distinct `by` key (sorted): factorize once, then bincount and
+    # ufunc.at over the codes instead of a pandas groupby per aggregate.
+    keys = pd.MultiIndex.from_frame(frame[by]) if len(by) > 1 else pd.Index(frame[by[0]], name=by[0])
+    codes, uniques = pd.factorize(keys, sort=True)
+    n = len(uniques)
+    out = {}
+    if count:
+        out[count] = np.bincount(codes, minlength=n)
+    for col in sums:
+        values = frame[col].to_numpy()
+        total = np.bincount(codes, weights=values, minlength=n)
+        # Integer sums are stored as int64 whatever the input width (app.py
+        # downcasts Quantity to int32), so totals cannot wrap.
+        out[col] = total.round().astype(np.int64) if values.dtype.kind in 'iu' else total
+    for col in maxes:
+        values = frame[col].to_numpy('datetime64[ns]').view('int64')
+        top = np.full(n, np.iinfo(np.int64).min)
+        np.maximum.at(top, codes, values)
+        out[col] = top.view('datetime64[ns]')
+    if firsts:
+        first = np.empty(n, dtype=np.int64)
+        first[codes[::-1]] = np.arange(len(codes) - 1, -1, -1)
+        for col in firsts:
+            out[col] = frame[col].to_numpy()[first]
+    index = uniques if len(by) > 1 else pd.Index(uniques, name=by[0])
+    if len(by) > 1:
+        index.names = by
+    return pd.DataFrame(out, index=index)
+
+
+def distinct_counts(frame, by, col):
+    # Distinct values of col per `by` key.
+    pairs = frame[by + [col]].drop_duplicates()
+    return grouped(pairs, by, count=col)[col]
+
+
+def fit_edges(values, n):
+    # Inner cut points of n quantile bins.
+    return np.quantile(np.asarray(values, dtype=float), np.linspace(0, 1, n + 1)[1:-1]).tolist()
+
+
+def scores(values, edges):
+    # 1 (lowest bin) .. len(edges) + 1 (highest).
+    return np.searchsorted(edges, np.asarray(values, dtype=float), side='right') + 1
+
+
+def empty_state():
+    tables = {name: pd.DataFrame(index=pd.MultiIndex.from_arrays([[]] * len(keys), names=keys)
+                                 if len(keys) > 1 else pd.Index([], name=keys[0], dtype=object))
+              for name, keys in TABLES.items()}
+    return {**tables, 'meta': {'version': SUMMARY_VERSION, 'edges': {}, 'reference': None,
+                               'source': None, 'deltas': []}}
+
+
+def replace_rows(table, new):
+    # The rows of `new` replace those with the same key; the rest stay as they are.
+    return pd.concat([table[~table.index.isin(new.index)], new]).sort_index()
+
+
+def assign_labels(table, col, given, label_new):
+    # Known entities keep their label; new ones take the label their rows
+    # carry, else label_new() of their metrics.
+    labels = table[col] if col in table.columns else pd.Series(np.nan, index=table.index, dtype=object)
+    missing = labels.isna()
+    if given is not None and missing.any():
+        labels = labels.where(~missing, given.reindex(labels.index))
+        missing = labels.isna()
+    if missing.any():
+        labels = labels.where(~missing, pd.Series(label_new(table[missing]), index=table.index[missing]))
+    return labels.astype(object)
+
+
+def given_labels(rows, key, col):
+    if col not in rows.columns:
+        return None
+    return grouped(rows.loc[rows[col].notna(), [key, col]], [key], firsts=[col])[col]
+
+
+def summarize(rows, state=None):
+    # state=None computes everything from `rows` and fits the cut points;
+    # otherwise `rows` are new and only what they touch is recomputed.
+    rows = prepare(rows)
+    full = state is None
+    state = empty_state() if full else {**state, 'meta': json.loads(json.dumps(state['meta']))}
+    meta, edges = state['meta'], state['meta']['edges']
+
+    # Products: additive, so touched rows are the old ones plus the new counts.
+    new = grouped(rows, ['ProductName'], sums=['Quantity', 'Revenue'], count='Lines')
+    old = state['products'].reindex(new.index)
+    for col in ('Lines', 'Quantity', 'Revenue'):
+        new[col] = new[col] + old[col].fillna(0).to_numpy().astype(new[col].dtype) if col in old else new[col]
+    if 'Product_Group' in old:
+        new['Product_Group'] = old['Product_Group']
+    if full:
+        edges['Lines'] = fit_edges(new['Lines'], len(PRODUCT_GROUPS))
+    new['Product_Group'] = assign_labels(new, 'Product_Group', given_labels(rows, 'ProductName', 'Product_Group'),
+                                         lambda t: np.array(PRODUCT_GROUPS)[len(PRODUCT_GROUPS) - scores(t['Lines'], edges['Lines'])])
+    products = replace_rows(state['products'], new)
+    rows['Product_Group'] = products['Product_Group'].reindex(rows['ProductName']).to_numpy()
+
+    new = grouped(rows, TABLES['transactions'], sums=['Revenue'], maxes=['Date'], firsts=['Country'])
+    touched = state['transactions'][state['transactions'].index.isin(new.index)]
+    if len(touched):
+        both = pd.concat([touched, new]).reset_index()
+        new = grouped(both, TABLES['transactions'], sums=['Revenue'], maxes=['Date'], firsts=['Country'])
+    transactions = replace_rows(state['transactions'], new)
+    reference = transactions['Date'].max()
+
+    # Customers and countries: recomputed from the transactions of the touched ones.
+    lines = transactions[transactions.index.get_level_values('CustomerNo').isin(rows['CustomerNo'].unique())].reset_index()
+    customers = grouped(lines, ['CustomerNo'], sums=['Revenue'], maxes=['Date'], firsts=['Country'])
+    customers = customers.rename(columns={'Revenue': 'Monetary', 'Date': 'Last'})
+    customers['Countries'] = distinct_counts(lines, ['CustomerNo'], 'Country')
+    customers['Frequency'] = distinct_counts(lines, ['CustomerNo'], 'TransactionNo')
+    customers['Recency'] = (reference - customers['Last']).dt.days
+    if full:
+        for col in ('Recency', 'Frequency', 'Monetary'):
+            edges[col] = fit_edges(customers[col], 5)
+    customers['R'] = 6 - scores(customers['Recency'], edges['Recency'])
+    customers['F'] = scores(customers['Frequency'], edges['Frequency'])
+    customers['M'] = scores(customers['Monetary'], edges['Monetary'])
+    old = state['customers'].reindex(customers.index)
+    if 'Customer_Segment' in old:
+        customers['Customer_Segment'] = old['Customer_Segment']
+    total = customers['R'] + customers['F'] + customers['M']
+    customers['Customer_Segment'] = assign_labels(
+        customers, 'Customer_Segment', given_labels(rows, 'CustomerNo', 'Customer_Segment'),
+        lambda t: np.select([total[t.index] >= low for low, _ in SEGMENT_RULES], [s for _, s in SEGMENT_RULES],
+                            SEGMENT_RULES[-1][1]))
+    customer_groups = grouped(lines, TABLES['customer_groups'], sums=['Revenue'], count='Frequency')
+    customer_groups = customer_groups.rename(columns={'Revenue': 'Monetary'})[['Frequency', 'Monetary']]
+
+    lines = transactions[transactions['Country'].isin(rows['Country'].unique())].reset_index()
+    countries = grouped(lines, ['Country'], sums=['Revenue'])
+    countries['Transactions'] = distinct_counts(lines, ['Country'], 'TransactionNo')
+    countries['Customers'] = distinct_counts(lines, ['Country'], 'CustomerNo')
+    old = state['countries'].reindex(countries.index)
+    if 'Country_Group' in old:
+        countries['Country_Group'] = old['Country_Group']
+    if full:
+        edges['Transactions'] = fit_edges(countries['Transactions'], len(COUNTRY_GROUPS))
+    countries['Country_Group'] = assign_labels(
+        countries, 'Country_Group', given_labels(rows, 'Country', 'Country_Group'),
+        lambda t: np.array(COUNTRY_GROUPS)[len(COUNTRY_GROUPS) - scores(t['Transactions'], edges['Transactions'])])
+    countries = replace_rows(state['countries'], countries)
+
+    customers = replace_rows(state['customers'], customers)
+    # Recency moves for everyone as the reference date does; it is one subtraction.
+    customers['Recency'] = (reference - customers['Last']).dt.days
+    customers['Country_Group'] = countries['Country_Group'].reindex(customers['Country']).to_numpy()
+    touched = state['customer_groups'].index.get_level_values('CustomerNo').isin(rows['CustomerNo'].unique()) \
+        if len(state['customer_groups']) else np.zeros(0, dtype=bool)
+    customer_groups = pd.concat([state['customer_groups'][~touched], customer_groups]).sort_index()
+
+    meta['reference'] = str(reference)
+    return {'products': products, 'transactions': transactions, 'customers': customers,
+            'customer_groups': customer_groups, 'countries': countries, 'meta': meta}
+
+
+def label(rows, state):
+    # The summary's labels on every row, replacing any the rows carried.
+    rows = rows.copy()
+    rows['Product_Group'] = state['products']['Product_Group'].reindex(rows['ProductName'].astype(str)).to_numpy()
+    rows['Customer_Segment'] = state['customers']['Customer_Segment'].reindex(rows['CustomerNo'].astype(str)).to_numpy()
+    rows['Country_Group'] = state['countries']['Country_Group'].reindex(rows['Country'].astype(str)).to_numpy()
+    return rows
+
+
+def source_stat(path):
+    st = os.stat(path)
+    return {'name': os.path.basename(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def save(state, path):
+    # Written next to the target and swapped in, like app.py's column cache.
+    tmp = f'{path}.tmp{os.getpid()}'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name in TABLES:
+        state[name].reset_index().to_csv(os.path.join(tmp, f'{name}.csv'), index=False)
+    with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(state['meta'], f, indent=2)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+
+def load(path):
+    try:
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != SUMMARY_VERSION:
+        return None
+    state = {'meta': meta}
+    for name, keys in TABLES.items():
+        frame = pd.read_csv(os.path.join(path, f'{name}.csv'), dtype={col: str for col in ID_COLS + LABEL_COLS})
+        for col in ('Date', 'Last'):
+            if col in frame.columns:
+                frame[col] = pd.to_datetime(frame[col])
+        state[name] = frame.set_index(keys)
+    return state
+
+
+def matches(state, path):
+    # Whether the summary was built from exactly this CSV and nothing since.
+    return state is not None and state['meta']['source'] == source_stat(path) and not state['meta']['deltas']
+
+
+def cmd_build(source, out, summary_dir):
+    rows = pd.read_csv(source, encoding='utf-8-sig')
+    rows = rows.drop(columns=[col for col in LABEL_COLS if col in rows.columns])
+    state = summarize(rows)
+    rows = label(rows, state)
+    tmp = f'{out}.tmp{os.getpid()}'
+    rows.to_csv(tmp, index=False, encoding='utf-8-sig')
+    os.replace(tmp, out)
+    state['meta']['source'] = source_stat(out)
+    save(state, summary_dir)
+    segments = state['customers']['Customer_Segment'].value_counts().reindex(CUSTOMER_SEGMENTS, fill_value=0)
+    print(f"{len(rows):,} baris -> {out} | {len(state['customers']):,} pelanggan "
+          f"({', '.join(f'{s} {n:,}' for s, n in segments.items())}) | ringkasan di {summary_dir}")
+
+
+def cmd_update(files, delta_dir, summary_dir):
+    state = load(summary_dir)
+    if state is None:
+        raise SystemExit(f"Ringkasan tidak ditemukan di {summary_dir}; jalankan 'python pipeline.py build' dulu.")
+    os.makedirs(delta_dir, exist_ok=True)
+    for path in files:
+        rows = pd.read_csv(path, encoding='utf-8-sig')
+        state = summarize(rows, state)
+        name = os.path.basename(path)
+        target = os.path.join(delta_dir, name)
+        # Written under another name and renamed, as the ingestion expects.
+        rows = label(rows, state)
+        rows.to_csv(target + '.tmp', index=False, encoding='utf-8-sig')
+        os.replace(target + '.tmp', target)
+        state['meta']['deltas'].append(name)
+        print(f"{name}: {len(rows):,} baris -> {target}")
+    save(state, summary_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['build', 'update'])
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--source', default=os.path.join(BASE_DIR, 'df_clean.csv'))
+    parser.add_argument('--out', default=os.path.join(BASE_DIR, 'df_dashboard.csv'))
+    parser.add_argument('--delta-dir', default=os.environ.get('DELTA_DIR', os.path.join(BASE_DIR, 'delta')))
+    parser.add_argument('--summary-dir', default=SUMMARY_DIR)
+    args = parser.parse_args()
+    if args.command == 'build':
+        cmd_build(args.source, args.out, args.summary_dir)
+    else:
+        cmd_update(args.files, args.delta_dir, args.summary_dir)
@@ -0,0 +1,107 @@
+"""QUERY_ENGINE=sql must give the pages the same data as the in-memory cube.
+
+Runs on a small synthetic CSV generated into a temporary directory:
+
+    python -m pytest tests/test_sql_parity.py
+"""
+import importlib
+import itertools
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import synthetic_csv  # noqa: E402
+
+N_ROWS = 5_000
+N_MULTI = 20
+
+
+def same(a, b):
+    # Equal as data: categoricals compare as their values, floats up to rounding.
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(same(a[k], b[k]) for k in a)
+    if isinstance(a, pd.Series):
+        a, b = a.to_frame(), b.to_frame()
+    if isinstance(a, pd.DataFrame):
+        a, b = a.reset_index(), b.reset_index()
+        return (list(a.columns) == list(b.columns) and len(a) == len(b)
+                and all(same(a[col].to_numpy(), b[col].to_numpy()) for col in a.columns))
+    a, b = np.asarray(a), np.asarray(b)
+    if a.shape != b.shape:
+        return False
+    if a.dtype.kind in 'iufb' and b.dtype.kind in 'iufb':
+        return np.allclose(a, b, rtol=1e-9, equal_nan=True)
+    return [str(x) for x in a.ravel()] == [str(x) for x in b.ravel()]
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    # app loads its data at import, so the environment is set first.
+    tmp = tmp_path_factory.mktemp('sql_parity')
+    csv = str(tmp / 'synthetic.csv')
+    synthetic_csv(csv, N_ROWS)
+    env = {'DATA_CSV': csv, 'DATA_CACHE': '0', 'DELTA_DIR': str(tmp / 'delta'), 'WATCH_INTERVAL': '0',
+           'QUERY_ENGINE': 'pandas', 'LOAD_MODE': 'memory', 'STARTUP_MODE': 'eager', 'PAGE_JOBS': 'off'}
+    saved = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    try:
+        sys.modules.pop('app', None)
+        module = importlib.import_module('app')
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    # range_totals() answers SQL entries through app.SQL_BACKEND.
+    module.SQL_BACKEND = module.SqlBackend(str(tmp / 'dashboard.sqlite'), 2)
+    module.SQL_BACKEND.open(module.SOURCE_CSV)
+    return module
+
+
+def filter_keys(app):
+    # Every single-value combination of the cube filters, Country left at All.
+    dims = [['All'] + list(app.df[col].cat.categories) for col in app.CUBE_COLS]
+    return [app.filter_key(*key) for key in itertools.product(*dims)]
+
+
+def multi_filter_keys(app, n, seed=0):
+    # Random multi-selects: for each filter, all values or a random subset of them.
+    rng = np.random.default_rng(seed)
+    keys = []
+    for _ in range(n):
+        key = []
+        for col in app.FILTER_COLS:
+            values = list(app.df[col].cat.categories)
+            size = rng.integers(0, min(len(values), 4) + 1)
+            key.append(list(rng.choice(values, size, replace=False)) if size else 'All')
+        keys.append(app.filter_key(*key))
+    return keys
+
+
+def test_row_count(app):
+    assert app.SQL_BACKEND.row_count() == len(app.df) == N_ROWS
+
+
+def test_every_filter_combination(app):
+    for key in filter_keys(app) + multi_filter_keys(app, N_MULTI):
+        expected = app.cube_entry(app.CUBE_TABLES, app.DISTINCT_INDEX, key)
+        got = app.SQL_BACKEND.entry(key)
+        for name in expected.keys() - {'leaves'}:
+            assert same(expected[name], got[name]), (key, name)
+
+
+def test_date_ranges(app):
+    days = app.SQL_BACKEND.calendar.index
+    rng = np.random.default_rng(0)
+    for key in filter_keys(app) + multi_filter_keys(app, N_MULTI):
+        expected = app.cube_entry(app.CUBE_TABLES, app.DISTINCT_INDEX, key)
+        got = app.SQL_BACKEND.entry(key)
+        lo, hi = np.sort(rng.choice(len(days), 2))
+        start, end = str(days[lo].date()), str(days[hi].date())
+        assert same(app.range_totals(expected, start, end), app.range_totals(got, start, end)), (key, start, end)